@@ -0,0 +1,189 @@
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from pandas.api.types import is_numeric_dtype
+
+
+def numeric_columns(df: pd.DataFrame) -> list:
+    """Колонки, которые участвуют в корреляции (как df.corr(numeric_only=True))."""
+    return [col for col in df.columns if is_numeric_dtype(df[col])]
+
+
+def _block_corr(x_i, m_i, x_j, m_j) -> np.ndarray:
+    """
+    Корреляция колонок блока i с колонками блока j по строкам, где
+    заполнены обе колонки. x — значения с нулями вместо NaN, m — маска
+    заполненности (float64). Все суммы — матричные произведения.
+    """
+    n = m_i.T @ m_j
+    s_i = x_i.T @ m_j
+    s_j = m_i.T @ x_j
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = x_i.T @ x_j - s_i * s_j / n
+        var_i = (x_i * x_i).T @ m_j - s_i * s_i / n
+        var_j = m_i.T @ (x_j * x_j) - s_j * s_j / n
+        corr = cov / np.sqrt(var_i * var_j)
+    corr = np.where(n > 1, np.clip(corr, -1.0, 1.0), np.nan)
+    return corr
+
+
+def _dense_block_corr(z_i, z_j) -> np.ndarray:
+    """Блоки без пропусков: колонки уже стандартизованы, корреляция — одно произведение."""
+    return np.clip(z_i.T @ z_j, -1.0, 1.0)
+
+
+def correlation_matrix(df: pd.DataFrame, block_columns: int = 64, workers: int = None):
+    """
+    Полная матрица корреляций Пирсона числовых колонок, совпадающая с
+    df.corr(numeric_only=True), но посчитанная блоками.
+
+    Колонки делятся на блоки по block_columns; для каждой пары блоков
+    (только над диагональю, матрица симметрична) считается подматрица
+    матричными произведениями над непрерывными в памяти массивами.
+    Пары блоков распределяются по потокам: numpy отпускает GIL
+    на время произведений, так что блоки считаются на разных ядрах.
+
+    Returns:
+        (матрица float64 k x k, список колонок)
+    """
+    columns = numeric_columns(df)
+    k = len(columns)
+    rows = len(df)
+    corr = np.full((k, k), np.nan)
+    if k == 0:
+        return corr, columns
+
+    # значения колонок подряд в памяти, сдвинутые на среднее (точнее суммы)
+    values = np.empty((rows, k), dtype='float64', order='F')
+    for i, col in enumerate(columns):
+        values[:, i] = df[col].to_numpy(dtype='float64', na_value=np.nan)
+    missing = np.isnan(values)
+    values[missing] = 0.0
+    values -= values.sum(axis=0) / np.maximum(rows - missing.sum(axis=0), 1)
+    values[missing] = 0.0
+    mask = (~missing).astype('float64')
+
+    dense = ~missing.any(axis=0)
+    if dense.any():
+        # колонки без пропусков стандартизуем один раз
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scale = np.sqrt((values[:, dense] ** 2).sum(axis=0))
+            standardized = np.asfortranarray(values[:, dense] / scale)
+        dense_index = np.cumsum(dense) - 1
+
+    blocks = [list(range(start, min(start + block_columns, k))) for start in range(0, k, block_columns)]
+    pairs = [(a, b) for a in range(len(blocks)) for b in range(a, len(blocks))]
+
+    def compute(pair):
+        a, b = pairs[pair]
+        i, j = blocks[a], blocks[b]
+        if dense[i].all() and dense[j].all():
+            return pair, _dense_block_corr(standardized[:, dense_index[i]], standardized[:, dense_index[j]])
+        return pair, _block_corr(values[:, i], mask[:, i], values[:, j], mask[:, j])
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(pairs) > 1:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dataforge-corr') as pool:
+            results = list(pool.map(compute, range(len(pairs))))
+    else:
+        results = [compute(pair) for pair in range(len(pairs))]
+
+    for pair, block in results:
+        a, b = pairs[pair]
+        i, j = blocks[a], blocks[b]
+        corr[np.ix_(i, j)] = block
+        corr[np.ix_(j, i)] = block.T
+
+    # как в pandas: у колонки с данными корреляция с собой ровно 1
+    diagonal = np.diag(corr).copy()
+    np.fill_diagonal(corr, np.where(np.isnan(diagonal), np.nan, 1.0))
+    return corr, columns
+
+
+def top_pairs(corr: np.ndarray, columns: list, k: int = 20) -> list:
+    """k пар колонок с наибольшей по модулю корреляцией (без диагонали)."""
+    upper_i, upper_j = np.triu_indices(len(columns), 1)
+    values = corr[upper_i, upper_j]
+    valid = np.flatnonzero(~np.isnan(values))
+    if not valid.size:
+        return []
+    strength = np.abs(values[valid])
+    if valid.size > k:
+        best = valid[np.argpartition(-strength, k - 1)[:k]]
+    else:
+        best = valid
+    best = best[np.argsort(-np.abs(values[best]), kind='stable')]
+    return [
+        {"x": columns[upper_i[p]], "y": columns[upper_j[p]], "value": float(values[p])}
+        for p in best
+    ]
+
+
+def save_matrix(path: str, corr: np.ndarray, columns: list):
+    """
+    Сохраняет матрицу в .npz: только верхний треугольник без диагонали
+    в float32 — для 500 колонок это ~0.5 МБ вместо десятков МБ JSON.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    upper = corr[np.triu_indices(len(columns), 1)].astype('float32')
+    diagonal = np.diag(corr).astype('float32')
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, upper=upper, diagonal=diagonal, columns=np.array([str(c) for c in columns]))
+    os.replace(tmp, path)
+
+
+def load_matrix(path: str) -> pd.DataFrame:
+    """Восстанавливает полную симметричную матрицу из save_matrix."""
+    with np.load(path) as data:
+        columns = data['columns'].tolist()
+        k = len(columns)
+        corr = np.empty((k, k), dtype='float64')
+        upper_i, upper_j = np.triu_indices(k, 1)
+        corr[upper_i, upper_j] = data['upper']
+        corr[upper_j, upper_i] = data['upper']
+        corr[np.diag_indices(k)] = data['diagonal']
+    return pd.DataFrame(corr, index=columns, columns=columns)
+
+
+def strongest_columns(corr: np.ndarray, n: int) -> np.ndarray:
+    """
+    Индексы n колонок с самой сильной корреляцией с какой-либо другой колонкой
+    (максимум |r| вне диагонали), в исходном порядке.
+    """
+    k = len(corr)
+    if k <= n:
+        return np.arange(k)
+    strength = np.abs(np.nan_to_num(corr, nan=0.0))
+    np.fill_diagonal(strength, 0.0)
+    best = np.argpartition(-strength.max(axis=1), n - 1)[:n]
+    return np.sort(best)
+
+
+def cluster_order(corr: np.ndarray) -> np.ndarray:
+    """
+    Порядок колонок, при котором сильно связанные колонки стоят рядом:
+    иерархическая кластеризация (средняя связь) по расстоянию 1 - |r|,
+    колонки выводятся в порядке листьев дендрограммы.
+    Сложность O(k^3) — применяется к уже отобранным колонкам.
+    """
+    k = len(corr)
+    if k < 3:
+        return np.arange(k)
+    dist = 1.0 - np.abs(np.nan_to_num(corr, nan=0.0))
+    np.fill_diagonal(dist, np.inf)
+    members = [[i] for i in range(k)]
+    sizes = np.ones(k)
+    for _ in range(k - 1):
+        i, j = np.unravel_index(np.argmin(dist), dist.shape)
+        if i > j:
+            i, j = j, i
+        merged = (dist[i] * sizes[i] + dist[j] * sizes[j]) / (sizes[i] + sizes[j])
+        dist[i, :] = merged
+        dist[:, i] = merged
+        dist[i, i] = np.inf
+        dist[j, :] = np.inf
+        dist[:, j] = np.inf
+        sizes[i] += sizes[j]
+        members[i] = members[i] + members[j]
+    return np.array(members[0])
@@ -1,7 +1,9 @@
 # app/dashboard/__init__.py
 import dash
 import dash_bootstrap_components as dbc
-from flask import Blueprint
+from flask import Blueprint, request
+import gzip
+import importlib.util
 import os
 
 
@@ -22,7 +24,12 @@ def create_dash_app(flask_app):
         suppress_callback_exceptions=True,
         url_base_pathname='/dash/',
         assets_folder=os.path.join(os.path.dirname(__file__), 'assets'),
+        # ответы callbacks сжимаются: flask-compress, если установлен, иначе gzip ниже
+        compress=importlib.util.find_spec('flask_compress') is not None,
     )
+    if not dash_app.config.compress:
+        min_bytes = flask_app.config['RESPONSE_COMPRESS_MIN_BYTES']
+        flask_app.after_request(lambda response: _gzip_response(response, min_bytes))
     
     from .layout import serve_layout
     from .callbacks import register_callbacks
@@ -30,4 +37,20 @@ def create_dash_app(flask_app):
     dash_app.layout = serve_layout
     register_callbacks(dash_app)
     
-    return dash_app
\ No newline at end of file
+    return dash_app
+
+
+def _gzip_response(response, min_bytes: int):
+    """Сжимает gzip крупные JSON-ответы (графики, страницы таблицы), если браузер это принимает."""
+    if (response.status_code != 200 or response.direct_passthrough
+            or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers
+            or 'gzip' not in request.headers.get('Accept-Encoding', '').lower()):
+        return response
+    data = response.get_data()
+    if len(data) < min_bytes:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=5))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
\ No newline at end of file
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+AGGREGATIONS = ('sum', 'mean', 'count')
+
+
+def _accumulable(values: pd.Series) -> pd.Series:
+    """
+    Значения для суммирования: кеш хранит дробные колонки во float32
+    (см. storage._downcast), а сумма миллионов float32 теряет разряды.
+    Считаем во float64, сужение — только для передачи в браузер.
+    """
+    return values.astype('float64') if values.dtype == np.float32 else values
+
+
+def group_aggregate(df: pd.DataFrame, x: str, y: str, agg: str = 'sum') -> pd.DataFrame:
+    """
+    Агрегат y по значениям x одним векторизованным group-by.
+    Для count считаются непустые значения y; sum и mean — только для числовой y.
+
+    Returns:
+        DataFrame с колонками x и y, по строке на группу, отсортированный по x.
+    """
+    if agg not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation: {agg}")
+    if agg != 'count' and not pd.api.types.is_numeric_dtype(df[y]):
+        raise ValueError(f"Column {y} is not numeric, only count is available")
+    result = _accumulable(df[y]).groupby(df[x], sort=True, observed=True).agg(agg)
+    result.name = y
+    return result.reset_index()
+
+
+def box_stats(df: pd.DataFrame, x: str, y: str, max_outliers: int = 100):
+    """
+    Статистики box plot по группам x, как их считает Plotly (квартили
+    с линейной интерполяцией, усы — до крайних точек в пределах 1.5 IQR).
+
+    Returns:
+        (DataFrame по строке на группу: x, q1, median, q3, lowerfence,
+         upperfence, mean, count, outliers;
+         DataFrame с выборкой выбросов — не больше max_outliers на группу)
+    """
+    if not pd.api.types.is_numeric_dtype(df[y]) or pd.api.types.is_bool_dtype(df[y]):
+        raise ValueError(f"Column {y} is not numeric")
+    data = df[[x, y]].dropna()
+    data[y] = _accumulable(data[y])
+    groups = data.groupby(x, sort=True, observed=True)[y]
+
+    stats = groups.quantile([0.25, 0.5, 0.75]).unstack()
+    stats.columns = ['q1', 'median', 'q3']
+    stats['mean'] = groups.mean()
+    stats['count'] = groups.size()
+
+    iqr = stats['q3'] - stats['q1']
+    low = data[x].map(stats['q1'] - 1.5 * iqr)
+    high = data[x].map(stats['q3'] + 1.5 * iqr)
+    inside = (data[y] >= low) & (data[y] <= high)
+    fences = data[inside].groupby(x, sort=True, observed=True)[y]
+    stats['lowerfence'] = fences.min()
+    stats['upperfence'] = fences.max()
+
+    outliers = data[~inside]
+    stats['outliers'] = outliers.groupby(x, observed=True).size().reindex(stats.index, fill_value=0)
+    # выбросов может быть сколько угодно: в браузер уходит случайная выборка
+    sample = outliers.sample(frac=1, random_state=0).groupby(x, observed=True).head(max_outliers)
+    return stats.reset_index(), sample.sort_values(x)
@@ -1,33 +1,227 @@
 import uuid
-import pandas as pd
-from dash import dcc, html, Input, Output, State, ctx, ALL, no_update
+import json
+import math
+from flask import g
+from flask_login import current_user
+import plotly.express as px
+from dash import dcc, html, Input, Output, State, Patch, ctx, ALL, MATCH, no_update
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 from app import app
+from app.figure_cache import figure_cache
+from app.jobs import chart_queue
 from .data_manager import DataManager
 from .chart_factory import ChartFactory
 
 
 dm = DataManager(app.config.get('UPLOAD_FOLDER'))
+ChartFactory.configure(app.config)
+
+
+def _figure(handle: dict, spec: dict, job=None) -> str:
+    """
+    JSON графика по описанию spec (см. manage_cards) из общего кеша,
+    при промахе график строится. Если передан job, между стадиями
+    обновляется прогресс и проверяется отмена.
+    """
+    def step(stage: str, progress: float):
+        if job is not None:
+            job.check_cancelled()
+            job.report(stage, progress)
+
+    def build():
+        kind = spec["kind"]
+        step("load", 0.1)
+        if kind == "heatmap":
+            # матрица корреляций уже посчитана при загрузке файла
+            corr = dm.load_correlation(handle["dataset_id"])
+            step("render", 0.6)
+            return ChartFactory.correlation_heatmap(corr, spec["cluster"])
+        x, y = spec["x"], spec["y"]
+        if kind == "line" and not spec.get("filter") and dm.rows(handle) > ChartFactory.LINE_MAX_POINTS:
+            # линия по времени: крупный уровень пирамиды, мелкие — при увеличении
+            series = dm.time_series(handle, x, y, budget=ChartFactory.LINE_MAX_POINTS)
+            if series is not None:
+                step("render", 0.5)
+                return ChartFactory.time_series(*series, x, y)
+        # берём из серверного кеша только те колонки, которые попадут на график
+        columns = [c for c in (x, y) if c]
+        if spec.get("filter"):
+            # перекрёстный фильтр: строки выбираются по индексам, выборка общая для всех карточек
+            df = dm.filtered(handle, columns, spec["filter"])
+        else:
+            df = dm.resolve(handle, columns)
+        step("render", 0.5)
+        fig = ChartFactory.create(kind, df, x, y, spec["agg"] or "sum")
+        step("encode", 0.9)
+        return fig
+
+    key, version = dm.cache_key(handle)
+    return figure_cache.get_or_build(key, version, spec, build)
+
+
+def build_chart(job, handle: dict, spec: dict) -> str:
+    """Задача для chart_queue: строит график в фоновом потоке."""
+    with app.app_context():
+        # current_user в фоне недоступен — датасеты ищутся среди записей владельца задачи
+        g.dataset_owner = job.user_id
+        return _figure(handle, spec, job)
+
+
+def _graph(fig: dict, cid: str) -> dcc.Graph:
+    return dcc.Graph(
+        id={"role": "graph", "id": cid},
+        figure=fig,
+        config={
+            "displaylogo": False,
+            "modeBarButtonsToRemove": ["lasso2d"],
+            "responsive": True,
+        },
+        style={"height": "100%", "width": "100%"},
+        responsive=True,
+    )
+
+
+def _placeholder(job) -> html.Div:
+    """Заглушка карточки, пока график строится в фоне."""
+    stage = {"load": "Loading data", "render": "Rendering", "encode": "Encoding"}.get(job.stage, "Queued")
+    return html.Div(
+        [
+            html.Small(f"{stage}…", className="text-muted"),
+            dbc.Progress(value=round(job.progress * 100), striped=True, animated=True, className="mt-2"),
+        ],
+        className="d-flex flex-column justify-content-center h-100 px-4",
+    )
+
+
+def _card(cid: str, body, source: dict) -> html.Div:
+    """
+    Карточка доски; source — датасет и описание графика без фильтра, по ним
+    график перестраивается при увеличении и перекрёстной фильтрации.
+    """
+    return html.Div(
+        [
+            dbc.Button(
+                "✕",
+                id={"role": "close", "id": cid},
+                color="link",
+                size="sm",
+                style={
+                    "position": "absolute", 
+                    "top": 5, 
+                    "right": 4, 
+                    "zIndex": 1000
+                },
+            ),
+            html.Div(body, id={"role": "chart-body", "id": cid}, style={"height": "100%", "width": "100%"}),
+            dcc.Store(id={"role": "source", "id": cid}, data=source),
+        ],
+        id=cid,
+        style={
+            "height": "100%",
+            "width": "100%",
+            "padding": "8px",
+            "boxSizing": "border-box",
+            "backgroundColor": "#111",
+            "border": "1px solid #444",
+            "borderRadius": "10px",
+            "overflow": "hidden",
+        },
+    )
+
+
+# графики, выборка на которых задаёт набор категорий оси x, а не диапазон
+CATEGORY_KINDS = ("bar", "box")
+
+
+def _predicate(spec: dict, prop: str, value):
+    """
+    Условие перекрёстного фильтра из выделения на графике карточки: значения
+    категорий (клик или выделение столбцов) либо диапазон оси x. None — если
+    выделения нет или по такому графику фильтр не задаётся.
+    """
+    kind, x = spec["kind"], spec.get("x")
+    if kind == "heatmap" or not value:
+        return None
+    points = value.get("points") or []
+    if kind in CATEGORY_KINDS:
+        values = list(dict.fromkeys(point["x"] for point in points if "x" in point))
+        return {"column": x, "values": values} if values else None
+    if prop == "clickData":
+        return None
+    if "x" in (value.get("range") or {}):
+        low, high = value["range"]["x"]
+        return {"column": x, "range": [low, high]}
+    xs = [point["x"] for point in points if "x" in point]
+    return {"column": x, "range": [min(xs), max(xs)]} if xs else None
+
+
+def _filters_for(cid: str, source: dict, filters: dict) -> list:
+    """Условия других карточек по тому же датасету: своя выборка карточку не фильтрует."""
+    dataset_id = source["handle"]["dataset_id"]
+    return [{k: v for k, v in predicate.items() if k != "dataset_id"}
+            for other, predicate in sorted(filters.items())
+            if other != cid and predicate.get("dataset_id") == dataset_id]
+
+
+def _build_spec(cid: str, source, applied) -> tuple:
+    """Данные и спецификация, по которым строился график карточки: с её фильтром на момент добавления."""
+    if not source:
+        return None
+    predicates = (applied or {}).get(cid)
+    return source["handle"], dict(source["spec"], filter=predicates) if predicates else source["spec"]
+
+
+def _describe(predicate: dict) -> str:
+    if "values" in predicate:
+        return f'{predicate["column"]} ∈ {{{", ".join(map(str, predicate["values"]))}}}'
+    low, high = predicate["range"]
+    return f'{low} ≤ {predicate["column"]} ≤ {high}'
 
 def register_callbacks(app):
     @app.callback(
         Output("file-selector", "options"),
-        [Input("refresh-files", "n_clicks")],
+        Output("files-page", "data"),
+        Output("files-page-info", "children"),
+        Input("refresh-files", "n_clicks"),
+        Input("file-selector", "search_value"),
+        Input("files-prev", "n_clicks"),
+        Input("files-next", "n_clicks"),
+        State("files-page", "data"),
+        State("file-selector", "value"),
         prevent_initial_call=False
     )
-    def update_file_list(n_clicks):
-        return dm.get_available_files()
+    def update_file_list(n_clicks, search, prev_clicks, next_clicks, page, selected):
+        if not current_user.is_authenticated:
+            return [], 0, ""
+        page = page or 0
+        if ctx.triggered_id == "files-prev":
+            page = max(page - 1, 0)
+        elif ctx.triggered_id == "files-next":
+            page += 1
+        elif ctx.triggered_id == "file-selector":
+            page = 0  # новый поиск — с первой страницы
+
+        page_size = app.server.config['FILE_SELECTOR_PAGE_SIZE']
+        options, total = dm.get_available_files(current_user.id, search, page, page_size, selected)
+        pages = max(math.ceil(total / page_size), 1)
+        if page >= pages:
+            page = pages - 1
+            options, total = dm.get_available_files(current_user.id, search, page, page_size, selected)
+        return options, page, f"Page {page + 1} of {pages} · {total} files"
     
-    @app.callback(
+    # переключатель панели работает в браузере, без запроса к серверу
+    app.clientside_callback(
+        """
+        function(n, isOpen) {
+            return n ? !isOpen : isOpen;
+        }
+        """,
         Output("controls-offcanvas", "is_open"),
         Input("controls-toggle", "n_clicks"),
         State("controls-offcanvas", "is_open"),
         prevent_initial_call=True
     )
-    def toggle_sidebar(n, is_open):
-        if n:
-            return not is_open
-        return is_open
 
     @app.callback(
         Output("stored-data", "data"),
@@ -35,87 +229,164 @@ def register_callbacks(app):
         Input("file-selector", "value"),
         prevent_initial_call=True,
     )
-    def load_selected_file(filename):
-        if not filename:
+    def load_selected_file(dataset_id):
+        if not dataset_id:
             return no_update, no_update
         
         try:
-            data, preview = dm.load_from_directory(filename)
-            return data, dcc.Markdown(preview, dangerously_allow_html=True)
+            # в браузер уходит только дескриптор датасета, строки остаются на сервере
+            handle, preview = dm.load_from_directory(dataset_id)
+            return handle, dcc.Markdown(preview, dangerously_allow_html=True)
         except Exception as e:
             return no_update, dbc.Alert(str(e), color="danger")
 
+    @app.callback(
+        Output("correlation-matrix", "children"),
+        Input("show-correlation", "n_clicks"),
+        Input("file-selector", "value"),
+        prevent_initial_call=True,
+    )
+    def show_correlation(n_clicks, dataset_id):
+        # полная матрица грузится только по кнопке; при смене файла скрываем её
+        if ctx.triggered_id != "show-correlation" or not dataset_id:
+            return []
+        try:
+            corr = dm.load_correlation(dataset_id)
+        except Exception as e:
+            return dbc.Alert(str(e), color="warning")
+        fig = px.imshow(corr, zmin=-1, zmax=1, color_continuous_scale="RdBu_r",
+                        title="Correlation Matrix")
+        return dcc.Graph(figure=fig, style={"height": "500px"})
+
     @app.callback(
         Output("x-column", "options"),
         Output("y-column", "options"),
         Input("stored-data", "data"))
-    def update_columns(records):
-        if not records:
+    def update_columns(handle):
+        if not handle:
             return [], []
-        cols = [{"label": c, "value": c} for c in pd.DataFrame(records).columns]
+        # для списков осей достаточно схемы датасета, строки не читаются
+        cols = [{"label": c, "value": c} for c in dm.columns(handle)]
         return cols, cols
 
+    @app.callback(
+        Output("data-grid", "columns"),
+        Output("data-grid", "page_current"),
+        Output("data-grid", "page_size"),
+        Output("data-grid", "sort_by"),
+        Output("data-grid", "filter_query"),
+        Output("grid-wrapper", "style"),
+        Input("stored-data", "data"),
+        State("grid-wrapper", "style"))
+    def reset_grid(handle, style):
+        style = dict(style or {})
+        if not handle:
+            style["display"] = "none"
+            return [], 0, no_update, [], "", style
+        # новый датасет — с первой страницы, без сортировки и фильтра
+        style["display"] = "block"
+        columns = [{"name": c, "id": c} for c in dm.columns(handle)]
+        return columns, 0, app.server.config['DATA_GRID_PAGE_SIZE'], [], "", style
+
+    @app.callback(
+        Output("data-grid", "data"),
+        Output("data-grid", "page_count"),
+        Input("stored-data", "data"),
+        Input("data-grid", "page_current"),
+        Input("data-grid", "page_size"),
+        Input("data-grid", "sort_by"),
+        Input("data-grid", "filter_query"))
+    def update_grid(handle, page, page_size, sort_by, filter_query):
+        if not handle:
+            return [], 0
+        try:
+            rows, total = dm.page(handle, page or 0, page_size, sort_by, filter_query)
+        except ValueError:
+            # фильтр не разобран или ещё относится к предыдущему датасету
+            return [], 0
+        return rows, max(math.ceil(total / page_size), 1)
+
     @app.callback(
         Output("board", "layouts"),
         Output("board", "children"),
+        Output("board-cards", "data"),
+        Output("chart-jobs", "data"),
+        Output("chart-jobs-poll", "disabled"),
+        Output("cross-filter-applied", "data", allow_duplicate=True),
         Input("add-chart", "n_clicks"),
         Input({"role": "close", "id": ALL}, "n_clicks"),
         State("chart-type", "value"),
         State("x-column", "value"),
         State("y-column", "value"),
+        State("aggregation", "value"),
+        State("heatmap-options", "value"),
         State("stored-data", "data"),
+        State("board-cards", "data"),
+        State("chart-jobs", "data"),
+        State("cross-filter", "data"),
+        State("cross-filter-applied", "data"),
         State("board", "layouts"),
-        State("board", "children"),
+        State({"role": "source", "id": ALL}, "data"),
         prevent_initial_call=True,
     )
-    def manage_cards(_, __, kind, x, y, records, current_layouts, children):
+    def manage_cards(_, __, kind, x, y, agg, heatmap_options, handle, card_ids, pending, filters, applied, layouts, ___):
+        # доска меняется частичными обновлениями (Patch): на сервер и обратно
+        # идёт только добавляемая карточка или номер удаляемой, а не все графики.
+        # Порядок карточек хранится в board-cards и совпадает с порядком
+        # children; элементы layouts сетка переупорядочивает сама, поэтому
+        # при закрытии они ищутся по id карточки.
         t_id = ctx.triggered_id
-        
+        card_ids, pending = card_ids or [], pending or {}
+        updated_layouts, updated_children, updated_ids, updated_jobs = Patch(), Patch(), Patch(), Patch()
+
         if t_id == "add-chart":
-            if not (records and x and (y or kind == "histogram")):
-                return no_update, no_update
+            if not (handle and (kind == "heatmap" or (x and (y or kind == "histogram")))):
+                return no_update, no_update, no_update, no_update, no_update, no_update
             
-            df = pd.DataFrame(records)
-            fig = ChartFactory.create(kind, df, x, y)
+            spec = {"kind": kind, "chart": ChartFactory.settings()}
+            if kind == "heatmap":
+                spec["cluster"] = "cluster" in (heatmap_options or [])
+            else:
+                spec.update(x=x, y=y, agg=(agg or "sum") if kind == "bar" else None)
+            source = {"handle": handle, "spec": spec}
+
+            # новая карточка сразу учитывает выделения на остальных
             cid = str(uuid.uuid4())
-            
-            card = html.Div(
-                [
-                    dbc.Button(
-                        "✕",
-                        id={"role": "close", "id": cid},
-                        color="link",
-                        size="sm",
-                        style={
-                            "position": "absolute", 
-                            "top": 5, 
-                            "right": 4, 
-                            "zIndex": 1000
-                        },
-                    ),
-                    dcc.Graph(
-                        figure=fig,
-                        config={
-                            "displaylogo": False,
-                            "modeBarButtonsToRemove": ["select2d", "lasso2d"],
-                            "responsive": True,
-                        },
-                        style={"height": "100%", "width": "100%"},
-                        responsive=True,
-                    ),
-                ],
-                id=cid,
-                style={
-                    "height": "100%",
-                    "width": "100%",
-                    "padding": "8px",
-                    "boxSizing": "border-box",
-                    "backgroundColor": "#111",
-                    "border": "1px solid #444",
-                    "borderRadius": "10px",
-                    "overflow": "hidden",
-                },
-            )
+            predicates = _filters_for(cid, source, filters or {}) if kind != "heatmap" else []
+            if predicates:
+                spec = dict(spec, filter=predicates)
+
+            # незавершённые построения этого же графика (датасет, тип, оси) для других
+            # карточек: точно такой же (те же данные, настройки и фильтр) новая карточка
+            # ждёт, а построение с другой спецификацией устарело и отменяется —
+            # его карточка остаётся на доске с пометкой об отмене
+            sources = {state["id"]["id"]: state.get("value") for state in ctx.states_list[-1]}
+            same = None
+            for other in card_ids:
+                built = _build_spec(other, sources.get(other), applied) if other in pending else None
+                if built is None or built[0]["dataset_id"] != handle["dataset_id"] or any(
+                        built[1].get(name) != spec.get(name) for name in ("kind", "x", "y")):
+                    continue
+                job = chart_queue.get(pending[other])
+                if job is None or job.finished_at:
+                    continue
+                if built == (handle, spec) and not job.is_cancelled():
+                    same = job
+                else:
+                    chart_queue.cancel(job.id)
+
+            # одинаковый график по тем же данным строится один раз для всех пользователей;
+            # из кеша и по небольшим датасетам — сразу, тяжёлые — в фоновом пуле
+            key, version = dm.cache_key(handle)
+            fig = figure_cache.get(key, version, spec)
+            if fig is None and (kind == "heatmap" or dm.rows(handle) < app.server.config['CHART_BACKGROUND_ROWS']):
+                fig = _figure(handle, spec)
+            if fig is not None:
+                body = _graph(json.loads(fig), cid)
+            else:
+                job = same or chart_queue.submit(build_chart, current_user.id, None, handle, spec)
+                updated_jobs[cid] = job.id
+                body = _placeholder(job)
             
             new_layout = {
                 "lg": {"i": cid, "x": 0, "y": 0, "w": 6, "h": 4, "minW": 3, "minH": 2},
@@ -124,30 +395,212 @@ def register_callbacks(app):
                 "xs": {"i": cid, "x": 0, "y": 0, "w": 12, "h": 4, "minW": 12, "minH": 2},
             }
             
-            updated_layouts = current_layouts or {"lg": [], "md": [], "sm": [], "xs": []}
             for breakpoint in ["lg", "md", "sm", "xs"]:
-                if breakpoint not in updated_layouts:
-                    updated_layouts[breakpoint] = []
-                updated_layouts[breakpoint].append(new_layout[breakpoint])
-            
-            updated_children = (children or []) + [card]
-            return updated_layouts, updated_children
+                if breakpoint in (layouts or {}):
+                    updated_layouts[breakpoint].append(new_layout[breakpoint])
+                else:
+                    updated_layouts[breakpoint] = [new_layout[breakpoint]]
+            updated_children.append(_card(cid, body, source))
+            updated_ids.append(cid)
+            updated_applied = Patch()
+            if predicates:
+                updated_applied[cid] = predicates
+            return updated_layouts, updated_children, updated_ids, updated_jobs, fig is not None and not pending, updated_applied
 
         if isinstance(t_id, dict) and t_id.get("role") == "close":
             cid = t_id["id"]
-            
-            new_children = [c for c in children if c["props"]["id"] != cid]
-            
-            updated_layouts = current_layouts or {"lg": [], "md": [], "sm": [], "xs": []}
-            for breakpoint in updated_layouts:
-                updated_layouts[breakpoint] = [
-                    item for item in updated_layouts[breakpoint] 
-                    if item.get("i") != cid
-                ]
-            
-            return updated_layouts, new_children
+            # новая карточка тоже вызывает callback (n_clicks=None) — это не закрытие
+            if not ctx.triggered[0]["value"] or cid not in card_ids:
+                return no_update, no_update, no_update, no_update, no_update, no_update
+            if cid in pending:
+                # задачу могут ждать и другие карточки с тем же графиком
+                if not any(other != cid and job == pending[cid] for other, job in pending.items()):
+                    chart_queue.cancel(pending[cid])
+                del updated_jobs[cid]
+            index = card_ids.index(cid)
+            del updated_children[index]
+            del updated_ids[index]
+            updated_layouts = {breakpoint: [item for item in items if item["i"] != cid]
+                               for breakpoint, items in (layouts or {}).items()}
+            return updated_layouts, updated_children, updated_ids, updated_jobs, no_update, no_update
 
-        return no_update, no_update
+        return no_update, no_update, no_update, no_update, no_update, no_update
+
+    @app.callback(
+        Output({"role": "chart-body", "id": ALL}, "children"),
+        Output("chart-jobs", "data", allow_duplicate=True),
+        Output("chart-jobs-poll", "disabled", allow_duplicate=True),
+        Input("chart-jobs-poll", "n_intervals"),
+        State("chart-jobs", "data"),
+        prevent_initial_call=True,
+    )
+    def poll_charts(_, pending):
+        # спрашивает пул о графиках, которые строятся в фоне: прогресс в заглушке,
+        # готовый график — вместо неё; запрос короткий и не ждёт построения
+        pending = pending or {}
+        bodies, finished, running = [], Patch(), 0
+        for output in ctx.outputs_list[0]:
+            cid = output["id"]["id"]
+            if cid not in pending:
+                bodies.append(no_update)
+                continue
+            job = chart_queue.get(pending[cid])
+            if job is None or job.user_id != current_user.id:
+                bodies.append(dbc.Alert("Chart build expired, add it again", color="warning"))
+            elif job.status == "done":
+                bodies.append(_graph(json.loads(job.result), cid))
+            elif job.status == "failed":
+                bodies.append(dbc.Alert(job.error, color="danger"))
+            elif job.status == "cancelled":
+                bodies.append(dbc.Alert("Chart build cancelled", color="secondary"))
+            else:
+                bodies.append(_placeholder(job))
+                running += 1
+                continue
+            del finished[cid]
+        return bodies, finished, running == 0
+
+    @app.callback(
+        Output({"role": "graph", "id": MATCH}, "figure"),
+        Input({"role": "graph", "id": MATCH}, "relayoutData"),
+        State({"role": "source", "id": MATCH}, "data"),
+        State("cross-filter-applied", "data"),
+        prevent_initial_call=True,
+    )
+    def refine_time_series(relayout, source, applied):
+        # увеличение линии по времени: с сервера приходит только видимое окно
+        # на более мелком уровне пирамиды (или исходные строки), вид графика
+        # сохраняется через uirevision. Отфильтрованная линия строится
+        # по выборке строк без пирамиды — её масштабирует сам браузер
+        cid = ctx.triggered_id["id"] if ctx.triggered_id else None
+        if not source or source["spec"]["kind"] != "line" or not relayout or (applied or {}).get(cid):
+            raise PreventUpdate
+        if relayout.get("xaxis.autorange"):
+            start = end = None
+        elif "xaxis.range[0]" in relayout:
+            start, end = relayout["xaxis.range[0]"], relayout["xaxis.range[1]"]
+        elif "xaxis.range" in relayout:
+            start, end = relayout["xaxis.range"]
+        else:
+            raise PreventUpdate
+
+        x, y = source["spec"]["x"], source["spec"]["y"]
+        series = dm.time_series(source["handle"], x, y, start, end, ChartFactory.LINE_MAX_POINTS)
+        if series is None:
+            raise PreventUpdate
+        fig = json.loads(ChartFactory.time_series(*series, x, y).to_json())
+        patched = Patch()
+        patched["data"] = fig["data"]
+        patched["layout"]["annotations"] = fig["layout"]["annotations"]
+        patched["layout"]["meta"] = fig["layout"]["meta"]
+        return patched
+
+    @app.callback(
+        Output("cross-filter", "data"),
+        Input({"role": "graph", "id": ALL}, "selectedData"),
+        Input({"role": "graph", "id": ALL}, "clickData"),
+        Input("clear-filters", "n_clicks"),
+        Input("board-cards", "data"),
+        State({"role": "source", "id": ALL}, "data"),
+        State("cross-filter", "data"),
+        prevent_initial_call=True,
+    )
+    def select_filter(_, __, ___, card_ids, sources, filters):
+        # состояние фильтра — условие на колонку от каждой карточки с выделением
+        # (значения или диапазон), а не список строк: строки выбираются на сервере
+        t_id = ctx.triggered_id
+        filters = dict(filters or {})
+        if t_id == "clear-filters":
+            return {}
+        if t_id == "board-cards":
+            # выделение закрытой карточки больше не фильтрует остальные
+            kept = {cid: predicate for cid, predicate in filters.items() if cid in (card_ids or [])}
+            if kept == filters:
+                raise PreventUpdate
+            return kept
+        if not isinstance(t_id, dict) or len(ctx.triggered) != 1:
+            raise PreventUpdate
+
+        cid = t_id["id"]
+        prop = ctx.triggered[0]["prop_id"].rsplit(".", 1)[-1]
+        value = ctx.triggered[0]["value"]
+        source = {state["id"]["id"]: data for state, data in zip(ctx.states_list[0], sources)}.get(cid)
+        if not source:
+            raise PreventUpdate
+        predicate = _predicate(source["spec"], prop, value)
+        if predicate is not None:
+            filters[cid] = dict(predicate, dataset_id=source["handle"]["dataset_id"])
+        elif prop == "selectedData" and value is None and cid in filters:
+            # двойной щелчок снимает выделение
+            del filters[cid]
+        else:
+            raise PreventUpdate
+        return filters
+
+    @app.callback(
+        Output({"role": "chart-body", "id": ALL}, "children", allow_duplicate=True),
+        Output("cross-filter-applied", "data"),
+        Output("cross-filter-summary", "children"),
+        Output("cross-filter-bar", "style"),
+        Output("chart-jobs", "data", allow_duplicate=True),
+        Output("chart-jobs-poll", "disabled", allow_duplicate=True),
+        Input("cross-filter", "data"),
+        State({"role": "source", "id": ALL}, "data"),
+        State("cross-filter-applied", "data"),
+        State("cross-filter-bar", "style"),
+        State("chart-jobs", "data"),
+        prevent_initial_call=True,
+    )
+    def apply_filter(filters, sources, applied, style, pending):
+        # перестраиваются только карточки, у которых изменился набор чужих условий;
+        # выборка строк по одним и тем же условиям считается один раз (DataManager.selection),
+        # а готовые графики по тем же условиям берутся из кеша. Как и при добавлении
+        # карточки, тяжёлые графики строятся в фоновом пуле: карточка показывает
+        # заглушку, готовый график подставляет poll_charts
+        filters, applied, pending = filters or {}, dict(applied or {}), pending or {}
+        sources = {state["id"]["id"]: data for state, data in zip(ctx.states_list[0], sources)}
+        bodies, updated_jobs, submitted = [], Patch(), False
+        for output in ctx.outputs_list[0]:
+            cid = output["id"]["id"]
+            source = sources.get(cid)
+            if not source or source["spec"]["kind"] == "heatmap":
+                bodies.append(no_update)
+                continue
+            predicates = _filters_for(cid, source, filters)
+            if predicates == applied.get(cid, []):
+                bodies.append(no_update)
+                continue
+            handle = source["handle"]
+            spec = dict(source["spec"], filter=predicates) if predicates else source["spec"]
+            key, version = dm.cache_key(handle)
+            try:
+                fig = figure_cache.get(key, version, spec)
+                if fig is None and dm.rows(handle) < app.server.config['CHART_BACKGROUND_ROWS']:
+                    fig = _figure(handle, spec)
+            except Exception as e:
+                bodies.append(no_update)
+                app.server.logger.warning(f"Cross-filter failed for card {cid}: {str(e)}")
+                continue
+            if cid in pending:
+                # построение по прежним условиям больше не нужно, если его не ждут другие карточки
+                if not any(other != cid and job == pending[cid] for other, job in pending.items()):
+                    chart_queue.cancel(pending[cid])
+                if fig is not None:
+                    del updated_jobs[cid]
+            if fig is not None:
+                bodies.append(_graph(json.loads(fig), cid))
+            else:
+                job = chart_queue.submit(build_chart, current_user.id, None, handle, spec)
+                updated_jobs[cid] = job.id
+                bodies.append(_placeholder(job))
+                submitted = True
+            applied[cid] = predicates
+
+        style = dict(style or {})
+        style["display"] = "flex" if filters else "none"
+        summary = " · ".join(_describe(predicate) for predicate in filters.values())
+        applied = {cid: value for cid, value in applied.items() if value}
+        return bodies, applied, summary, style, updated_jobs, False if submitted else no_update
 
     @app.callback(
         Output("download-file", "data"),
@@ -155,13 +608,13 @@ def register_callbacks(app):
         State("file-selector", "value"),
         prevent_initial_call=True
     )
-    def trigger_download(n_clicks, filename):
-        if not filename:
+    def trigger_download(n_clicks, dataset_id):
+        if not dataset_id:
             raise no_update
         
         try:
-            file_path = dm.get_file_path(filename)
-            return dcc.send_file(file_path)
+            file_path, filename = dm.get_file_path(dataset_id)
+            return dcc.send_file(file_path, filename=filename)
         except Exception as e:
             print(f"Download error: {str(e)}")
             return no_update
@@ -172,17 +625,18 @@ def register_callbacks(app):
         State("file-selector", "value"),
         prevent_initial_call=True
     )
-    def show_download_status(n_clicks, filename):
-        if not filename:
+    def show_download_status(n_clicks, dataset_id):
+        if not dataset_id:
             return dbc.Alert("Please select a file first", color="danger", duration=3000)
         return no_update
    
-    @app.callback(
+    app.clientside_callback(
+        """
+        function(n, isOpen) {
+            return n ? !isOpen : isOpen;
+        }
+        """,
         Output("navbar-collapse", "is_open"),
         Input("navbar-toggler", "n_clicks"),
         State("navbar-collapse", "is_open")
     )
-    def toggle_nav(n, is_open):
-        if n:
-            return not is_open
-        return is_open
@@ -1,24 +1,241 @@
 import plotly.express as px
+import plotly.graph_objects as go
 import pandas as pd
+import numpy as np
+from app.correlation import cluster_order, correlation_matrix, strongest_columns
+from .aggregation import box_stats, group_aggregate
+from .downsampling import density_grid, downsample, histogram_bins
+from .encoding import compact_figure
 
 
 class ChartFactory:
+    # Бюджет отрисовки: сколько точек отдавать в браузер (см. configure)
+    LINE_MAX_POINTS = 5_000
+    DOWNSAMPLER = 'lttb'
+    SCATTER_WEBGL_POINTS = 10_000
+    SCATTER_DENSITY_POINTS = 200_000
+    DENSITY_BINS = 200
+    BOX_MAX_OUTLIERS = 100
+    HEATMAP_MAX_COLUMNS = 50
+    HISTOGRAM_RAW_ROWS = 100_000
+    HISTOGRAM_BINS = 100
+
+    @classmethod
+    def configure(cls, config):
+        cls.LINE_MAX_POINTS = config.get('CHART_LINE_MAX_POINTS', cls.LINE_MAX_POINTS)
+        cls.DOWNSAMPLER = config.get('CHART_DOWNSAMPLER', cls.DOWNSAMPLER)
+        cls.SCATTER_WEBGL_POINTS = config.get('CHART_SCATTER_WEBGL_POINTS', cls.SCATTER_WEBGL_POINTS)
+        cls.SCATTER_DENSITY_POINTS = config.get('CHART_SCATTER_DENSITY_POINTS', cls.SCATTER_DENSITY_POINTS)
+        cls.DENSITY_BINS = config.get('CHART_DENSITY_BINS', cls.DENSITY_BINS)
+        cls.BOX_MAX_OUTLIERS = config.get('CHART_BOX_MAX_OUTLIERS', cls.BOX_MAX_OUTLIERS)
+        cls.HEATMAP_MAX_COLUMNS = config.get('CHART_HEATMAP_MAX_COLUMNS', cls.HEATMAP_MAX_COLUMNS)
+        cls.HISTOGRAM_RAW_ROWS = config.get('CHART_HISTOGRAM_RAW_ROWS', cls.HISTOGRAM_RAW_ROWS)
+        cls.HISTOGRAM_BINS = config.get('CHART_HISTOGRAM_BINS', cls.HISTOGRAM_BINS)
+
+    @classmethod
+    def settings(cls) -> dict:
+        """Текущий бюджет отрисовки: входит в ключ кеша графиков."""
+        return {
+            'line_max_points': cls.LINE_MAX_POINTS,
+            'downsampler': cls.DOWNSAMPLER,
+            'scatter_webgl_points': cls.SCATTER_WEBGL_POINTS,
+            'scatter_density_points': cls.SCATTER_DENSITY_POINTS,
+            'density_bins': cls.DENSITY_BINS,
+            'box_max_outliers': cls.BOX_MAX_OUTLIERS,
+            'heatmap_max_columns': cls.HEATMAP_MAX_COLUMNS,
+            'histogram_raw_rows': cls.HISTOGRAM_RAW_ROWS,
+            'histogram_bins': cls.HISTOGRAM_BINS,
+        }
+
     @staticmethod
-    def create(kind: str, df: pd.DataFrame, x: str, y: str = None):
+    def create(kind: str, df: pd.DataFrame, x: str, y: str = None, agg: str = 'sum'):
         if kind == 'line':
-            fig = px.line(df, x=x, y=y, title=f'{y} vs {x}')
+            fig = ChartFactory._line(df, x, y)
         if kind == 'bar':
-            fig = px.bar(df, x=x, y=y, title=f'{y} by {x}')
+            # группировка на сервере: в браузер уходит по столбцу на группу
+            grouped = group_aggregate(df, x, y, agg)
+            fig = go.Figure(go.Bar(x=grouped[x], y=grouped[y], name=y))
+            fig.update_layout(title=f'{agg} of {y} by {x}', xaxis_title=x, yaxis_title=y)
         if kind == 'scatter':
-            fig = px.scatter(df, x=x, y=y, title=f'{y} vs {x}')
+            fig = ChartFactory._scatter(df, x, y)
         if kind == 'histogram':
-            fig = px.histogram(df, x=x, title=f'Distribution of {x}')
+            fig = ChartFactory._histogram(df, x)
         if kind == 'box':
-            fig = px.box(df, x=x, y=y, title=f'{y} by {x}')
+            fig = ChartFactory._box(df, x, y)
         if kind == 'heatmap':
-            num = df.select_dtypes('number')
-            if num.empty:
+            # карточки строят heatmap по сохранённой матрице (DataManager.load_correlation);
+            # здесь — тот же блочный расчёт и та же отрисовка для произвольной таблицы
+            corr, columns = correlation_matrix(df)
+            if not columns:
                 raise ValueError("No numeric columns for heatmap")
-            fig = px.imshow(num.corr(), title='Correlation Heatmap')
+            return ChartFactory.correlation_heatmap(pd.DataFrame(corr, index=columns, columns=columns))
+
+        # массивы уходят в браузер типизированным base64, а не списками чисел
+        return compact_figure(fig)
+
+    @staticmethod
+    def correlation_heatmap(corr: pd.DataFrame, cluster: bool = False):
+        """
+        Heatmap по уже посчитанной матрице корреляций. Для широких данных
+        показываются HEATMAP_MAX_COLUMNS колонок с самыми сильными связями;
+        cluster=True ставит связанные колонки рядом.
+        """
+        values = corr.to_numpy()
+        columns = np.asarray(corr.columns)
+        keep = strongest_columns(values, ChartFactory.HEATMAP_MAX_COLUMNS)
+        values = values[np.ix_(keep, keep)]
+        if cluster:
+            order = cluster_order(values)
+            values, keep = values[np.ix_(order, order)], keep[order]
+        labels = [str(c) for c in columns[keep]]
+
+        fig = px.imshow(values, x=labels, y=labels, zmin=-1, zmax=1,
+                        color_continuous_scale='RdBu_r', title='Correlation Heatmap')
+        if len(keep) < len(columns):
+            fig.add_annotation(
+                text=f'Top {len(keep)} of {len(columns)} columns by strongest correlation',
+                xref='paper', yref='paper', x=1, y=1.06, xanchor='right', showarrow=False,
+                font={'size': 11, 'color': '#aaa'})
+            fig.update_layout(meta={'columns': {'shown': len(keep), 'total': len(columns)}})
+        return compact_figure(fig)
+
+    @staticmethod
+    def time_series(level: str, frame: pd.DataFrame, rows: int, x: str, y: str):
+        """
+        Линия по времени из окна пирамиды (app.timeseries.query): исходные
+        строки или полоса min–max корзин уровня со средним посередине.
+        uirevision сохраняет масштаб, когда окно перестраивается при увеличении.
+        """
+        if level == 'raw':
+            fig = px.line(frame, x=x, y=y, title=f'{y} vs {x}')
+            label = f'{rows:,} rows'
+        else:
+            fig = go.Figure([
+                go.Scatter(x=frame[x], y=frame['max'], name='max', mode='lines',
+                           line={'width': 0}, showlegend=False, hoverinfo='skip'),
+                go.Scatter(x=frame[x], y=frame['min'], name='min–max', mode='lines',
+                           line={'width': 0}, fill='tonexty', fillcolor='rgba(99, 110, 250, 0.25)'),
+                go.Scatter(x=frame[x], y=frame['mean'], name='mean', mode='lines',
+                           line={'color': '#636efa'}, customdata=frame['rows'],
+                           hovertemplate='%{x}<br>mean=%{y}<br>rows=%{customdata}<extra></extra>'),
+            ])
+            fig.update_layout(title=f'{y} vs {x}', xaxis_title=x, yaxis_title=y, showlegend=False)
+            label = f'{len(frame):,} {level} buckets of {rows:,} rows (min/max/mean)'
+        fig.add_annotation(
+            text=f'Level: {level} · {label}',
+            xref='paper', yref='paper', x=1, y=1.06, xanchor='right', showarrow=False,
+            font={'size': 11, 'color': '#aaa'})
+        fig.update_layout(uirevision=f'{x}/{y}', meta={'pyramid': {
+            'level': level, 'points': len(frame), 'rows': rows}})
+        return compact_figure(fig)
+
+    @staticmethod
+    def _line(df: pd.DataFrame, x: str, y: str):
+        rows = len(df)
+        if rows <= ChartFactory.LINE_MAX_POINTS:
+            return px.line(df, x=x, y=y, title=f'{y} vs {x}')
+        # линия прореживается с сохранением формы, отрисовка через WebGL
+        method = ChartFactory.DOWNSAMPLER
+        sample = downsample(df, x, y, ChartFactory.LINE_MAX_POINTS, method)
+        fig = ChartFactory._webgl(sample, x, y, 'lines')
+        return ChartFactory._mark_reduced(fig, rows, len(sample), method)
+
+    @staticmethod
+    def _scatter(df: pd.DataFrame, x: str, y: str):
+        rows = len(df)
+        if rows <= ChartFactory.SCATTER_WEBGL_POINTS:
+            return px.scatter(df, x=x, y=y, title=f'{y} vs {x}')
+        if rows <= ChartFactory.SCATTER_DENSITY_POINTS:
+            return ChartFactory._webgl(df, x, y, 'markers')
 
+        if all(ChartFactory._is_continuous(df[c]) for c in (x, y)):
+            # слишком много точек: плотность на сетке, посчитанная на сервере
+            bins = ChartFactory.DENSITY_BINS
+            x_centers, y_centers, counts = density_grid(df[x], df[y], bins)
+            if pd.api.types.is_datetime64_any_dtype(df[x]):
+                x_centers = pd.to_datetime(x_centers)
+            if pd.api.types.is_datetime64_any_dtype(df[y]):
+                y_centers = pd.to_datetime(y_centers)
+            fig = go.Figure(go.Heatmap(
+                x=x_centers, y=y_centers, z=counts, colorscale='Viridis',
+                colorbar={'title': 'points'}, hovertemplate='x=%{x}<br>y=%{y}<br>points=%{z}<extra></extra>'))
+            fig.update_layout(title=f'{y} vs {x}', xaxis_title=x, yaxis_title=y)
+            return ChartFactory._mark_reduced(fig, rows, bins * bins, 'density')
+
+        # по категориальной оси плотность не построить: равномерная выборка строк
+        points = ChartFactory.SCATTER_DENSITY_POINTS
+        sample = df.sample(points, random_state=0).sort_index()
+        fig = ChartFactory._webgl(sample, x, y, 'markers')
+        return ChartFactory._mark_reduced(fig, rows, points, 'random sample')
+
+    @staticmethod
+    def _webgl(df: pd.DataFrame, x: str, y: str, mode: str):
+        """
+        Большая линия или облако точек через WebGL. Фигура собирается напрямую
+        из graph_objects: plotly.express тратит на разбор аргументов больше,
+        чем на сами данные, а графики по выборкам перестраиваются часто.
+        """
+        fig = go.Figure(go.Scattergl(x=df[x], y=df[y], mode=mode, name=y))
+        fig.update_layout(title=f'{y} vs {x}', xaxis_title=x, yaxis_title=y)
+        return fig
+
+    @staticmethod
+    def _histogram(df: pd.DataFrame, x: str):
+        """Гистограмма; по большой выборке корзины считаются на сервере."""
+        rows = len(df)
+        if rows <= ChartFactory.HISTOGRAM_RAW_ROWS:
+            return px.histogram(df, x=x, title=f'Distribution of {x}')
+        values = df[x].dropna()
+        if ChartFactory._is_continuous(values):
+            bins = ChartFactory.HISTOGRAM_BINS
+            centers, widths, counts = histogram_bins(values, bins)
+            fig = go.Figure(go.Bar(x=centers, y=counts, width=widths, name=x,
+                                   hovertemplate='x=%{x}<br>count=%{y}<extra></extra>'))
+        else:
+            counts = values.value_counts(sort=False)
+            counts = counts[counts > 0].sort_index()
+            bins = len(counts)
+            fig = go.Figure(go.Bar(x=counts.index.astype(str), y=counts.to_numpy(), name=x))
+        fig.update_layout(title=f'Distribution of {x}', xaxis_title=x, yaxis_title='count', bargap=0)
+        fig.update_layout(meta={'aggregated': {'rows': rows, 'bins': bins}})
+        return fig
+
+    @staticmethod
+    def _box(df: pd.DataFrame, x: str, y: str):
+        """Box plot из посчитанных на сервере квартилей, усов и выборки выбросов."""
+        stats, outliers = box_stats(df, x, y, ChartFactory.BOX_MAX_OUTLIERS)
+        fig = go.Figure(go.Box(
+            x=stats[x], q1=stats['q1'], median=stats['median'], q3=stats['q3'],
+            lowerfence=stats['lowerfence'], upperfence=stats['upperfence'], mean=stats['mean'],
+            name=y, boxpoints=False))
+        fig.add_trace(go.Scattergl(
+            x=outliers[x], y=outliers[y], mode='markers', name='outliers',
+            marker={'size': 4, 'opacity': 0.6}))
+        fig.update_layout(title=f'{y} by {x}', xaxis_title=x, yaxis_title=y, showlegend=False)
+
+        total = int(stats['outliers'].sum())
+        if total > len(outliers):
+            fig.add_annotation(
+                text=f'Outliers: {len(outliers):,} of {total:,} shown',
+                xref='paper', yref='paper', x=1, y=1.06, xanchor='right', showarrow=False,
+                font={'size': 11, 'color': '#aaa'})
+        fig.update_layout(meta={'aggregated': {
+            'rows': int(stats['count'].sum()), 'groups': len(stats),
+            'outliers': total, 'outliers_shown': len(outliers)}})
+        return fig
+
+    @staticmethod
+    def _is_continuous(values: pd.Series) -> bool:
+        return pd.api.types.is_datetime64_any_dtype(values) or (
+            pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values))
+
+    @staticmethod
+    def _mark_reduced(fig, rows: int, points: int, method: str):
+        """Помечает график, построенный не по всем строкам: подпись и layout.meta."""
+        label = f'{points:,} cells' if method == 'density' else f'{points:,} points'
+        fig.add_annotation(
+            text=f'Downsampled: {rows:,} rows → {label} ({method})',
+            xref='paper', yref='paper', x=1, y=1.06, xanchor='right', showarrow=False,
+            font={'size': 11, 'color': '#aaa'})
+        fig.update_layout(meta={'downsampled': {'rows': rows, 'points': points, 'method': method}})
         return fig
\ No newline at end of file
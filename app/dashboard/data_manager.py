@@ -2,80 +2,335 @@ import os
 import pandas as pd
 import base64
 import io
-from typing import List, Tuple
-from werkzeug.utils import safe_join
+from typing import List, Optional, Tuple
+from flask import current_app, g
+from flask_login import current_user
 import json
+import pyarrow as pa
+from app.storage import cache_path, ensure_cache, read_cache, read_head, read_schema, row_count, source_path
+from app.grid import query_page
+from app.indexes import build_indexes, categorical, index_dir, normalize, selection, load_manifest as load_index_manifest
+from app.timeseries import build_pyramids, load_manifest, pyramid_dir, query
+from app.correlation import correlation_matrix, load_matrix, save_matrix
+from app.jobs import correlation_path, preview_path
+from app.metrics import load_metrics
+from app.frame_cache import frame_cache
+from app.models import Dataset
 
 
 class DataManager:
     def __init__(self, data_directory: str = "./data"):
         self.data_directory = data_directory
-        self.supported_extensions = ['.csv', '.xlsx', '.xls', '.json']
+        self.supported_extensions = ['.csv', '.xlsx', '.xls', '.json', '.ndjson', '.jsonl']
         
         if not os.path.exists(data_directory):
             os.makedirs(data_directory)
     
-    def get_available_files(self) -> List[dict]:
+    def get_available_files(self, user_id: int, search: str = None, page: int = 0,
+                            page_size: int = 50, selected: int = None) -> Tuple[List[dict], int]:
+        """
+        Страница файлов пользователя для выпадающего списка: запрос к Dataset
+        по индексу (user_id, upload_date), поиск по имени — на стороне БД.
+        Размер таблицы берётся из сохранённых row_count/column_count, файлы не открываются.
+        Значение опции — id записи: у файлов с одинаковым именем разное содержимое.
+
+        Returns:
+            (опции dcc.Dropdown, сколько всего файлов подходит под поиск)
+        """
+        query = Dataset.query.filter(Dataset.user_id == user_id)
+        if search:
+            pattern = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            query = query.filter(Dataset.filename.ilike(f"%{pattern}%", escape='\\'))
+        total = query.count()
+        entities = (Dataset.id, Dataset.filename, Dataset.status, Dataset.row_count, Dataset.column_count)
+        rows = (query.with_entities(*entities)
+                .order_by(Dataset.upload_date.desc(), Dataset.id.desc())
+                .offset(page * page_size).limit(page_size).all())
+
+        # выбранный файл остаётся в списке, даже если он на другой странице
+        if selected and str(selected) not in {str(row.id) for row in rows}:
+            current = Dataset.query.filter_by(user_id=user_id, id=selected).with_entities(*entities).first()
+            if current is not None:
+                rows.insert(0, current)
+
         files = []
-        try:
-            for filename in os.listdir(self.data_directory):
-                file_path = os.path.join(self.data_directory, filename)
-                if os.path.isfile(file_path):
-                    _, ext = os.path.splitext(filename)
-                    if ext.lower() in self.supported_extensions:
-                        files.append({
-                            "label": filename,
-                            "value": filename
-                        })
-        except Exception as e:
-            print(f"Error: {e}")
-        
-        return sorted(files, key=lambda x: x["label"])
+        for row in rows:
+            label = row.filename
+            if row.status == 'processing':
+                label += " (processing)"
+            elif row.row_count is not None:
+                label += f" · {row.row_count:,} × {row.column_count}"
+            files.append({"label": label, "value": row.id})
+        return files, total
     
-    def load_from_directory(self, filename: str) -> Tuple[List[dict], str]:
-        if not filename:
+    def load_from_directory(self, dataset_id: int) -> Tuple[Optional[dict], str]:
+        """
+        Готовит выбранный файл (id записи текущего пользователя): рендерит превью
+        по метаданным Parquet-кеша (число строк, схема) и первым строкам,
+        не читая датасет целиком.
+
+        Returns:
+            (дескриптор датасета для dcc.Store или None, пока файл обрабатывается;
+             превью в Markdown). Сами строки остаются на сервере — callbacks
+            получают их через resolve(дескриптор).
+        """
+        if not dataset_id:
             raise ValueError("No name for file")
-        
-        file_path = os.path.join(self.data_directory, filename)
-        
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"File {filename} not founded")
-        
-        try:
-            _, ext = os.path.splitext(filename)
-            ext = ext.lower()
-            
-            if ext == '.csv':
-                df = pd.read_csv(file_path)
-            elif ext in ['.xlsx', '.xls']:
-                df = pd.read_excel(file_path)
-            elif ext == '.json':
-                df = pd.read_json(file_path)
-            else:
-                raise ValueError(f"Incompatible file type: {ext}")
-            
-            records = df.to_dict('records')
-            preview = self._create_preview(df, filename)
+        dataset = self._dataset(dataset_id)
+        filename = dataset.filename
 
-            # Получаем метрики
-            metrics_filename = filename.rsplit('.', 1)[0] + '_metrics.json'
-            metrics_filepath = self.data_directory + '/metrics_data/' + metrics_filename
-            with open(metrics_filepath, 'r', encoding='utf-8') as f:
-                stats_result = json.load(f)
-            if stats_result["success"]:
-                metrics_markdown = self._format_metrics(stats_result["result"])
-                preview += "\n\n---\n\n" + metrics_markdown
-            else:
-                preview += f"\n\n**Error while processing stats:** {stats_result['error']}"
+        if dataset.status == 'processing':
+            return None, self._processing_preview(dataset)
 
-            return records, preview
+        # готовое превью берём из общего кеша,
+        # повторный выбор того же датасета не читает диск
+        key, version = self._cache_version(dataset_id)
+        preview = frame_cache.get((key, 'preview', filename), version)
+        if preview is None:
+            if not os.path.exists(self._source(dataset)):
+                raise FileNotFoundError(f"File {filename} not founded")
+
+        try:
+            if preview is None:
+                preview = frame_cache.put((key, 'preview', filename), self._render_preview(dataset, key), version)
+
+            return {"dataset_id": dataset.id, "filename": filename, "version": version}, preview
             
         except Exception as e:
             raise Exception(f"Error {filename}: {str(e)}")
+
+    def _render_preview(self, dataset: Dataset, key: str) -> str:
+        filename = dataset.filename
+        cache_file = self._cache_file(dataset.id, key)
+        preview = self._create_preview(read_head(cache_file, 5), filename, row_count(cache_file))
+
+        # Получаем метрики из БД
+        stats_result = load_metrics(key)
+        if stats_result is None:
+            preview += "\n\n**Metrics are not available for this file.**"
+        elif stats_result["success"]:
+            metrics_markdown = self._format_metrics(stats_result["result"], stats_result.get("correlation"))
+            preview += "\n\n---\n\n" + metrics_markdown
+        else:
+            preview += f"\n\n**Error while processing stats:** {stats_result['error']}"
+        return preview
     
-    def _create_preview(self, df: pd.DataFrame, filename: str) -> str:
+    def _processing_preview(self, dataset: Dataset) -> str:
+        """Пока идёт обработка: предварительные метрики по выборке, если они уже есть."""
+        info = f"**File:** {dataset.filename}\n\n**Processing...** exact metrics are not ready yet."
+        path = preview_path(self.data_directory, dataset.storage_key)
+        if not os.path.exists(path):
+            return info
+        with open(path, 'r', encoding='utf-8') as f:
+            stats_result = json.load(f)
+        sample = stats_result["sample"]
+        info += (f"\n\n**Preliminary metrics** from a random sample of {sample['rows']} rows "
+                 f"(~{sample['estimated_rows']} rows in file), "
+                 f"{sample['confidence']:.0%} confidence intervals in brackets.")
+        return info + "\n\n---\n\n" + self._format_metrics(stats_result["result"])
+
+    @staticmethod
+    def _user_id() -> int:
+        # фоновая задача графика идёт уже после ответа на запрос:
+        # владельца датасета ей передаёт build_chart через g
+        if 'dataset_owner' in g:
+            return g.dataset_owner
+        return current_user.id if current_user.is_authenticated else None
+
+    def _dataset(self, dataset_id: int) -> Dataset:
+        """
+        Запись датасета по id из списка файлов или дескриптора — только среди
+        записей текущего пользователя: имя файла не уникально, а значения
+        из браузера нельзя считать доверенными.
+        """
+        dataset = Dataset.query.filter_by(id=dataset_id, user_id=self._user_id()).first()
+        if dataset is None:
+            raise FileNotFoundError(f"Dataset {dataset_id} not found")
+        return dataset
+
+    def _source(self, dataset: Dataset) -> str:
+        return source_path(self.data_directory, dataset.content_hash, dataset.filename)
+
+    def _cache_version(self, dataset_id: int):
+        """
+        Ключ хранения и версия для FrameCache. Для загрузок с хешем содержимого
+        версия — сам хеш (при дозагрузке он меняется), для старых файлов без
+        хеша — mtime файла.
+        """
+        dataset = self._dataset(dataset_id)
+        if dataset.content_hash:
+            return dataset.content_hash, dataset.content_hash
+        file_path = self._source(dataset)
+        return dataset.storage_key, os.path.getmtime(file_path) if os.path.exists(file_path) else None
+
+    def cache_key(self, handle: dict):
+        """(ключ хранения, версия) датасета по дескриптору — для ключей кешей."""
+        return self._cache_version(handle["dataset_id"])
+
+    def load_columns(self, dataset_id: int, columns=None) -> pd.DataFrame:
+        """
+        Датасет (если указаны columns — только эти колонки) из общего кеша
+        в памяти, при промахе — из Parquet-кеша на диске.
+        Полученный DataFrame общий для всех сессий: изменять его нельзя.
+        """
+        key, version = self._cache_version(dataset_id)
+        df = frame_cache.get((key, 'frame'), version)
+        if df is None and not columns:
+            return frame_cache.put((key, 'frame'), self._read_columns(dataset_id, key), version)
+
+        columns = list(dict.fromkeys(columns or []))  # x и y могут совпадать
+        if df is not None:
+            return df[columns] if columns else df
+        return frame_cache.get_or_load(
+            (key, 'columns', tuple(columns)), lambda: self._read_columns(dataset_id, key, columns), version)
+
+    def schema(self, dataset_id: int) -> pa.Schema:
+        """
+        Схема датасета (имена и типы колонок) из футера Parquet-кеша,
+        без чтения данных; в памяти держится рядом с самим датасетом.
+        """
+        key, version = self._cache_version(dataset_id)
+        return frame_cache.get_or_load(
+            (key, 'schema'), lambda: read_schema(self._cache_file(dataset_id, key)), version)
+
+    def columns(self, handle: dict) -> List[str]:
+        """Имена колонок датасета по дескриптору — только схема, без строк."""
+        return self.schema(handle["dataset_id"]).names
+
+    def numeric_columns(self, handle: dict) -> List[str]:
+        """Числовые колонки (как select_dtypes('number')) по схеме датасета."""
+        return [field.name for field in self.schema(handle["dataset_id"])
+                if pa.types.is_integer(field.type) or pa.types.is_floating(field.type)]
+
+    def rows(self, handle: dict) -> int:
+        """Число строк датасета: из Dataset.row_count, для старых записей — из футера Parquet."""
+        dataset_id = handle["dataset_id"]
+        dataset = self._dataset(dataset_id)
+        if dataset.row_count is not None:
+            return dataset.row_count
+        key, _ = self._cache_version(dataset_id)
+        return row_count(self._cache_file(dataset_id, key))
+
+    def time_series(self, handle: dict, x: str, y: str, start=None, end=None, budget: int = 5000):
+        """
+        Окно ряда y по времени x из пирамиды агрегатов (см. app.timeseries.query):
+        крупный уровень для всего ряда, мелкие уровни и исходные строки —
+        для узкого окна. None, если x не колонка времени или y не числовая.
+        """
+        dataset_id = handle["dataset_id"]
+        key, version = self._cache_version(dataset_id)
+        folder = pyramid_dir(self.data_directory, key)
+        manifest = frame_cache.get_or_load(
+            (key, 'pyramids'), lambda: self._load_pyramids(dataset_id, key, folder), version)
+        return query(self._cache_file(dataset_id, key), folder, manifest, x, y, start, end, budget)
+
+    def _load_pyramids(self, dataset_id: int, key: str, folder: str) -> dict:
+        manifest = load_manifest(folder)
+        if manifest is None:
+            # датасеты, обработанные до появления пирамид: строим один раз
+            config = current_app.config
+            manifest = build_pyramids(self._cache_file(dataset_id, key), folder,
+                                      config['TIMESERIES_PYRAMID_MIN_ROWS'], config['PARQUET_ROW_GROUP_ROWS'])
+        return manifest
+
+    def selection(self, handle: dict, predicates: list):
+        """
+        Номера строк, прошедших перекрёстный фильтр карточек (см. app.indexes.selection),
+        или None, если условий нет. Результат кешируется по условиям в каноническом
+        виде: одна выборка общая для всех связанных графиков.
+        """
+        predicates = normalize(predicates)
+        if not predicates:
+            return None
+        dataset_id = handle["dataset_id"]
+        key, version, folder, manifest = self._indexes(dataset_id)
+        return frame_cache.get_or_load(
+            (key, 'selection', json.dumps(predicates, sort_keys=True, default=str)),
+            lambda: selection(self._cache_file(dataset_id, key), folder, manifest, predicates), version)
+
+    def filtered(self, handle: dict, columns: list, predicates: list) -> pd.DataFrame:
+        """
+        Колонки датасета в строках, прошедших перекрёстный фильтр. Строковые
+        колонки с битовыми картами собираются из кодов индекса как категории:
+        группировка по ним на графиках не сравнивает сами строки. Отобранная
+        колонка кешируется вместе с выборкой — карточки с общей колонкой
+        не выбирают её заново.
+        """
+        columns = list(dict.fromkeys(columns))
+        positions = self.selection(handle, predicates)
+        if positions is None:
+            return self.resolve(handle, columns)
+        key, version, folder, manifest = self._indexes(handle["dataset_id"])
+        selected = json.dumps(normalize(predicates), sort_keys=True, default=str)
+
+        def load(column):
+            values = categorical(folder, manifest, column, positions)
+            if values is None:
+                values = self.resolve(handle, [column])[column].to_numpy()[positions]
+            return pd.Series(values, name=column)
+
+        return pd.concat(
+            [frame_cache.get_or_load((key, 'filtered', selected, column), lambda: load(column), version)
+             for column in columns], axis=1)
+
+    def _indexes(self, dataset_id: int):
+        """(ключ, версия, папка индексов, манифест) датасета; манифест держится в памяти."""
+        key, version = self._cache_version(dataset_id)
+        folder = index_dir(self.data_directory, key)
+        manifest = frame_cache.get_or_load(
+            (key, 'indexes'), lambda: self._load_indexes(dataset_id, key, folder), version)
+        return key, version, folder, manifest
+
+    def _load_indexes(self, dataset_id: int, key: str, folder: str) -> dict:
+        manifest = load_index_manifest(folder)
+        if manifest is None:
+            # датасеты, обработанные до появления индексов: строим один раз
+            manifest = build_indexes(self._cache_file(dataset_id, key), folder,
+                                     current_app.config['CROSS_FILTER_MAX_CATEGORIES'])
+        return manifest
+
+    def resolve(self, handle: dict, columns=None) -> pd.DataFrame:
+        """
+        DataFrame по дескриптору из dcc.Store (см. load_from_directory).
+        Если файл с тех пор изменился (дозагрузка строк), возвращаются актуальные данные.
+        """
+        if not handle or not handle.get("dataset_id"):
+            raise ValueError("No dataset selected")
+        return self.load_columns(handle["dataset_id"], columns)
+
+    def page(self, handle: dict, page: int, page_size: int, sort_by: list = None,
+             filter_query: str = None) -> Tuple[List[dict], int]:
+        """
+        Страница таблицы данных: сортировка и фильтр выполняются на сервере
+        по Parquet-кешу (см. app.grid.query_page), в браузер уходит только page_size строк.
+
+        Returns:
+            (строки страницы для DataTable, сколько всего строк после фильтра)
+        """
+        if not handle or not handle.get("dataset_id"):
+            raise ValueError("No dataset selected")
+        dataset_id = handle["dataset_id"]
+        key, version = self._cache_version(dataset_id)
+        df, total = query_page(self._cache_file(dataset_id, key), key, version,
+                               page, page_size, sort_by, filter_query)
+        return json.loads(df.to_json(orient="records", date_format="iso")), total
+
+    def _cache_file(self, dataset_id: int, key: str) -> str:
+        # кеш с ключом-хешем собирается только из blob этого хеша
+        dataset = self._dataset(dataset_id)
+        ext = os.path.splitext(dataset.filename)[1]
+        if ext.lower() not in self.supported_extensions:
+            raise ValueError(f"Incompatible file type: {ext}")
+        return ensure_cache(self._source(dataset), cache_path(self.data_directory, key), ext=ext[1:].lower())
+
+    def _read_columns(self, dataset_id: int, key: str, columns=None) -> pd.DataFrame:
+        """Читает датасет из Parquet-кеша; если указаны columns, только их."""
+        return read_cache(self._cache_file(dataset_id, key), columns)
+
+    def _create_preview(self, df: pd.DataFrame, filename: str, rows: int = None) -> str:
+        rows = df.shape[0] if rows is None else rows
         info = f"**Fle:** {filename}\n\n"
-        info += f"**Size:** {df.shape[0]} rows, {df.shape[1]} columns\n\n"
+        info += f"**Size:** {rows} rows, {df.shape[1]} columns\n\n"
         info += f"**Columns:** {', '.join(df.columns)}\n\n"
         info += "**First 5 rows:**\n\n"
         info += df.head().to_markdown(index=False)
@@ -100,12 +355,15 @@ class DataManager:
         except Exception as e:
             raise Exception(f"Error: {str(e)}")
 
-    def get_file_path(self, filename: str) -> str:
+    def get_file_path(self, dataset_id: int) -> Tuple[str, str]:
+            """(путь к содержимому датасета, имя файла для скачивания)"""
            
-            if not filename:
+            if not dataset_id:
                 raise ValueError("Filename is required")
             
-            safe_path = safe_join(self.data_directory, filename)
+            dataset = self._dataset(dataset_id)
+            filename = dataset.filename
+            safe_path = self._source(dataset)
             if not os.path.exists(safe_path):
                 raise FileNotFoundError(f"File {filename} not found")
             
@@ -113,33 +371,65 @@ class DataManager:
             if ext.lower() not in self.supported_extensions:
                 raise ValueError(f"Unsupported file type: {ext}")
             
-            return safe_path
-    def _format_metrics(self, metrics: dict) -> str:
+            return safe_path, filename
+    def _format_metrics(self, metrics: dict, correlation: dict = None) -> str:
         lines = ["### 🧮 Data Metrics"]
+        if any(isinstance(stats, dict) and stats.get("approximate") for stats in metrics.values()):
+            lines.append("_≈ — approximate value, ± is the relative error bound_\n")
         
         for col, stats in metrics.items():
-            if col == "correlation_matrix":
-                continue
             if not isinstance(stats, dict):
                 continue
             lines.append(f"**{col}**")
+            # приближённые метрики (скетчи) помечаем ≈ и относительной ошибкой,
+            # метрики по выборке — доверительным интервалом
+            approximate = stats.get("approximate", {})
+            ci = stats.get("ci", {})
             for key, value in stats.items():
-                if isinstance(value, float):
-                    lines.append(f"- {key}: {value:.4f}")
-                else:
-                    lines.append(f"- {key}: {value}")
+                if key in ("approximate", "ci"):
+                    continue
+                text = f"{value:.4f}" if isinstance(value, float) else f"{value}"
+                if key in approximate:
+                    text = f"≈{text} (±{approximate[key]:.1%})"
+                if key in ci:
+                    low, high = ci[key]
+                    text += f" [{low:.4g}, {high:.4g}]"
+                lines.append(f"- {key}: {text}")
             lines.append("")  # пустая строка-разделитель
 
-        # Отдельно выводим корреляционную матрицу
-        correlation = metrics.get("correlation_matrix", {})
-        if correlation:
-            lines.append("### 🔗 Correlation Matrix")
-            for col, subcorr in correlation.items():
-                lines.append(f"**{col}**")
-                for subcol, val in subcorr.items():
-                    if col != subcol:  # опционально: не дублировать корреляцию с самим собой
-                        lines.append(f"- {subcol}: {val:.4f}")
-                lines.append("")
+        # Отдельно выводим самые сильные корреляции; полная матрица
+        # хранится в бинарном файле и загружается по кнопке (load_correlation)
+        pairs = (correlation or {}).get("top_pairs", [])
+        if pairs:
+            lines.append("### 🔗 Strongest Correlations")
+            lines.append(f"_Top {len(pairs)} pairs across {correlation['columns']} numeric columns_\n")
+            for pair in pairs:
+                lines.append(f"- {pair['x']} ↔ {pair['y']}: {pair['value']:.4f}")
+            lines.append("")
         
         return "\n".join(lines)
+
+    def load_correlation(self, dataset_id: int) -> pd.DataFrame:
+        """
+        Полная матрица корреляций файла из бинарного хранилища (посчитана
+        при загрузке). Для файлов, обработанных до его появления, матрица
+        считается один раз по числовым колонкам и сохраняется.
+        """
+        key, version = self._cache_version(dataset_id)
+        return frame_cache.get_or_load(
+            (key, 'correlation'), lambda: self._read_correlation(dataset_id, key), version)
+
+    def _read_correlation(self, dataset_id: int, key: str) -> pd.DataFrame:
+        path = correlation_path(self.data_directory, key)
+        if os.path.exists(path):
+            return load_matrix(path)
+        numeric = self.numeric_columns({"dataset_id": dataset_id})
+        if not numeric:
+            raise ValueError("No numeric columns for heatmap")
+        corr, columns = correlation_matrix(self._read_columns(dataset_id, key, numeric),
+                                           current_app.config['CORRELATION_BLOCK_COLUMNS'],
+                                           current_app.config['CORRELATION_WORKERS'])
+        if len(columns) > 1:
+            save_matrix(path, corr, columns)
+        return pd.DataFrame(corr, index=columns, columns=columns)
     
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+
+
+def as_numeric(values: pd.Series) -> np.ndarray:
+    """
+    Значения оси как float64 для расчётов прореживания: даты — в наносекундах,
+    строки и прочие нечисловые значения — порядковым номером строки.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.astype('int64').to_numpy(dtype='float64')
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return values.to_numpy(dtype='float64', na_value=np.nan)
+    return np.arange(len(values), dtype='float64')
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: индексы n_out точек, сохраняющих форму линии.
+
+    Первая и последняя точки остаются, остальные делятся на n_out - 2 корзины;
+    из каждой берётся точка, образующая наибольший треугольник с выбранной
+    в предыдущей корзине точкой и средней точкой следующей корзины.
+    Средние всех корзин считаются сразу через накопленные суммы.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (n_out - 2)
+    starts = np.floor(np.arange(n_out - 2) * every).astype(np.int64) + 1
+    ends = np.floor(np.arange(1, n_out - 1) * every).astype(np.int64) + 1
+    ends[-1] = n - 1
+
+    # средняя точка следующей корзины; для последней — последняя точка
+    sum_x = np.concatenate(([0.0], np.cumsum(x)))
+    sum_y = np.concatenate(([0.0], np.cumsum(y)))
+    sizes = ends - starts
+    avg_x = np.append((sum_x[ends] - sum_x[starts])[1:] / sizes[1:], x[-1])
+    avg_y = np.append((sum_y[ends] - sum_y[starts])[1:] / sizes[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        s, e = starts[i], ends[i]
+        area = np.abs((x[a] - avg_x[i]) * (y[s:e] - y[a]) - (x[a] - x[s:e]) * (avg_y[i] - y[a]))
+        a = s + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Минимум и максимум y в каждой из (n_out - 2) / 2 корзин подряд идущих точек
+    (плюс первая и последняя точки): пики и провалы сохраняются точно.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+
+    buckets = (n_out - 2) // 2
+    bucket = np.arange(n) * buckets // n
+    order = np.lexsort((y, bucket))
+    firsts = np.searchsorted(bucket[order], np.arange(buckets))
+    lasts = np.append(firsts[1:], n) - 1
+    return np.unique(np.concatenate(([0, n - 1], order[firsts], order[lasts])))
+
+
+DOWNSAMPLERS = {'lttb': lttb, 'minmax': minmax}
+
+
+def downsample(df: pd.DataFrame, x: str, y: str, n_out: int, method: str = 'lttb') -> pd.DataFrame:
+    """
+    Прореживает линию до n_out точек, сохраняя порядок строк.
+    Строки с пропуском в x или y отбрасываются (на линии они — разрыв).
+    """
+    df = df.dropna(subset=list(dict.fromkeys([x, y])))
+    if len(df) <= n_out:
+        return df
+    index = DOWNSAMPLERS[method](as_numeric(df[x]), as_numeric(df[y]), n_out)
+    return df.iloc[index]
+
+
+def _bin_index(values: np.ndarray, bins: int):
+    """
+    Номер корзины для каждого значения при bins равных корзинах от минимума
+    до максимума (как np.histogram, но одним проходом без двоичного поиска).
+
+    Returns:
+        (номера корзин, границы корзин)
+    """
+    low, high = values.min(), values.max()
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    index = ((values - low) * (bins / (high - low))).astype(np.int64)
+    np.minimum(index, bins - 1, out=index)  # максимум попадает в последнюю корзину
+    return index, np.linspace(low, high, bins + 1)
+
+
+def histogram_bins(values: pd.Series, bins: int):
+    """
+    Гистограмма на сервере: bins равных корзин по значениям без пропусков.
+
+    Returns:
+        (центры корзин, ширина корзин — для дат в миллисекундах, как ждёт
+         Plotly, счётчики)
+    """
+    numeric = as_numeric(values)
+    numeric = numeric[~np.isnan(numeric)]
+    if not len(numeric):
+        return np.empty(0), np.empty(0), np.empty(0, dtype=np.int64)
+    index, edges = _bin_index(numeric, bins)
+    counts = np.bincount(index, minlength=bins)
+    centers = (edges[:-1] + edges[1:]) / 2
+    widths = np.diff(edges)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        centers, widths = pd.to_datetime(centers), widths / 1e6
+    return centers, widths, counts
+
+
+def density_grid(x: pd.Series, y: pd.Series, bins: int):
+    """
+    Плотность точек на сетке bins x bins (двумерная гистограмма на сервере).
+
+    Returns:
+        (центры корзин по x, центры по y, матрица счётчиков y x x)
+    """
+    xv, yv = as_numeric(x), as_numeric(y)
+    valid = ~(np.isnan(xv) | np.isnan(yv))
+    if not valid.any():
+        return np.empty(0), np.empty(0), np.zeros((0, 0))
+    ix, x_edges = _bin_index(xv[valid], bins)
+    iy, y_edges = _bin_index(yv[valid], bins)
+    counts = np.bincount(iy * bins + ix, minlength=bins * bins).reshape(bins, bins)
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    return x_centers, y_centers, counts
@@ -0,0 +1,105 @@
+import re
+import numpy as np
+import pandas as pd
+
+# свойства трасс с массивами данных (остальные — оформление)
+ARRAY_PROPERTIES = ('x', 'y', 'z', 'q1', 'median', 'q3', 'lowerfence', 'upperfence', 'mean')
+
+# даты в CSV читаются строками; такие оси Plotly и сам определил бы как даты
+ISO_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?$')
+
+# трассы, у которых равномерная ось x задаётся началом и шагом (x0, dx)
+STEPPED_TRACES = ('scatter', 'scattergl')
+
+
+def narrow(values: np.ndarray) -> np.ndarray:
+    """
+    float64 -> float32, если обратное преобразование возвращает те же
+    значения (пропуски сохраняются). Целые Plotly сам кодирует самым узким
+    типом, поэтому они приводятся к int64 и дальше не трогаются.
+    """
+    if values.dtype.kind in 'iu' and values.dtype != np.uint64:
+        return values.astype(np.int64, copy=False)
+    if values.dtype == np.float64:
+        with np.errstate(over='ignore', invalid='ignore'):
+            narrowed = values.astype(np.float32)
+        if np.array_equal(narrowed.astype(np.float64), values, equal_nan=True):
+            return narrowed
+    return values
+
+
+def compact_array(values):
+    """
+    Массив трассы в виде, который Plotly кодирует типизированным base64
+    (dtype + bdata), а не списком чисел или строк.
+
+    Returns:
+        (массив или None, если кодировать нечего; True для дат —
+         они передаются миллисекундами от эпохи для оси типа date)
+    """
+    if isinstance(values, (str, dict)) or values is None:
+        return None, False
+    array = np.asarray(values)
+    if np.issubdtype(array.dtype, np.datetime64):
+        dates = pd.DatetimeIndex(array.ravel())
+        ms = dates.asi8.astype(np.float64) / 1e6
+        ms[dates.isna()] = np.nan
+        return ms.reshape(array.shape), True
+    if array.dtype.kind in 'iuf':
+        return narrow(array), False
+    if array.dtype.kind in 'OU' and array.ndim == 1 and len(array) and _looks_like_dates(array):
+        try:
+            dates = pd.to_datetime(array, format='ISO8601')
+        except (ValueError, TypeError):
+            return None, False
+        return compact_array(dates.to_numpy(dtype='datetime64[ns]'))
+    return None, False
+
+
+def _looks_like_dates(array: np.ndarray) -> bool:
+    sample = array[:: max(len(array) // 10, 1)]
+    return all(isinstance(value, str) and ISO_DATE.match(value) for value in sample)
+
+
+def compact_figure(fig):
+    """
+    Переводит массивы данных фигуры в компактное бинарное представление:
+    даты — в миллисекунды (ось переключается на type=date), числа —
+    в самый узкий тип без потерь, равномерная ось x линии — в x0 и dx.
+    Так в браузер уходит base64 вместо длинных списков чисел и ISO-строк,
+    и JSON кодируется быстрее.
+    """
+    for trace in fig.data:
+        dates = set()
+        for prop in ARRAY_PROPERTIES:
+            if prop not in trace or trace[prop] is None:
+                continue
+            array, is_date = compact_array(trace[prop])
+            if array is None:
+                continue
+            # Plotly не переприсваивает равные по значениям массивы, поэтому сначала сброс
+            trace[prop] = None
+            trace[prop] = array
+            if is_date and prop in ('x', 'y'):
+                dates.add(prop)
+                axis = trace[prop + 'axis'] or prop
+                fig.layout[axis.replace(prop, prop + 'axis', 1)].type = 'date'
+        if trace.type in STEPPED_TRACES:
+            _to_step(trace, 'x' in dates)
+    return fig
+
+
+def _to_step(trace, is_date: bool):
+    """Равномерную ось x (ряд по времени с постоянным шагом, номера строк) заменяет на x0 и dx."""
+    x = trace.x
+    if not isinstance(x, np.ndarray) or x.ndim != 1 or len(x) < 3 or x.dtype.kind not in 'iuf':
+        return
+    steps = np.diff(x.astype(np.float64))
+    if not np.isfinite(steps).all() or steps[0] == 0 or not (steps == steps[0]).all():
+        return
+    x0 = x[0].item()
+    if is_date:
+        # на оси дат шаг — в миллисекундах, начало — строкой даты
+        x0 = pd.Timestamp(x0, unit='ms').isoformat()
+    trace.x = None
+    trace.x0, trace.dx = x0, steps[0].item()
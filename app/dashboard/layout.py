@@ -1,5 +1,6 @@
 import dash_bootstrap_components as dbc
-from dash import dcc, html
+from dash import dcc, html, dash_table
+from flask import current_app
 from flask_login import current_user
 import dash_draggable as dg
 import plotly.io as pio
@@ -34,7 +35,16 @@ def _controls_body() -> html.Div:
                         title="Download",
                         className="ms-2"
                     ),
-                ], className="mb-3"),
+                ], className="mb-1"),
+            # файлы подгружаются с сервера страницами, поиск по имени — в БД
+            html.Div([
+                dbc.ButtonGroup([
+                    dbc.Button("‹", id="files-prev", n_clicks=0, color="secondary", outline=True, size="sm"),
+                    dbc.Button("›", id="files-next", n_clicks=0, color="secondary", outline=True, size="sm"),
+                ], className="me-2"),
+                html.Small(id="files-page-info", className="text-muted"),
+                dcc.Store(id="files-page", data=0),
+            ], className="d-flex align-items-center mb-3"),
             html.Div(id="download-status"),
             dbc.Label("Graph Type"),
             dcc.Dropdown(
@@ -53,10 +63,39 @@ def _controls_body() -> html.Div:
             dbc.Label("Axis X"),
             dcc.Dropdown(id="x-column", className="mb-2"),
             dbc.Label("Axis Y"),
-            dcc.Dropdown(id="y-column", className="mb-3"),
+            dcc.Dropdown(id="y-column", className="mb-2"),
+            dbc.Label("Aggregation (bar)"),
+            dcc.Dropdown(
+                id="aggregation",
+                options=[
+                    {"label": "Sum", "value": "sum"},
+                    {"label": "Mean", "value": "mean"},
+                    {"label": "Count", "value": "count"},
+                ],
+                value="sum",
+                clearable=False,
+                className="mb-2",
+            ),
+            dbc.Checklist(
+                id="heatmap-options",
+                options=[{"label": "Cluster heatmap columns", "value": "cluster"}],
+                value=["cluster"],
+                switch=True,
+                className="mb-3",
+            ),
             dbc.Button("➕ Add", id="add-chart", n_clicks=0, color="success"),
             html.Hr(),
             html.Div(id="output-data-upload"),
+            dbc.Button(
+                "🔗 Full correlation matrix",
+                id="show-correlation",
+                n_clicks=0,
+                color="secondary",
+                outline=True,
+                size="sm",
+                className="mb-2",
+            ),
+            html.Div(id="correlation-matrix"),
             dcc.Download(id="download-file"),
             html.Div([
                 html.Hr(),
@@ -150,7 +189,20 @@ def make_layout() -> html.Div:
             ),
 
             html.Div(
-                board,
+                [
+                    # условия перекрёстного фильтра: выделение на одной карточке фильтрует остальные
+                    html.Div(
+                        [
+                            html.Small(id="cross-filter-summary", className="text-muted me-3"),
+                            dbc.Button("Clear filters", id="clear-filters", n_clicks=0,
+                                       color="secondary", outline=True, size="sm"),
+                        ],
+                        id="cross-filter-bar",
+                        className="align-items-center mb-2",
+                        style={"display": "none"},
+                    ),
+                    board,
+                ],
                 id="board-wrapper",
                 style={
                     "paddingTop": "80px",
@@ -162,7 +214,41 @@ def make_layout() -> html.Div:
                 },
             ),
 
+            # сырые строки датасета: листание, сортировка и фильтр — на сервере
+            html.Div(
+                dash_table.DataTable(
+                    id="data-grid",
+                    columns=[],
+                    data=[],
+                    page_current=0,
+                    page_size=25,
+                    page_action="custom",
+                    sort_action="custom",
+                    sort_mode="multi",
+                    sort_by=[],
+                    filter_action="custom",
+                    filter_query="",
+                    style_table={"overflowX": "auto"},
+                    style_header={"backgroundColor": "#303030", "color": "white"},
+                    style_filter={"backgroundColor": "#3a3a3a", "color": "white"},
+                    style_cell={"backgroundColor": "#222", "color": "white",
+                                "minWidth": "80px", "maxWidth": "300px",
+                                "overflow": "hidden", "textOverflow": "ellipsis"},
+                ),
+                id="grid-wrapper",
+                style={"padding": "0 20px 20px 20px", "display": "none"},
+            ),
+
             dcc.Store(id="stored-data"),
+            # id карточек доски в порядке children — для частичных обновлений
+            dcc.Store(id="board-cards", data=[]),
+            # графики, которые строятся в фоне: id карточки -> id задачи
+            dcc.Store(id="chart-jobs", data={}),
+            dcc.Interval(id="chart-jobs-poll", interval=current_app.config['CHART_POLL_INTERVAL_MS'], disabled=True),
+            # перекрёстный фильтр: id карточки -> условие её выделения;
+            # applied — какие чужие условия уже учтены в графике каждой карточки
+            dcc.Store(id="cross-filter", data={}),
+            dcc.Store(id="cross-filter-applied", data={}),
         ]
     )
 
@@ -0,0 +1,144 @@
+import os
+import json
+import hashlib
+import threading
+import uuid
+from werkzeug.utils import secure_filename
+from app import app
+from app.frame_cache import FrameCache
+
+# Меняется вместе с тем, как ChartFactory строит графики: старые записи на диске не подходят
+FIGURE_FORMAT_VERSION = 4
+
+
+def spec_digest(version, spec: dict) -> str:
+    """Хеш описания графика (тип, оси, параметры) вместе с версией данных."""
+    payload = json.dumps([FIGURE_FORMAT_VERSION, version, spec], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class FigureCache:
+    """
+    Кеш готовых графиков: JSON фигуры по ключу (датасет, версия данных, описание графика).
+
+    Первый уровень — FrameCache в памяти с ограничением по байтам. Если задан
+    disk_dir, JSON дополнительно пишется на диск и переживает перезапуск;
+    объём на диске ограничен disk_max_bytes, при переполнении удаляются
+    файлы, к которым дольше всего не обращались (по mtime).
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: str = None, disk_max_bytes: int = 0):
+        self.memory = FrameCache(max_bytes)
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_hits = 0
+        self.disk_misses = 0
+        self._lock = threading.Lock()
+        self._disk_bytes = None  # считается при первом обращении к диску
+
+    def _path(self, storage_key: str, digest: str) -> str:
+        return os.path.join(self.disk_dir, f'{secure_filename(storage_key)}-{digest}.json')
+
+    def get(self, storage_key: str, version, spec: dict):
+        """JSON фигуры или None."""
+        digest = spec_digest(version, spec)
+        figure = self.memory.get((storage_key, 'figure', digest), version)
+        if figure is not None or not self.disk_dir:
+            return figure
+
+        path = self._path(storage_key, digest)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                figure = f.read()
+            os.utime(path)  # отмечаем обращение для вытеснения по mtime
+        except OSError:
+            with self._lock:
+                self.disk_misses += 1
+            return None
+        with self._lock:
+            self.disk_hits += 1
+        return self.memory.put((storage_key, 'figure', digest), figure, version)
+
+    def put(self, storage_key: str, version, spec: dict, figure: str) -> str:
+        digest = spec_digest(version, spec)
+        self.memory.put((storage_key, 'figure', digest), figure, version)
+        if self.disk_dir:
+            self._write(self._path(storage_key, digest), figure)
+        return figure
+
+    def get_or_build(self, storage_key: str, version, spec: dict, build) -> str:
+        """JSON фигуры из кеша; при промахе build() возвращает plotly Figure."""
+        figure = self.get(storage_key, version, spec)
+        if figure is None:
+            figure = self.put(storage_key, version, spec, build().to_json())
+        return figure
+
+    def invalidate(self, storage_key: str):
+        """Удаляет все графики датасета из памяти и с диска."""
+        self.memory.invalidate(storage_key)
+        if not self.disk_dir or not os.path.isdir(self.disk_dir):
+            return
+        prefix = secure_filename(storage_key) + '-'
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.startswith(prefix):
+                self._remove(entry.path)
+
+    def _write(self, path: str, figure: str):
+        os.makedirs(self.disk_dir, exist_ok=True)
+        tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(figure)
+        size = os.path.getsize(tmp)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk()
+            else:
+                self._disk_bytes += size
+        if self._disk_bytes > self.disk_max_bytes:
+            self._evict_disk()
+
+    def _scan_disk(self) -> int:
+        return sum(entry.stat().st_size for entry in os.scandir(self.disk_dir) if entry.name.endswith('.json'))
+
+    def _evict_disk(self):
+        entries = sorted(
+            (entry for entry in os.scandir(self.disk_dir) if entry.name.endswith('.json')),
+            key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            if self._disk_bytes <= self.disk_max_bytes:
+                break
+            self._remove(entry.path)
+
+    def _remove(self, path: str):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes -= size
+
+    def stats(self) -> dict:
+        stats = self.memory.stats()
+        if self.disk_dir:
+            with self._lock:
+                if self._disk_bytes is None and os.path.isdir(self.disk_dir):
+                    self._disk_bytes = self._scan_disk()
+                requests = self.disk_hits + self.disk_misses
+                stats['disk'] = {
+                    'hits': self.disk_hits,
+                    'misses': self.disk_misses,
+                    'hit_rate': round(self.disk_hits / requests, 4) if requests else None,
+                    'bytes': self._disk_bytes,
+                    'max_bytes': self.disk_max_bytes,
+                }
+        return stats
+
+
+figure_cache = FigureCache(
+    app.config['FIGURE_CACHE_BYTES'],
+    os.path.join(app.config['UPLOAD_FOLDER'], 'figures') if app.config['FIGURE_CACHE_DISK'] else None,
+    app.config['FIGURE_CACHE_DISK_BYTES'],
+)
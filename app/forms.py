@@ -33,7 +33,7 @@ class UploadForm(FlaskForm):
                 DataRequired(),
                 FileAllowed(
                     current_app.config['ALLOWED_EXTENSIONS'],
-                    'Допустимые форматы: .csv, .xls, .xlsx, .json'
+                    'Допустимые форматы: .csv, .xls, .xlsx, .json, .ndjson, .jsonl'
                 )
             ]
         )
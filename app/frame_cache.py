@@ -0,0 +1,114 @@
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from app import app
+
+
+def size_of(value) -> int:
+    """
+    Сколько байт занимает значение: у DataFrame и Series — фактический размер колонок,
+    у массивов numpy и таблиц Arrow — размер буферов с данными.
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (pa.Table, pa.RecordBatch)):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+class FrameCache:
+    """
+    Общий для процесса LRU-кеш разобранных датасетов и готовых превью.
+
+    Ключ записи — кортеж, первый элемент которого — ключ хранения датасета
+    (storage_key): по нему invalidate() сбрасывает всё, что относится к датасету.
+    Вместе со значением хранится версия (хеш содержимого или mtime файла);
+    get() с другой версией считается промахом и удаляет запись.
+
+    Объём ограничен max_bytes: при переполнении вытесняются записи,
+    к которым дольше всего не обращались. Значения отдаются без копирования,
+    поэтому изменять полученные DataFrame нельзя.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # ключ -> (версия, значение, байты)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: tuple, version=None):
+        """Значение или None, если записи нет или она устарела."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: tuple, value, version=None):
+        size = size_of(value)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                # значение больше всего бюджета не кешируем
+                return value
+            self._entries[key] = (version, value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+        return value
+
+    def get_or_load(self, key: tuple, load, version=None):
+        """Значение из кеша; при промахе вызывает load() и кладёт результат в кеш."""
+        value = self.get(key, version)
+        if value is None:
+            value = self.put(key, load(), version)
+        return value
+
+    def invalidate(self, storage_key: str):
+        """Сбрасывает все записи датасета."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == storage_key]:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _drop(self, key: tuple):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / requests, 4) if requests else None,
+                "evictions": self.evictions,
+            }
+
+
+frame_cache = FrameCache(app.config['FRAME_CACHE_BYTES'])
@@ -0,0 +1,219 @@
+import re
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from app.frame_cache import frame_cache
+
+# операторы filter_query таблицы Dash (с префиксами s/i — чувствительность к регистру)
+OPERATORS = {
+    '>=': 'ge', 'ge': 'ge', '<=': 'le', 'le': 'le', '<': 'lt', 'lt': 'lt',
+    '>': 'gt', 'gt': 'gt', '!=': 'ne', 'ne': 'ne', '=': 'eq', 'eq': 'eq',
+    'contains': 'contains', 'datestartswith': 'datestartswith',
+}
+
+COMPARISONS = {
+    'ge': pc.greater_equal, 'le': pc.less_equal, 'lt': pc.less,
+    'gt': pc.greater, 'ne': pc.not_equal, 'eq': pc.equal,
+}
+
+_PART = re.compile(r'^\{(?P<column>[^}]*)\}\s+(?P<op>\S+)\s*(?P<value>.*)$')
+
+
+def parse_filter(filter_query: str, schema: pa.Schema) -> list:
+    """
+    Разбирает filter_query таблицы ("{a} > 5 && {b} contains x") в список
+    условий (колонка, оператор, значение, без учёта регистра). Значение
+    приводится к типу колонки по схеме.
+    """
+    predicates = []
+    for part in (filter_query or '').split(' && '):
+        part = part.strip()
+        if not part:
+            continue
+        match = _PART.match(part)
+        if match is None:
+            raise ValueError(f"Unsupported filter: {part}")
+        column, op, value = match.group('column'), match.group('op'), match.group('value').strip()
+        ignore_case = False
+        if op not in OPERATORS and op[:1] in ('s', 'i') and op[1:] in OPERATORS:
+            ignore_case = op[0] == 'i'
+            op = op[1:]
+        if op not in OPERATORS:
+            raise ValueError(f"Unsupported filter operator: {op}")
+        index = schema.get_field_index(column)
+        if index == -1:
+            raise ValueError(f"Unknown column: {column}")
+        if len(value) > 1 and value[0] == value[-1] and value[0] in ('"', "'", '`'):
+            value = value[1:-1].replace('\\' + value[0], value[0])
+        op = OPERATORS[op]
+        if op in COMPARISONS:
+            value = _typed(value, schema.field(index).type)
+        predicates.append((column, op, value, ignore_case))
+    return predicates
+
+
+def _typed(value: str, type_: pa.DataType):
+    if pa.types.is_integer(type_) or pa.types.is_floating(type_):
+        try:
+            return float(value)
+        except ValueError:
+            raise ValueError(f"Not a number: {value}")
+    if pa.types.is_timestamp(type_) or pa.types.is_date(type_):
+        timestamp = pd.Timestamp(value)
+        if pa.types.is_timestamp(type_) and type_.tz and timestamp.tzinfo is None:
+            timestamp = timestamp.tz_localize(type_.tz)
+        return pa.scalar(timestamp, type=type_) if pa.types.is_timestamp(type_) else timestamp.date()
+    if pa.types.is_boolean(type_):
+        return value.lower() in ('true', '1', 'yes')
+    return value
+
+
+def _skip_row_group(row_group, columns: dict, predicates: list) -> bool:
+    """
+    Группу строк можно не читать, если по статистике min/max хотя бы одно
+    условие в ней заведомо не выполняется.
+    """
+    for column, op, value, _ in predicates:
+        if op not in COMPARISONS or column not in columns:
+            continue
+        stats = row_group.column(columns[column]).statistics
+        if stats is None or not stats.has_min_max:
+            continue
+        if isinstance(value, pa.Scalar):
+            value = value.as_py()
+        try:
+            low, high = stats.min, stats.max
+            if (op == 'eq' and (value < low or value > high)
+                    or op == 'gt' and high <= value or op == 'ge' and high < value
+                    or op == 'lt' and low >= value or op == 'le' and low > value
+                    or op == 'ne' and low == high == value):
+                return True
+        except TypeError:
+            continue
+    return False
+
+
+def _evaluate(table: pa.Table, predicates: list) -> np.ndarray:
+    """Маска строк, удовлетворяющих всем условиям; пропуски не проходят фильтр."""
+    mask = np.ones(table.num_rows, dtype=bool)
+    for column, op, value, ignore_case in predicates:
+        values = table.column(column)
+        if op in COMPARISONS:
+            result = COMPARISONS[op](values, value)
+        elif op == 'contains':
+            result = pc.match_substring(_as_text(values), str(value), ignore_case=ignore_case)
+        else:  # datestartswith
+            result = pc.starts_with(_as_text(values), str(value))
+        mask &= result.fill_null(False).to_numpy(zero_copy_only=False)
+    return mask
+
+
+def _as_text(values: pa.ChunkedArray) -> pa.ChunkedArray:
+    if pa.types.is_timestamp(values.type):
+        return pc.strftime(values, format='%Y-%m-%dT%H:%M:%S')
+    if pa.types.is_string(values.type) or pa.types.is_large_string(values.type):
+        return values
+    return pc.cast(values, pa.string())
+
+
+def filter_positions(path: str, predicates: list) -> np.ndarray:
+    """
+    Номера строк, прошедших фильтр. С диска читаются только колонки условий,
+    группы строк, отсечённые по статистике, не читаются вовсе.
+    """
+    parquet = pq.ParquetFile(path)
+    columns = sorted({column for column, *_ in predicates})
+    indexes = {name: i for i, name in enumerate(parquet.schema_arrow.names) if name in columns}
+    positions, offset = [], 0
+    for i in range(parquet.metadata.num_row_groups):
+        row_group = parquet.metadata.row_group(i)
+        if not _skip_row_group(row_group, indexes, predicates):
+            mask = _evaluate(parquet.read_row_group(i, columns=columns), predicates)
+            positions.append(np.flatnonzero(mask) + offset)
+        offset += row_group.num_rows
+    return _compact(np.concatenate(positions) if positions else np.empty(0, dtype=np.int64), offset)
+
+
+def sort_index(path: str, sort_by: list) -> np.ndarray:
+    """Порядок строк по колонкам sort_by (пропуски — в конце); читаются только эти колонки."""
+    columns = list(dict.fromkeys(item['column_id'] for item in sort_by))
+    table = pq.read_table(path, columns=columns)
+    keys = [(item['column_id'], 'descending' if item['direction'] == 'desc' else 'ascending', 'at_end')
+            for item in sort_by]
+    order = pc.sort_indices(table, sort_keys=keys)
+    return _compact(order.to_numpy(), table.num_rows)
+
+
+def _compact(positions: np.ndarray, rows: int) -> np.ndarray:
+    """Номера строк в int32, если их хватает: индекс на 50M строк вдвое меньше."""
+    return positions.astype(np.int32 if rows < 2 ** 31 else np.int64, copy=False)
+
+
+def take_rows(path: str, key: str, version, positions: np.ndarray) -> pd.DataFrame:
+    """
+    Строки с номерами positions в заданном порядке. Читаются только группы
+    строк, в которые они попали; группы кешируются, поэтому соседние
+    страницы берутся из памяти.
+    """
+    parquet = pq.ParquetFile(path)
+    metadata = parquet.metadata
+    offsets = np.cumsum([0] + [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)])
+    groups = np.searchsorted(offsets, positions, side='right') - 1
+
+    order = np.argsort(groups, kind='stable')
+    pieces = []
+    for group in np.unique(groups):
+        table = frame_cache.get_or_load(
+            (key, 'row-group', int(group)), lambda: parquet.read_row_group(int(group)), version)
+        local = positions[order][groups[order] == group] - offsets[group]
+        pieces.append(table.take(pa.array(local)))
+    if not pieces:
+        return parquet.schema_arrow.empty_table().to_pandas()
+    table = pa.concat_tables(pieces)
+    return table.take(pa.array(np.argsort(order))).to_pandas()
+
+
+def query_page(path: str, key: str, version, page: int, page_size: int,
+               sort_by: list = None, filter_query: str = None):
+    """
+    Одна страница таблицы с серверной сортировкой и фильтрацией.
+
+    Порядок строк (индекс сортировки, номера отфильтрованных строк и их
+    сочетание) кешируется, так что листание страниц не пересчитывает его,
+    а с диска дочитываются только группы строк текущей страницы.
+
+    Returns:
+        (DataFrame строк страницы, сколько всего строк после фильтра)
+    """
+    schema = pq.read_schema(path)
+    sort_by = [item for item in (sort_by or []) if item.get('column_id')]
+    for item in sort_by:
+        if schema.get_field_index(item['column_id']) == -1:
+            raise ValueError(f"Unknown column: {item['column_id']}")
+    sort_key = tuple((item['column_id'], item['direction']) for item in sort_by)
+    predicates = parse_filter(filter_query, schema) if filter_query else []
+
+    positions = None
+    if predicates:
+        positions = frame_cache.get_or_load(
+            (key, 'grid-filter', filter_query), lambda: filter_positions(path, predicates), version)
+    if sort_by:
+        order = frame_cache.get_or_load((key, 'grid-sort', sort_key), lambda: sort_index(path, sort_by), version)
+        if positions is not None:
+            def combine():
+                keep = np.zeros(len(order), dtype=bool)
+                keep[positions] = True
+                return order[keep[order]]
+            order = frame_cache.get_or_load((key, 'grid-order', filter_query, sort_key), combine, version)
+        positions = order
+
+    start = page * page_size
+    if positions is None:
+        total = pq.ParquetFile(path).metadata.num_rows
+        rows = np.arange(start, min(start + page_size, total), dtype=np.int64)
+    else:
+        total = len(positions)
+        rows = positions[start:start + page_size].astype(np.int64)
+    return take_rows(path, key, version, rows), total
@@ -0,0 +1,270 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from werkzeug.utils import secure_filename
+from app.timeseries import datetime_columns, parse_times
+
+# Меняется вместе с форматом файлов индексов: старые перестраиваются
+INDEX_FORMAT_VERSION = 1
+
+
+def index_dir(upload_folder: str, key: str) -> str:
+    """Папка с индексами колонок датасета по ключу хранения."""
+    return os.path.join(upload_folder, 'indexes', secure_filename(key))
+
+
+def _path(folder: str, column_index: int, part: str) -> str:
+    return os.path.join(folder, f'{column_index}.{part}.npy')
+
+
+def _is_numeric(type_: pa.DataType) -> bool:
+    return pa.types.is_integer(type_) or pa.types.is_floating(type_)
+
+
+def _sortable(values: pa.ChunkedArray, is_time: bool) -> np.ndarray:
+    """Значения колонки для сортированного индекса: время — в наносекундах, пропуски — NaN."""
+    if is_time:
+        times = parse_times(values)
+        result = times.asi8.astype(np.float64)
+        result[times.isna()] = np.nan
+        return result
+    return values.to_numpy(zero_copy_only=False).astype(np.float64)
+
+
+def build_indexes(cache_file: str, folder: str, max_categories: int) -> dict:
+    """
+    Строит индексы колонок для перекрёстной фильтрации графиков. Колонки
+    читаются из Parquet-кеша по одной:
+
+    - категориальные (строки, bool, целые с не более чем max_categories
+      значениями) — битовые карты: по упакованной маске строк на значение;
+      у строковых ещё и коды значений по строкам (см. categorical);
+    - числовые и колонки времени — сортированный индекс: значения по
+      возрастанию (время в наносекундах, пропуски в конце) и номера их строк.
+
+    Строковые колонки с большим числом значений не индексируются.
+
+    Returns:
+        манифест: {"version", "rows", "columns": {колонка: {"kind": "bitmap",
+        "index", "categories"} или {"kind": "sorted", "index", "time", "valid"}}}
+    """
+    parquet = pq.ParquetFile(cache_file)
+    schema = parquet.schema_arrow
+    rows = parquet.metadata.num_rows
+    times = set(datetime_columns(cache_file))
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder, exist_ok=True)
+    manifest = {'version': INDEX_FORMAT_VERSION, 'rows': rows, 'columns': {}}
+
+    for index, field in enumerate(schema):
+        values = parquet.read(columns=[field.name]).column(0)
+        if field.name in times or pa.types.is_timestamp(field.type) or pa.types.is_date(field.type):
+            kind = 'sorted'
+        elif pa.types.is_floating(field.type):
+            kind = 'sorted'
+        else:
+            encoded = pc.dictionary_encode(values).combine_chunks()
+            categories = encoded.dictionary
+            if len(categories) <= max_categories and not pa.types.is_floating(categories.type):
+                kind = 'bitmap'
+            elif pa.types.is_integer(field.type):
+                kind = 'sorted'
+            else:
+                continue
+
+        if kind == 'bitmap':
+            codes = encoded.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+            bitmaps = np.empty((len(categories), (rows + 7) // 8), dtype=np.uint8)
+            for code in range(len(categories)):
+                bitmaps[code] = np.packbits(codes == code)
+            np.save(_path(folder, index, 'bitmap'), bitmaps)
+            if pa.types.is_string(categories.type) or pa.types.is_large_string(categories.type):
+                np.save(_path(folder, index, 'codes'), codes.astype(np.int8 if len(categories) < 128 else np.int16))
+            manifest['columns'][field.name] = {
+                'kind': 'bitmap', 'index': index, 'categories': _json_values(categories)}
+        else:
+            is_time = not _is_numeric(field.type)
+            keys = _sortable(values, is_time)
+            order = np.argsort(keys, kind='stable')  # NaN — в конце
+            order = order.astype(np.int32 if rows < 2 ** 31 else np.int64)
+            np.save(_path(folder, index, 'sorted'), keys[order])
+            np.save(_path(folder, index, 'order'), order)
+            manifest['columns'][field.name] = {
+                'kind': 'sorted', 'index': index, 'time': is_time,
+                'valid': int(np.count_nonzero(~np.isnan(keys)))}
+
+    with open(os.path.join(folder, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def _json_values(values: pa.Array) -> list:
+    if pa.types.is_timestamp(values.type) or pa.types.is_date(values.type):
+        return [value.isoformat() if value is not None else None for value in values.to_pylist()]
+    return values.to_pylist()
+
+
+def load_manifest(folder: str):
+    """Манифест индексов или None, если их ещё не строили (или формат устарел)."""
+    try:
+        with open(os.path.join(folder, 'manifest.json'), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('version') == INDEX_FORMAT_VERSION else None
+
+
+def remove_indexes(folder: str):
+    shutil.rmtree(folder, ignore_errors=True)
+
+
+def categorical(folder: str, manifest: dict, column: str, positions: np.ndarray):
+    """
+    Строковая колонка с битовыми картами в строках positions как pd.Categorical
+    из сохранённых кодов — без чтения и группировки самих строк. None, если
+    кодов для колонки нет.
+    """
+    info = manifest['columns'].get(column)
+    path = _path(folder, info['index'], 'codes') if info and info['kind'] == 'bitmap' else None
+    if path is None or not os.path.exists(path):
+        return None
+    codes = np.load(path, mmap_mode='r')
+    values = pd.Categorical.from_codes(codes[positions], categories=info['categories'])
+    # категории в словаре — в порядке появления, на графиках группы идут по алфавиту
+    return values.reorder_categories(sorted(info['categories']))
+
+
+def normalize(predicates) -> list:
+    """
+    Условия фильтра в каноническом виде (по колонке, значения отсортированы):
+    одинаковые выборки дают один ключ кеша.
+
+    Условие — {"column", "values": [...]} (значения категорий) или
+    {"column", "range": [от, до]} (включительно; для времени — ISO-строки).
+    """
+    result = []
+    for predicate in predicates or []:
+        if 'values' in predicate:
+            values = sorted(predicate['values'], key=lambda value: (str(type(value)), str(value)))
+            result.append({'column': predicate['column'], 'values': values})
+        elif 'range' in predicate:
+            result.append({'column': predicate['column'], 'range': list(predicate['range'])})
+    return sorted(result, key=lambda predicate: json.dumps(predicate, sort_keys=True, default=str))
+
+
+def selection(cache_file: str, folder: str, manifest: dict, predicates: list) -> np.ndarray:
+    """
+    Номера строк (по возрастанию), удовлетворяющих всем условиям.
+
+    Маски условий считаются по индексам в упакованном виде (8 строк в байте)
+    и пересекаются побитовым AND; с диска читаются только нужные битовые
+    карты и участок сортированного индекса (файлы открываются через mmap).
+    Колонки без индекса проверяются чтением самой колонки.
+    """
+    rows = manifest['rows']
+    packed = None
+    for predicate in predicates:
+        info = manifest['columns'].get(predicate['column'])
+        if info is None:
+            bits = _scan(cache_file, predicate, rows)
+        elif info['kind'] == 'bitmap':
+            bits = _bitmap_mask(folder, info, predicate, rows)
+        else:
+            bits = _sorted_mask(folder, info, predicate, rows)
+        packed = bits if packed is None else packed & bits
+    if packed is None:
+        positions = np.arange(rows)
+    else:
+        positions = np.flatnonzero(np.unpackbits(packed, count=rows))
+    return positions.astype(np.int32 if rows < 2 ** 31 else np.int64, copy=False)
+
+
+def _matches(category, values: list) -> bool:
+    # значения из браузера могут прийти строками (подписи оси) — сравниваем и так
+    return any(category == value or str(category) == str(value) for value in values)
+
+
+def _in_range(category, low, high) -> bool:
+    try:
+        return category is not None and low <= category <= high
+    except TypeError:
+        return False
+
+
+def _bitmap_mask(folder: str, info: dict, predicate: dict, rows: int) -> np.ndarray:
+    categories = info['categories']
+    if 'values' in predicate:
+        codes = [code for code, category in enumerate(categories) if _matches(category, predicate['values'])]
+    else:
+        low, high = predicate['range']
+        codes = [code for code, category in enumerate(categories) if _in_range(category, low, high)]
+    if not codes:
+        return np.zeros((rows + 7) // 8, dtype=np.uint8)
+    bitmaps = np.load(_path(folder, info['index'], 'bitmap'), mmap_mode='r')
+    return np.bitwise_or.reduce(bitmaps[codes], axis=0)
+
+
+def _bound(value, is_time: bool) -> float:
+    if is_time:
+        timestamp = pd.Timestamp(value)
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.tz_localize(None)
+        return float(timestamp.value)
+    return float(value)
+
+
+def _sorted_mask(folder: str, info: dict, predicate: dict, rows: int) -> np.ndarray:
+    """
+    Маска по сортированному индексу: границы ищутся двоичным поиском, в маску
+    ставятся номера строк из найденных участков (или снимаются вне их,
+    если так меньше записей).
+    """
+    keys = np.load(_path(folder, info['index'], 'sorted'), mmap_mode='r')[:info['valid']]
+    order = np.load(_path(folder, info['index'], 'order'), mmap_mode='r')
+    if 'range' in predicate:
+        low, high = (_bound(value, info['time']) for value in predicate['range'])
+        spans = [(np.searchsorted(keys, low, 'left'), np.searchsorted(keys, high, 'right'))]
+    else:
+        spans = []
+        for value in predicate['values']:
+            try:
+                key = _bound(value, info['time'])
+            except (TypeError, ValueError):
+                continue
+            spans.append((np.searchsorted(keys, key, 'left'), np.searchsorted(keys, key, 'right')))
+
+    selected = sum(end - start for start, end in spans)
+    if len(spans) == 1 and selected > rows / 2:
+        start, end = spans[0]
+        mask = np.ones(rows, dtype=bool)
+        mask[order[:start]] = False
+        mask[order[end:]] = False
+    else:
+        mask = np.zeros(rows, dtype=bool)
+        for start, end in spans:
+            mask[order[start:end]] = True
+    return np.packbits(mask)
+
+
+def _scan(cache_file: str, predicate: dict, rows: int) -> np.ndarray:
+    """Маска по колонке без индекса (например, строки с множеством значений)."""
+    values = pq.read_table(cache_file, columns=[predicate['column']]).column(0)
+    if 'values' in predicate:
+        result = pc.is_in(pc.cast(values, pa.string()), value_set=pa.array([str(v) for v in predicate['values']]))
+    else:
+        # границы приводятся к типу колонки: диапазон, несравнимый с её
+        # значениями (числа по строковой колонке), не выбирает ни одной строки
+        try:
+            low, high = predicate['range']
+            if not _is_numeric(values.type):
+                low, high = pa.scalar(low, type=values.type), pa.scalar(high, type=values.type)
+            result = pc.and_(pc.greater_equal(values, low), pc.less_equal(values, high))
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, TypeError, ValueError):
+            return np.zeros((rows + 7) // 8, dtype=np.uint8)
+    mask = result.fill_null(False).to_numpy(zero_copy_only=False)
+    return np.packbits(mask[:rows])
@@ -0,0 +1,670 @@
+import os
+import json
+import time
+import hashlib
+import uuid
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.utils import secure_filename
+from app import app, db
+from app import processing
+from app import correlation
+from app.figure_cache import figure_cache
+from app.frame_cache import frame_cache
+from app.metrics import load_metrics, metrics_ready, remove_metrics, save_metrics
+from app.models import Dataset
+from app.storage import (CacheWriter, blob_path, cache_path, ensure_cache, iter_cache, link_blob, read_schema,
+                         remove_blob, remove_cache, row_count, source_path, write_cache)
+from app.indexes import build_indexes, index_dir, remove_indexes
+from app.timeseries import build_pyramids, pyramid_dir, remove_pyramids
+from app.utils import read_frame, sample_lines, scan_file
+
+
+class JobCancelled(Exception):
+    """Задачу отменили: её результат больше никому не нужен."""
+
+
+class Job:
+    """Фоновая задача: текущая стадия, прогресс и время каждой стадии."""
+
+    def __init__(self, user_id: int, dataset_id: int, store: 'JobStore' = None):
+        self.id = str(uuid.uuid4())
+        self.user_id = user_id
+        self.dataset_id = dataset_id
+        self.status = 'queued'  # queued -> running -> done | failed | cancelled
+        self.stage = None
+        self.progress = 0.0
+        self.stages = {}  # стадия -> секунды
+        self.error = None
+        self.result = None
+        self.cancelled = False
+        self.created_at = time.time()
+        self.finished_at = None
+        self.store = store
+
+    def report(self, stage: str, progress: float):
+        """Стадия и прогресс; в общем хранилище их видят другие процессы."""
+        self.stage, self.progress = stage, progress
+        if self.store is not None:
+            self.store.save(self)
+
+    @contextmanager
+    def stage_timer(self, name: str):
+        self.stage = name
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = round(time.perf_counter() - started, 4)
+
+    def is_cancelled(self) -> bool:
+        """Отменена ли задача, в том числе из другого процесса (через store)."""
+        return self.cancelled or (self.store is not None and self.store.is_cancelled(self.id))
+
+    def check_cancelled(self):
+        """
+        Точка отмены между стадиями: поток нельзя прервать снаружи,
+        поэтому задача сама проверяет флаг и завершается.
+        """
+        if self.is_cancelled():
+            raise JobCancelled()
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "dataset_id": self.dataset_id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": round(self.progress, 4),
+            "stages": dict(self.stages),
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobStore:
+    """
+    Состояние задач в общей папке: JSON-файл на задачу, результат (строка) —
+    рядом отдельным файлом, отмена — файл-метка. Папку видят все процессы
+    приложения (несколько воркеров gunicorn), поэтому опрос и отмена
+    работают, даже если запрос попал не в тот процесс, где задача выполняется.
+    """
+
+    def __init__(self, folder: str, ttl: int = 3600):
+        self.folder = folder
+        self.ttl = ttl
+
+    def _path(self, job_id: str, suffix: str) -> str:
+        return os.path.join(self.folder, secure_filename(job_id) + suffix)
+
+    def save(self, job: Job):
+        write_json(self._path(job.id, '.json'), dict(job.to_dict(), user_id=job.user_id))
+
+    def save_result(self, job: Job):
+        if isinstance(job.result, str):
+            tmp = self._path(job.id, f'.result.{uuid.uuid4().hex}.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(job.result)
+            os.replace(tmp, self._path(job.id, '.result'))
+        self.save(job)
+
+    def load(self, job_id: str):
+        """Снимок задачи из другого процесса (Job без исполнения) или None."""
+        try:
+            with open(self._path(job_id, '.json'), 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        job = Job(state['user_id'], state['dataset_id'], self)
+        for name in ('id', 'status', 'stage', 'progress', 'stages', 'error', 'created_at', 'finished_at'):
+            setattr(job, name, state[name])
+        if job.status == 'done':
+            try:
+                with open(self._path(job_id, '.result'), 'r', encoding='utf-8') as f:
+                    job.result = f.read()
+            except OSError:
+                return None
+        return job
+
+    def cancel(self, job_id: str):
+        open(self._path(job_id, '.cancel'), 'a').close()
+
+    def is_cancelled(self, job_id: str) -> bool:
+        return os.path.exists(self._path(job_id, '.cancel'))
+
+    def prune(self):
+        """Удаляет файлы задач, к которым не обращались дольше ttl секунд."""
+        if not os.path.isdir(self.folder):
+            return
+        now = time.time()
+        for entry in os.scandir(self.folder):
+            try:
+                if now - entry.stat().st_mtime > self.ttl:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+
+class JobQueue:
+    """
+    Локальный пул потоков для обработки датасетов, без внешнего брокера.
+    Завершённые задачи хранятся ttl секунд, чтобы клиент успел узнать результат.
+    Если задан store, состояние задач дублируется в общее хранилище (JobStore):
+    get() и cancel() находят и задачи, запущенные другими процессами.
+    """
+
+    def __init__(self, max_workers: int, ttl: int = 3600, store: JobStore = None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dataforge-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.ttl = ttl
+        self.store = store
+
+    def submit(self, fn, user_id: int, dataset_id: int, *args) -> Job:
+        job = Job(user_id, dataset_id, self.store)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        if self.store is not None:
+            self.store.save(job)
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            job = self.store.load(job_id)
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Отменяет задачу: ещё не начатая не запустится, выполняемая
+        остановится на ближайшей проверке check_cancelled().
+        """
+        job = self.get(job_id)
+        if job is None or job.finished_at:
+            return False
+        job.cancelled = True
+        if self.store is not None:
+            self.store.cancel(job_id)
+        return True
+
+    def _run(self, job: Job, fn, args):
+        try:
+            job.check_cancelled()
+        except JobCancelled:
+            job.status = 'cancelled'
+            job.finished_at = time.time()
+            self._save(job)
+            return
+        job.status = 'running'
+        self._save(job)
+        try:
+            job.result = fn(job, *args)
+            job.progress = 1.0
+            job.status = 'done'
+        except JobCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            app.logger.error(f"Job {job.id} failed: {str(e)}")
+        finally:
+            job.stage = None
+            job.finished_at = time.time()
+            if self.store is not None:
+                self.store.save_result(job)
+
+    def _save(self, job: Job):
+        if self.store is not None:
+            self.store.save(job)
+
+    def _prune(self):
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at and now - job.finished_at > self.ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if self.store is not None:
+            self.store.prune()
+
+
+job_queue = JobQueue(app.config['JOB_WORKERS'], app.config['JOB_TTL'])
+# отдельный пул для графиков дашборда: долгие построения не занимают
+# ни обработчики запросов Dash, ни потоки обработки загрузок. Состояние
+# задач — в общей папке: опрос может прийти в любой воркер gunicorn
+chart_queue = JobQueue(app.config['CHART_WORKERS'], app.config['CHART_JOB_TTL'],
+                       JobStore(os.path.join(app.config['UPLOAD_FOLDER'], 'chart_jobs'), app.config['CHART_JOB_TTL']))
+
+
+def metrics_path(upload_folder: str, key: str) -> str:
+    """
+    Прежнее расположение JSON с метриками (key — ключ хранения датасета).
+    Метрики теперь хранятся в БД (app.metrics); файлы остаются только
+    у старых загрузок и переносятся миграцией.
+    """
+    metrics_filename = key.rsplit('.', 1)[0] + '_metrics.json'
+    return os.path.join(upload_folder, 'metrics_data', secure_filename(metrics_filename))
+
+
+def state_path(upload_folder: str, key: str) -> str:
+    """Путь к состоянию накопителя метрик."""
+    state_filename = key.rsplit('.', 1)[0] + '_state.json'
+    return os.path.join(upload_folder, 'metrics_data', secure_filename(state_filename))
+
+
+def preview_path(upload_folder: str, key: str) -> str:
+    """Путь к предварительным метрикам по выборке (пока считаются точные)."""
+    preview_filename = key.rsplit('.', 1)[0] + '_preview.json'
+    return os.path.join(upload_folder, 'metrics_data', secure_filename(preview_filename))
+
+
+def write_preview(job: Job, filepath: str, ext: str, path: str):
+    """
+    Для больших CSV/NDJSON за PREVIEW_TIME_BUDGET секунд считает метрики
+    по случайной выборке строк, чтобы дашборд показал профиль данных,
+    не дожидаясь полного прохода по файлу.
+    """
+    config = app.config
+    if ext not in config['STREAM_EXTENSIONS'] or os.path.getsize(filepath) <= config['PREVIEW_THRESHOLD']:
+        return
+    with job.stage_timer('preview'):
+        sample, estimated_rows = sample_lines(
+            filepath, ext, config['PREVIEW_SAMPLE_ROWS'], config['PREVIEW_TIME_BUDGET'])
+        stats = processing.sample_metrics(sample, estimated_rows, config['PREVIEW_CONFIDENCE'])
+        if stats['success']:
+            write_json(path, stats)
+
+
+def correlation_path(upload_folder: str, key: str) -> str:
+    """Путь к бинарной матрице корреляций (.npz)."""
+    corr_filename = key.rsplit('.', 1)[0] + '_corr.npz'
+    return os.path.join(upload_folder, 'metrics_data', secure_filename(corr_filename))
+
+
+def write_correlation(upload_folder: str, key: str, stats: dict, corr, columns: list):
+    """
+    Сохраняет полную матрицу корреляций в бинарный файл, а в метрики кладёт
+    только сводку: число колонок и top-k самых сильных пар для дашборда.
+    """
+    if not stats['success'] or len(columns) < 2:
+        return
+    path = correlation_path(upload_folder, key)
+    correlation.save_matrix(path, corr, columns)
+    stats['correlation'] = {
+        'columns': len(columns),
+        'top_pairs': correlation.top_pairs(corr, columns, app.config['CORRELATION_TOP_K']),
+        'matrix': os.path.basename(path),
+    }
+
+
+def write_json(path: str, data: dict):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as mf:
+        json.dump(data, mf, ensure_ascii=False, indent=2, default=str)
+    os.replace(tmp, path)
+
+
+def write_state(path: str, accumulator: processing.StreamingStats):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as sf:
+        json.dump(accumulator.to_state(), sf, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def read_state(path: str):
+    """Накопитель метрик или None, если состояния нет или его формат устарел (тогда его собирают заново)."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as sf:
+        state = json.load(sf)
+    try:
+        return processing.StreamingStats.from_state(state)
+    except ValueError:
+        return None
+
+
+def metrics_options(rows=None) -> dict:
+    """
+    Параметры расчёта метрик из конфигурации. rows — число строк таблицы
+    в памяти; None означает потоковую обработку, где размер заранее неизвестен.
+    """
+    config = app.config
+    mode = config['METRICS_APPROXIMATE']
+    if mode == 'auto':
+        approximate = rows is None or rows > config['METRICS_APPROXIMATE_ROWS']
+    else:
+        approximate = mode == 'on'
+    if not approximate:
+        return {}
+    return {
+        'approximate': True,
+        'hll_precision': config['HLL_PRECISION'],
+        'quantile_error': config['QUANTILE_RELATIVE_ERROR'],
+    }
+
+
+def compute_artifacts(job: Job, filepath: str, ext: str, cache_file: str):
+    """
+    Строит Parquet-кеш и считает метрики файла.
+
+    Returns:
+        (метрики, накопитель StreamingStats для последующих дозагрузок
+         или None, (матрица корреляций, её колонки))
+    """
+    config = app.config
+    size = os.path.getsize(filepath)
+
+    if ext in config['STREAM_EXTENSIONS'] and size > config['STREAM_THRESHOLD']:
+        # большой файл: кеш и метрики за один проход порциями
+        accumulator = processing.StreamingStats(**metrics_options(), top_capacity=config['TOP_VALUES_CAPACITY'])
+        writer = CacheWriter(cache_file, config['PARQUET_ROW_GROUP_ROWS'])
+
+        def on_chunk(chunk):
+            accumulator.update(chunk)
+            writer.write(chunk)
+
+        def on_progress(done):
+            job.progress = 0.9 * done / size
+
+        with job.stage_timer('scan'):
+            try:
+                scan_file(filepath, on_chunk, config['STREAM_CHUNK_ROWS'], on_progress, ext=ext)
+            except Exception:
+                writer.abort()
+                raise
+            writer.close()
+
+        stats = accumulator.result()
+        stats['source'] = {'size': size, 'rows': accumulator.rows, 'mode': 'stream'}
+        corr = accumulator.correlation()
+        return stats, accumulator, (corr.to_numpy(), list(corr.columns))
+
+    with job.stage_timer('read'):
+        df = read_frame(filepath, ext)
+    job.progress = 0.3
+    with job.stage_timer('cache'):
+        write_cache(df, cache_file, config['PARQUET_ROW_GROUP_ROWS'])
+    job.progress = 0.5
+    with job.stage_timer('metrics'):
+        cells = df.shape[0] * df.shape[1]
+        workers = config['STATS_WORKERS'] if cells >= config['STATS_PARALLEL_MIN_CELLS'] else 1
+        stats = processing.process_json(df, workers=workers, **metrics_options(len(df)))
+    job.progress = 0.7
+    with job.stage_timer('correlation'):
+        corr = correlation.correlation_matrix(
+            df, config['CORRELATION_BLOCK_COLUMNS'], config['CORRELATION_WORKERS'])
+    job.progress = 0.9
+    # состояние для дозагрузок соберёт из кеша первая дозагрузка (append_dataset)
+    return stats, None, corr
+
+
+def process_dataset(job: Job):
+    """Фоновая обработка загруженного файла: кеш, метрики, статус датасета."""
+    with app.app_context():
+        dataset = db.session.get(Dataset, job.dataset_id)
+        upload_folder = app.config['UPLOAD_FOLDER']
+        blob = blob_path(upload_folder, dataset.content_hash)
+        ext = dataset.filename.rsplit('.', 1)[-1].lower()
+        cache_file = cache_path(upload_folder, dataset.storage_key)
+        preview = preview_path(upload_folder, dataset.storage_key)
+
+        try:
+            if metrics_ready(dataset.storage_key) and os.path.exists(cache_file):
+                # то же содержимое уже обработала параллельная задача
+                stats = load_metrics(dataset.storage_key)
+            else:
+                try:
+                    write_preview(job, blob, ext, preview)
+                except Exception as e:
+                    # без предварительных метрик просто ждём точные
+                    app.logger.warning(f"Preview metrics failed for dataset {dataset.id}: {str(e)}")
+                stats, accumulator, (corr, columns) = compute_artifacts(job, blob, ext, cache_file)
+                stats.setdefault('source', {})['sha256'] = dataset.content_hash
+                with job.stage_timer('save'):
+                    write_correlation(upload_folder, dataset.storage_key, stats, corr, columns)
+                    # метрики попадают в БД в одном коммите со статусом датасета
+                    save_metrics(dataset.storage_key, stats, dataset.content_hash)
+                    frame_cache.invalidate(dataset.storage_key)
+                    if stats['success'] and accumulator is not None:
+                        write_state(state_path(upload_folder, dataset.storage_key), accumulator)
+                    # точные метрики заменяют предварительные
+                    if os.path.exists(preview):
+                        os.remove(preview)
+                if stats['success']:
+                    write_pyramids(job, cache_file, upload_folder, dataset.storage_key)
+                    write_indexes(job, cache_file, upload_folder, dataset.storage_key)
+
+            if stats['success']:
+                dataset.status = 'ready'
+                record_shape(dataset, cache_file)
+            else:
+                dataset.status = 'failed'
+                dataset.error = stats['error']
+            db.session.commit()
+
+        except Exception as e:
+            db.session.rollback()
+            # файл не удалось разобрать: как и раньше, не храним его —
+            # если на то же имя и содержимое не ссылаются другие записи (как в delete_file)
+            same_name = Dataset.query.filter(Dataset.filename == dataset.filename, Dataset.id != dataset.id).count()
+            same_content = Dataset.query.filter(
+                Dataset.content_hash == dataset.content_hash, Dataset.id != dataset.id).count()
+            filepath = os.path.join(upload_folder, dataset.filename)
+            if not same_name and os.path.exists(filepath) and os.path.samefile(filepath, blob):
+                os.remove(filepath)
+            if not same_content:
+                remove_blob(upload_folder, dataset.content_hash)
+                remove_cache(cache_file)
+                remove_pyramids(pyramid_dir(upload_folder, dataset.storage_key))
+                remove_indexes(index_dir(upload_folder, dataset.storage_key))
+                if os.path.exists(preview):
+                    os.remove(preview)
+            dataset.status = 'failed'
+            dataset.error = str(e)
+            db.session.commit()
+            raise
+
+
+def write_pyramids(job: Job, cache_file: str, upload_folder: str, key: str):
+    """
+    Пирамиды временных рядов (агрегаты по минутам, часам и дням) для колонок
+    с датой; без них графики по времени просто прореживаются, поэтому
+    ошибка здесь не делает обработку неудачной.
+    """
+    try:
+        with job.stage_timer('pyramids'):
+            build_pyramids(cache_file, pyramid_dir(upload_folder, key),
+                           app.config['TIMESERIES_PYRAMID_MIN_ROWS'], app.config['PARQUET_ROW_GROUP_ROWS'])
+    except Exception as e:
+        app.logger.warning(f"Time series pyramids failed for {key}: {str(e)}")
+
+
+def write_indexes(job: Job, cache_file: str, upload_folder: str, key: str):
+    """
+    Индексы колонок для перекрёстной фильтрации графиков; если их нет,
+    они строятся при первом фильтре, так что ошибка здесь не критична.
+    """
+    try:
+        with job.stage_timer('indexes'):
+            build_indexes(cache_file, index_dir(upload_folder, key), app.config['CROSS_FILTER_MAX_CATEGORIES'])
+    except Exception as e:
+        app.logger.warning(f"Column indexes failed for {key}: {str(e)}")
+
+
+def record_shape(dataset: Dataset, cache_file: str):
+    """Запоминает в датасете число строк и колонок из метаданных Parquet-кеша."""
+    dataset.row_count = row_count(cache_file)
+    dataset.column_count = len(read_schema(cache_file))
+
+
+def remove_artifacts(upload_folder: str, key: str):
+    """
+    Удаляет всё, что посчитано по содержимому с ключом key: кеш, пирамиды
+    временных рядов, индексы колонок, метрики в БД (коммит — на вызывающей
+    стороне), состояние, матрицу корреляций, предварительные метрики и метрики
+    в старом файловом формате.
+    """
+    remove_cache(cache_path(upload_folder, key))
+    remove_pyramids(pyramid_dir(upload_folder, key))
+    remove_indexes(index_dir(upload_folder, key))
+    remove_metrics(key)
+    frame_cache.invalidate(key)
+    figure_cache.invalidate(key)
+    for path in (state_path(upload_folder, key), correlation_path(upload_folder, key),
+                 preview_path(upload_folder, key), metrics_path(upload_folder, key)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def concat_blobs(upload_folder: str, base: str, delta: str, ext: str):
+    """
+    Склеивает исходный файл и дописываемую часть в новый blob.
+    У CSV заголовок дописываемой части должен совпадать с исходным и пропускается.
+
+    Returns:
+        (sha256 результата, путь к blob)
+    """
+    blobs = os.path.join(upload_folder, 'blobs')
+    tmp = os.path.join(blobs, f'.incoming-{uuid.uuid4().hex}')
+    digest = hashlib.sha256()
+    block_size = 1024 * 1024
+
+    def put(out, data):
+        digest.update(data)
+        out.write(data)
+
+    try:
+        with open(tmp, 'wb') as out, open(base, 'rb') as bf, open(delta, 'rb') as tail:
+            header = bf.readline()
+            last = header
+            put(out, header)
+            for block in iter(lambda: bf.read(block_size), b''):
+                put(out, block)
+                last = block
+            if last and not last.endswith(b'\n'):
+                put(out, b'\n')
+
+            if ext == 'csv' and tail.readline().rstrip(b'\r\n') != header.rstrip(b'\r\n'):
+                raise ValueError('Заголовок CSV не совпадает с исходным файлом')
+            for block in iter(lambda: tail.read(block_size), b''):
+                put(out, block)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    content_hash = digest.hexdigest()
+    blob = blob_path(upload_folder, content_hash)
+    if os.path.exists(blob):
+        os.remove(tmp)
+    else:
+        os.replace(tmp, blob)
+    return content_hash, blob
+
+
+def append_dataset(job: Job, delta_hash: str):
+    """
+    Дописывает строки к датасету. Метрики не пересчитываются по всей истории:
+    считаются только по новой части и объединяются с сохранённым состоянием.
+    """
+    with app.app_context():
+        dataset = db.session.get(Dataset, job.dataset_id)
+        config = app.config
+        upload_folder = config['UPLOAD_FOLDER']
+        ext = dataset.filename.rsplit('.', 1)[-1].lower()
+        old_key = dataset.storage_key
+        old_hash = dataset.content_hash
+        filepath = os.path.join(upload_folder, dataset.filename)
+        base = source_path(upload_folder, old_hash, dataset.filename)
+        delta = blob_path(upload_folder, delta_hash)
+        new_hash = None
+
+        try:
+            with job.stage_timer('concat'):
+                new_hash, blob = concat_blobs(upload_folder, base, delta, ext)
+            job.progress = 0.2
+
+            new_cache = cache_path(upload_folder, new_hash)
+            accumulator = read_state(state_path(upload_folder, old_key))
+            rebuild = accumulator is None
+            if rebuild:
+                # состояния нет (таблица считалась в памяти или до его появления):
+                # собираем его один раз из кеша в том же режиме, что и метрики
+                accumulator = processing.StreamingStats(**metrics_options(dataset.row_count),
+                                                        top_capacity=config['TOP_VALUES_CAPACITY'])
+
+            writer = CacheWriter(new_cache, config['PARQUET_ROW_GROUP_ROWS'])
+            added = processing.StreamingStats(**accumulator.options)
+            try:
+                with job.stage_timer('cache'):
+                    old_cache = ensure_cache(base, cache_path(upload_folder, old_key), config['PARQUET_ROW_GROUP_ROWS'], ext)
+                    for chunk in iter_cache(old_cache):
+                        if rebuild:
+                            accumulator.update(chunk)
+                        writer.write(chunk)
+                job.progress = 0.5
+
+                def on_chunk(chunk):
+                    added.update(chunk)
+                    writer.write(chunk)
+
+                with job.stage_timer('scan'):
+                    scan_file(delta, on_chunk, config['STREAM_CHUNK_ROWS'], ext=ext)
+            except Exception:
+                writer.abort()
+                raise
+            writer.close()
+            job.progress = 0.8
+
+            with job.stage_timer('merge'):
+                accumulator.merge(added)
+                stats = accumulator.result()
+                stats['source'] = {
+                    'size': os.path.getsize(blob),
+                    'rows': accumulator.rows,
+                    'appended_rows': added.rows,
+                    'mode': 'incremental',
+                    'sha256': new_hash,
+                }
+
+            with job.stage_timer('save'):
+                corr = accumulator.correlation()
+                write_correlation(upload_folder, new_hash, stats, corr.to_numpy(), list(corr.columns))
+                save_metrics(new_hash, stats, new_hash)
+                write_state(state_path(upload_folder, new_hash), accumulator)
+                link_blob(blob, filepath)
+            write_pyramids(job, new_cache, upload_folder, new_hash)
+            write_indexes(job, new_cache, upload_folder, new_hash)
+
+            dataset.content_hash = new_hash
+            dataset.status = 'ready'
+            record_shape(dataset, new_cache)
+            dataset.error = None
+            db.session.commit()
+
+        except Exception as e:
+            db.session.rollback()
+            if new_hash and not Dataset.query.filter_by(content_hash=new_hash).count():
+                remove_blob(upload_folder, new_hash)
+                remove_artifacts(upload_folder, new_hash)
+            # исходные данные не тронуты, датасет остаётся доступным
+            dataset.status = 'ready'
+            dataset.error = f'Не удалось дописать данные: {e}'
+            db.session.commit()
+            raise
+
+        finally:
+            if not Dataset.query.filter_by(content_hash=delta_hash).count():
+                remove_blob(upload_folder, delta_hash)
+
+        # прежнее содержимое больше не нужно, если на него никто не ссылается
+        if old_hash and not Dataset.query.filter_by(content_hash=old_hash).count():
+            remove_blob(upload_folder, old_hash)
+            remove_artifacts(upload_folder, old_hash)
+            db.session.commit()
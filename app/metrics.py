@@ -0,0 +1,89 @@
+import json
+import math
+from datetime import datetime
+from app import db
+from app.models import ColumnMetrics, Dataset, DatasetMetrics
+from app.processing import ENGINE_VERSION
+
+# метрики колонки, которые дублируются отдельными полями ColumnMetrics
+COLUMN_FIELDS = ['count', 'missing', 'unique', 'mean', 'std', 'min', 'max']
+
+
+def _number(value):
+    """Число для колонки Float; NaN, строки и прочее — NULL."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    value = float(value)
+    return None if math.isnan(value) or math.isinf(value) else value
+
+
+def column_rows(result: dict) -> list:
+    """Поля ColumnMetrics для каждой колонки из результата process_json."""
+    rows = []
+    for name, stats in result.items():
+        if not isinstance(stats, dict):
+            continue
+        row = {field: _number(stats.get(field)) for field in COLUMN_FIELDS}
+        total = (row['count'] or 0) + (row['missing'] or 0)
+        row['missing_ratio'] = row['missing'] / total if total and row['missing'] is not None else None
+        row['name'] = str(name)
+        rows.append(row)
+    return rows
+
+
+def save_metrics(key: str, stats: dict, input_hash: str = None) -> DatasetMetrics:
+    """
+    Сохраняет метрики содержимого с ключом key (заменяя прежние).
+    Коммит — на вызывающей стороне, вместе со статусом датасета.
+    """
+    record = DatasetMetrics.query.filter_by(key=key).first()
+    if record is None:
+        record = DatasetMetrics(key=key)
+        db.session.add(record)
+    record.engine_version = ENGINE_VERSION
+    record.input_hash = input_hash
+    record.computed_at = datetime.utcnow()
+    record.success = bool(stats['success'])
+    record.error = stats.get('error')
+    record.payload = json.dumps(stats, ensure_ascii=False, default=str)
+    record.columns = [ColumnMetrics(**row) for row in column_rows(stats.get('result') or {})]
+    return record
+
+
+def load_metrics(key: str):
+    """Метрики в том виде, в каком их вернул process_json, или None."""
+    record = DatasetMetrics.query.filter_by(key=key).first()
+    return json.loads(record.payload) if record else None
+
+
+def metrics_ready(key: str) -> bool:
+    """Есть ли метрики, посчитанные текущей версией движка."""
+    return db.session.query(
+        DatasetMetrics.query.filter_by(key=key, engine_version=ENGINE_VERSION).exists()).scalar()
+
+
+def remove_metrics(key: str):
+    record = DatasetMetrics.query.filter_by(key=key).first()
+    if record is not None:
+        db.session.delete(record)
+
+
+def datasets_with_missing(column: str, min_ratio: float, user_id: int = None) -> list:
+    """
+    Датасеты, у которых в колонке column доля пропусков больше min_ratio.
+    Поиск идёт по индексу (name, missing_ratio), без чтения метрик целиком.
+
+    Returns:
+        [(Dataset, ColumnMetrics), ...]
+    """
+    query = (
+        db.session.query(Dataset, ColumnMetrics)
+        .join(DatasetMetrics, ColumnMetrics.metrics_id == DatasetMetrics.id)
+        .join(Dataset, db.or_(
+            Dataset.content_hash == DatasetMetrics.key,
+            db.and_(Dataset.content_hash.is_(None), Dataset.filename == DatasetMetrics.key)))
+        .filter(ColumnMetrics.name == column, ColumnMetrics.missing_ratio > min_ratio)
+    )
+    if user_id is not None:
+        query = query.filter(Dataset.user_id == user_id)
+    return query.order_by(ColumnMetrics.missing_ratio.desc(), Dataset.id).all()
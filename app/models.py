@@ -27,6 +27,67 @@ class Dataset(db.Model):
     upload_date = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     #data_type = db.Column(db.String(50), default='json')
+    # Обработка идёт в фоне: processing -> ready | failed
+    status = db.Column(db.String(20), nullable=False, default='ready', server_default='ready')
+    job_id = db.Column(db.String(36))
+    error = db.Column(db.Text)
+    # sha256 содержимого: одинаковые файлы делят один blob, кеш и метрики
+    content_hash = db.Column(db.String(64), index=True)
+    # размер таблицы из Parquet-кеша: список файлов показывает его, не открывая файлы
+    row_count = db.Column(db.BigInteger)
+    column_count = db.Column(db.Integer)
+
+    # список файлов пользователя: фильтр по владельцу, новые сверху
+    __table_args__ = (
+        db.Index('ix_dataset_user_id_upload_date', 'user_id', 'upload_date'),
+    )
+
+    def __repr__(self):
+        return f'<Dataset {self.filename}>'
+
+    @property
+    def storage_key(self):
+        """Ключ кеша и метрик: хеш содержимого, для старых записей — имя файла."""
+        return self.content_hash or self.filename
+
+class DatasetMetrics(db.Model):
+    """
+    Метрики содержимого датасета. Ключ — storage_key: загрузки одного
+    содержимого делят одну запись, как кеш и blob.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(255), unique=True, nullable=False, index=True)
+    engine_version = db.Column(db.Integer, nullable=False)
+    # sha256 данных, по которым посчитаны метрики
+    input_hash = db.Column(db.String(64))
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    success = db.Column(db.Boolean, nullable=False, default=True)
+    error = db.Column(db.Text)
+    # полный результат process_json (JSON): его и показывает дашборд
+    payload = db.Column(db.Text, nullable=False)
+    columns = db.relationship('ColumnMetrics', backref='metrics', lazy=True, cascade='all, delete-orphan')
+
+    def __repr__(self):
+        return f'<DatasetMetrics {self.key}>'
+
+
+class ColumnMetrics(db.Model):
+    """Основные метрики одной колонки отдельными полями — для запросов по всем датасетам."""
+    id = db.Column(db.Integer, primary_key=True)
+    metrics_id = db.Column(db.Integer, db.ForeignKey('dataset_metrics.id', ondelete='CASCADE'), nullable=False, index=True)
+    name = db.Column(db.String(255), nullable=False)
+    count = db.Column(db.Float)
+    missing = db.Column(db.Float)
+    missing_ratio = db.Column(db.Float)
+    unique = db.Column(db.Float)
+    mean = db.Column(db.Float)
+    std = db.Column(db.Float)
+    min = db.Column(db.Float)
+    max = db.Column(db.Float)
+
+    __table_args__ = (
+        db.Index('ix_column_metrics_name_missing_ratio', 'name', 'missing_ratio'),
+    )
 
     def __repr__(self):
-        return f'<Dataset {self.filename}>'
\ No newline at end of file
+        return f'<ColumnMetrics {self.name}>'
@@ -1,41 +1,487 @@
 import pandas as pd
+import numpy as np
 import json
 import os 
-def process_json(json_table: dict) -> dict:
+import copy
+import base64
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import pyarrow as pa
+from statistics import NormalDist
+from pandas.api.types import is_numeric_dtype, is_bool_dtype
+from app.sketches import FrequentItems, HyperLogLog, QuantileSketch, hash_values
+NUMERIC_STATS = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+OBJECT_STATS = ['count', 'unique', 'top', 'freq']
+QUANTILES = np.array([0.25, 0.5, 0.75])
+# Версия алгоритмов подсчёта метрик; хранится вместе с метриками.
+# Если результаты расчёта меняются, версию нужно увеличить — старые метрики пересчитаются.
+ENGINE_VERSION = 2
+
+
+def _zero_out_fperr(values):
+    """Как в pandas: суммы моментов меньше 1e-14 считаем нулём (погрешность округления)."""
+    return np.where(np.abs(values) < 1e-14, 0.0, values)
+
+
+def _shape_stats(n, m2, m3, m4):
+    """
+    Асимметрия и эксцесс из сумм центральных моментов с той же поправкой
+    на смещение, что и у pandas (skew/kurt). Работает и со скалярами, и с массивами.
+    """
+    n = np.asarray(n, dtype='float64')
+    m2, m3, m4 = _zero_out_fperr(m2), _zero_out_fperr(m3), _zero_out_fperr(m4)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        skew = n * np.sqrt(n - 1) / (n - 2) * m3 / m2 ** 1.5
+        kurt = (n * (n + 1) * (n - 1) * m4 / ((n - 2) * (n - 3) * m2 ** 2)
+                - 3 * (n - 1) ** 2 / ((n - 2) * (n - 3)))
+    skew = np.where(m2 == 0, 0.0, skew)
+    kurt = np.where(m2 == 0, 0.0, kurt)
+    skew = np.where(n < 3, np.nan, skew)
+    kurt = np.where(n < 4, np.nan, kurt)
+    return skew, kurt
+
+
+def numeric_stats(block: np.ndarray) -> dict:
+    """
+    Метрики всех колонок блока за один векторизованный проход.
+
+    Колонки блока сортируются один раз (NaN уходят в конец), и из
+    отсортированного массива сразу берутся count, min, max, квартили
+    и число уникальных значений. Затем тот же массив на месте
+    центрируется для моментов (mean, std, skewness, kurtosis).
+
+    Args:
+        block: массив (строки x колонки) float64, NaN — пропуск.
+
+    Returns:
+        Словарь метрика -> массив значений по колонкам.
+    """
+    rows = block.shape[0]
+    # колонки должны лежать в памяти подряд (порядок F), иначе сортировка идёт с шагом
+    data = np.sort(np.asfortranarray(block), axis=0)
+    missing = np.isnan(data)
+    count = rows - missing.sum(axis=0)
+    has_values = count > 0
+    last = np.maximum(count - 1, 0)
+    cols = np.arange(data.shape[1])
+
+    minimum = np.where(has_values, data[0] if rows else np.nan, np.nan)
+    maximum = np.where(has_values, data[last, cols] if rows else np.nan, np.nan)
+
+    # квартили с линейной интерполяцией, как в describe()
+    position = QUANTILES[:, None] * last[None, :]
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, last[None, :])
+    fraction = position - lower
+    low_values = np.take_along_axis(data, lower, axis=0) if rows else np.full(lower.shape, np.nan)
+    high_values = np.take_along_axis(data, upper, axis=0) if rows else np.full(upper.shape, np.nan)
+    quantiles = np.where(has_values, low_values + (high_values - low_values) * fraction, np.nan)
+
+    # уникальные: границы между разными соседними значениями среди не-NaN
+    # (NaN != NaN, поэтому пары с NaN отсекаются маской)
+    changes = (data[1:] != data[:-1]) & ~missing[1:]
+    unique = changes.sum(axis=0) + has_values
+
+    mean, std, skew, kurt = _block_moments(data, missing, count)
+
+    return {
+        'count': count.astype('float64'),
+        'mean': mean,
+        'std': std,
+        'min': minimum,
+        '25%': quantiles[0],
+        '50%': quantiles[1],
+        '75%': quantiles[2],
+        'max': maximum,
+        'unique': unique,
+        'missing': rows - count,
+        'skewness': skew,
+        'kurtosis': kurt,
+    }
+
+
+def _block_moments(data: np.ndarray, missing: np.ndarray, count: np.ndarray):
+    """
+    mean, std, skewness и kurtosis колонок блока. Массив data центрируется
+    на месте, NaN (отмеченные в missing) заменяются нулём.
+    """
+    has_values = count > 0
+    data[missing] = 0.0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(has_values, data.sum(axis=0) / count, np.nan)
+    data -= np.where(has_values, mean, 0.0)
+    data[missing] = 0.0
+    squared = data * data
+    m2 = squared.sum(axis=0)
+    m3 = (squared * data).sum(axis=0)
+    m4 = (squared * squared).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std = np.where(count > 1, np.sqrt(m2 / (count - 1)), np.nan)
+    skew, kurt = _shape_stats(count, m2, m3, m4)
+    return mean, std, skew, kurt
+
+
+def approximate_numeric_stats(block: np.ndarray, hll_precision: int = 14, quantile_error: float = 0.01) -> dict:
+    """
+    То же, что numeric_stats, без сортировки блока: квартили оценивает
+    QuantileSketch, число уникальных — HyperLogLog, min и max берутся
+    одним проходом. Остальные метрики точные.
+    """
+    rows = block.shape[0]
+    data = np.array(block, dtype='float64', order='F')
+    missing = np.isnan(data)
+    count = rows - missing.sum(axis=0)
+    # fmin/fmax пропускают NaN, у пустой колонки результат — NaN
+    minimum = np.fmin.reduce(data, axis=0) if rows else np.full(data.shape[1], np.nan)
+    maximum = np.fmax.reduce(data, axis=0) if rows else np.full(data.shape[1], np.nan)
+
+    quantiles = np.full((len(QUANTILES), data.shape[1]), np.nan)
+    unique = np.zeros(data.shape[1], dtype=np.int64)
+    for i in range(data.shape[1]):
+        present = data[~missing[:, i], i]
+        if not present.size:
+            continue
+        sketch = QuantileSketch(quantile_error)
+        sketch.update(present)
+        quantiles[:, i] = sketch.quantiles(QUANTILES)
+        distinct = HyperLogLog(hll_precision)
+        distinct.update(present)
+        unique[i] = distinct.count()
+
+    mean, std, skew, kurt = _block_moments(data, missing, count)
+
+    return {
+        'count': count.astype('float64'),
+        'mean': mean,
+        'std': std,
+        'min': minimum,
+        '25%': quantiles[0],
+        '50%': quantiles[1],
+        '75%': quantiles[2],
+        'max': maximum,
+        'unique': unique,
+        'missing': rows - count,
+        'skewness': skew,
+        'kurtosis': kurt,
+    }
+
+
+# по столько значений строковая колонка хешируется и сводится в FrequentItems
+FREQUENT_BLOCK_ROWS = 1 << 16
+
+
+def approximate_object_stats(series: pd.Series, layout: list, hll_precision: int = 14,
+                             top_capacity: int = 1024) -> dict:
+    """
+    Метрики строковой колонки без value_counts и без сортировки всех значений:
+    значения хешируются блоками по FREQUENT_BLOCK_ROWS, число уникальных
+    оценивает HyperLogLog, самое частое значение — FrequentItems (Misra-Gries)
+    по хешам. В 'approximate' — относительные ошибки unique и freq.
+    """
+    values = series.dropna().to_numpy()
+    column = {key: float('nan') for key in layout}
+    column['count'] = len(values)
+    column['missing'] = len(series) - len(values)
+    if not len(values):
+        column.update({'unique': 0, 'top': None, 'freq': None, 'approximate': approximate_marks(hll_precision)})
+        return column
+
+    distinct = HyperLogLog(hll_precision)
+    frequent = FrequentItems(top_capacity)
+    where = {}  # хеш из скетча -> номер строки с таким значением
+    for start in range(0, len(values), FREQUENT_BLOCK_ROWS):
+        hashes = hash_values(values[start:start + FREQUENT_BLOCK_ROWS])
+        distinct.update_hashes(hashes)
+        keys, positions, counts = np.unique(hashes, return_index=True, return_counts=True)
+        frequent.update_arrays(keys, counts)
+        kept = np.fromiter(frequent.counters, dtype=np.uint64, count=len(frequent.counters))
+        found = np.isin(keys, kept)
+        where = {key: position for key, position in where.items() if key in frequent.counters}
+        for key, position in zip(keys[found].tolist(), (positions[found] + start).tolist()):
+            where.setdefault(key, position)
+
+    top_hash, freq = frequent.top()
+    column['unique'] = distinct.count()
+    column['top'] = _native(values[where[top_hash]])
+    column['freq'] = int(freq)
+    column['approximate'] = approximate_marks(hll_precision)
+    if frequent.error:
+        # частота занижена не больше чем на error строк
+        column['approximate']['freq'] = round(frequent.error / freq, 6)
+    return column
+
+
+def approximate_marks(hll_precision: int, quantile_error: float = None) -> dict:
+    """Какие метрики колонки приближённые и с какой относительной ошибкой."""
+    marks = {'unique': round(1.04 / (1 << hll_precision) ** 0.5, 6)}
+    if quantile_error is not None:
+        marks.update({key: quantile_error for key in ('25%', '50%', '75%')})
+    return marks
+
+
+def _native(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _block_stats(block: np.ndarray, approximate: bool, hll_precision: int, quantile_error: float) -> dict:
+    if approximate:
+        stats = approximate_numeric_stats(block, hll_precision, quantile_error)
+        stats['approximate'] = approximate_marks(hll_precision, quantile_error)
+        return stats
+    return numeric_stats(block)
+
+
+def _numeric_result(stats: dict, i: int, layout: list) -> dict:
+    column = {key: float('nan') for key in layout}
+    column.update({key: float(stats[key][i]) for key in NUMERIC_STATS})
+    column['unique'] = int(stats['unique'][i])
+    column['missing'] = int(stats['missing'][i])
+    column['skewness'] = float(stats['skewness'][i])
+    column['kurtosis'] = float(stats['kurtosis'][i])
+    if 'approximate' in stats:
+        # у пустой колонки квартилей нет — нечего и помечать
+        column['approximate'] = {key: error for key, error in stats['approximate'].items()
+                                 if stats['count'][i] or key == 'unique'}
+    return column
+
+
+def object_stats(series: pd.Series, layout: list, approximate: bool = False, hll_precision: int = 14) -> dict:
+    """Метрики нечисловой колонки (count, unique, top, freq, missing)."""
+    if approximate:
+        return approximate_object_stats(series, layout, hll_precision)
+    counts = series.value_counts(dropna=True)
+    count = int(counts.sum())
+    column = {key: float('nan') for key in layout}
+    column['count'] = count
+    column['unique'] = len(counts)
+    column['top'] = _native(counts.index[0]) if len(counts) else None
+    column['freq'] = int(counts.iloc[0]) if len(counts) else None
+    column['missing'] = len(series) - count
+    return column
+
+
+def _split_columns(df: pd.DataFrame):
+    numeric_cols = [col for col in df.columns
+                    if is_numeric_dtype(df[col]) and not is_bool_dtype(df[col])]
+    numeric_set = set(numeric_cols)
+    object_cols = [col for col in df.columns if col not in numeric_set]
+
+    # порядок ключей как у pd.concat(describe(числа), describe(объекты))
+    layout = []
+    if numeric_cols:
+        layout += NUMERIC_STATS
+    if object_cols:
+        layout += [key for key in OBJECT_STATS if key not in layout]
+    return numeric_cols, object_cols, layout
+
+
+def describe_frame(df: pd.DataFrame, block_columns: int = 16, approximate: bool = False,
+                   hll_precision: int = 14, workers: int = 1, quantile_error: float = 0.01) -> dict:
+    """
+    Метрики всех колонок DataFrame в формате, который раньше собирался
+    из describe(), nunique(), isnull().sum(), skew() и kurt().
+
+    Числовые колонки обрабатываются блоками по block_columns через
+    numeric_stats, так что временные массивы ограничены размером блока.
+    С approximate=True колонки считаются без сортировки и value_counts:
+    у числовых квартили оценивает QuantileSketch с ошибкой quantile_error,
+    а уникальные — HyperLogLog (approximate_numeric_stats), у строковых
+    уникальные и самое частое значение — скетчи (approximate_object_stats).
+    В метрики колонки тогда добавляется словарь 'approximate':
+    метрика -> относительная ошибка. При workers > 1 группы колонок считаются в пуле процессов
+    (describe_parallel), результат тот же.
+    """
+    if workers > 1 and len(df.columns) > 1:
+        return describe_parallel(df, workers, block_columns, approximate, hll_precision, quantile_error)
+
+    rows = len(df)
+    numeric_cols, object_cols, layout = _split_columns(df)
+
+    result = {}
+    for start in range(0, len(numeric_cols), block_columns):
+        cols = numeric_cols[start:start + block_columns]
+        block = np.empty((rows, len(cols)), dtype='float64', order='F')
+        for i, col in enumerate(cols):
+            block[:, i] = df[col].to_numpy(dtype='float64', na_value=np.nan)
+        stats = _block_stats(block, approximate, hll_precision, quantile_error)
+        for i, col in enumerate(cols):
+            result[col] = _numeric_result(stats, i, layout)
+
+    for col in object_cols:
+        result[col] = object_stats(df[col], layout, approximate, hll_precision)
+
+    # исходный порядок колонок
+    return {col: result[col] for col in df.columns}
+
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _stats_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Общий пул процессов для метрик. Создаётся один раз (процессы стартуют
+    через forkserver: форк из процесса с потоками JobQueue небезопасен).
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers,
+                                        mp_context=multiprocessing.get_context('forkserver'))
+            _pool_workers = workers
+        return _pool
+
+
+def _numeric_task(name: str, shape: tuple, start: int, stop: int, block_columns: int,
+                  approximate: bool, hll_precision: int, quantile_error: float) -> list:
+    """Метрики колонок start:stop матрицы из разделяемой памяти (выполняется в пуле)."""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        values = np.ndarray(shape, dtype='float64', buffer=shm.buf, order='F')
+        results = []
+        for begin in range(start, stop, block_columns):
+            # метрики считаются по копии блока, сама матрица не меняется
+            results.append(_block_stats(values[:, begin:min(begin + block_columns, stop)],
+                                        approximate, hll_precision, quantile_error))
+        del values
+        return results
+    finally:
+        shm.close()
+
+
+def _object_task(name: str, size: int, fields: list, layout: list,
+                 approximate: bool, hll_precision: int) -> list:
+    """Метрики нечисловых колонок из Arrow-таблицы в разделяемой памяти."""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        table = pa.ipc.open_stream(pa.py_buffer(shm.buf)[:size]).read_all()
+        results = [object_stats(table.column(field).to_pandas(), layout, approximate, hll_precision)
+                   for field in fields]
+        del table
+        return results
+    finally:
+        shm.close()
+
+
+def _arrow_columns(df: pd.DataFrame, columns: list):
+    """
+    Переводит колонки в Arrow для передачи в пул. Колонки, которые Arrow
+    не принимает (значения разных типов), возвращаются отдельно.
+    """
+    arrays, fields, rest = [], [], []
+    for col in columns:
+        try:
+            arrays.append(pa.Array.from_pandas(df[col]))
+            fields.append(f'c{len(fields)}')
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            rest.append(col)
+    converted = [col for col in columns if col not in set(rest)]
+    return converted, pa.Table.from_arrays(arrays, names=fields) if arrays else None, rest
+
+
+def _shared_segment(segments: list, size: int) -> shared_memory.SharedMemory:
+    """Новый сегмент разделяемой памяти; segments — список для удаления в finally."""
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    segments.append(shm)
+    return shm
+
+
+def _ipc_payload(table: pa.Table) -> pa.Buffer:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def describe_parallel(df: pd.DataFrame, workers: int, block_columns: int = 16,
+                      approximate: bool = False, hll_precision: int = 14, quantile_error: float = 0.01) -> dict:
+    """
+    describe_frame в пуле из workers процессов.
+
+    Числовые колонки один раз копируются в общую матрицу float64 (порядок F)
+    в разделяемой памяти, нечисловые — в Arrow-таблицу там же; процессы
+    получают только имя сегмента и свой диапазон колонок, а возвращают
+    небольшие словари метрик, которые собираются в прежнюю структуру.
+    """
+    rows = len(df)
+    numeric_cols, object_cols, layout = _split_columns(df)
+    pool = _stats_pool(workers)
+    segments = []
+    futures = []
+    result = {}
+
+    try:
+        if numeric_cols:
+            shape = (rows, len(numeric_cols))
+            shm = _shared_segment(segments, rows * len(numeric_cols) * 8)
+            values = np.ndarray(shape, dtype='float64', buffer=shm.buf, order='F')
+            for i, col in enumerate(numeric_cols):
+                values[:, i] = df[col].to_numpy(dtype='float64', na_value=np.nan)
+            del values
+            # группы по числу процессов, но не мельче одного блока
+            step = max(block_columns, -(-len(numeric_cols) // workers))
+            for start in range(0, len(numeric_cols), step):
+                stop = min(start + step, len(numeric_cols))
+                future = pool.submit(_numeric_task, shm.name, shape, start, stop, block_columns,
+                                     approximate, hll_precision, quantile_error)
+                futures.append(('numeric', numeric_cols[start:stop], future))
+
+        converted, table, rest = _arrow_columns(df, object_cols)
+        if table is not None:
+            payload = _ipc_payload(table)
+            size = payload.size
+            shm = _shared_segment(segments, size)
+            np.ndarray(size, dtype=np.uint8, buffer=shm.buf)[:] = np.frombuffer(payload, dtype=np.uint8)
+            fields = table.column_names
+            del payload, table
+            step = -(-len(fields) // workers)
+            for start in range(0, len(fields), step):
+                future = pool.submit(_object_task, shm.name, size, fields[start:start + step],
+                                     layout, approximate, hll_precision)
+                futures.append(('object', converted[start:start + step], future))
+
+        # колонки, которые нельзя передать через Arrow, считаем здесь, пока работает пул
+        for col in rest:
+            result[col] = object_stats(df[col], layout, approximate, hll_precision)
+
+        for kind, cols, future in futures:
+            if kind == 'numeric':
+                offset = 0
+                for stats in future.result():
+                    width = len(stats['count'])
+                    for i in range(width):
+                        result[cols[offset + i]] = _numeric_result(stats, i, layout)
+                    offset += width
+            else:
+                for col, column in zip(cols, future.result()):
+                    result[col] = column
+    finally:
+        for future in futures:
+            future[2].cancel()
+        for shm in segments:
+            shm.close()
+            shm.unlink()
+
+    return {col: result[col] for col in df.columns}
+
+
+def process_json(json_table: dict, approximate: bool = False, hll_precision: int = 14,
+                 workers: int = 1, quantile_error: float = 0.01) -> dict:
     try:
         df = pd.DataFrame(json_table)
 
         if df.empty:
             raise ValueError("Your file is empty.")
 
-        correlation  = df.corr(numeric_only=True).to_dict()
-        print("corelation: ", correlation, "\n")
-
-        numeric_stat = df.describe(include=[float, int])
-        object_stat = df.describe(include=[object])
-        combined_stat = pd.concat([numeric_stat, object_stat], axis=1)
-        
-        unique_counts = {col: df[col].nunique() for col in df.columns}
-        
-        missing_counts = df.isnull().sum().to_dict()
-        
-        skew = df.skew(numeric_only=True).to_dict()
-        
-        kurt = df.kurt(numeric_only=True).to_dict()
-        # Сохранение результата
-        result = combined_stat.to_dict()
-
-        for key in unique_counts.keys():
-            result[key]['unique'] = unique_counts[key]
-            result[key]['missing'] = missing_counts[key]
-        for key in skew.keys():
-            result[key]['skewness'] = skew[key]
-            result[key]['kurtosis'] = kurt[key]
-            for subkey in  correlation[key].keys():
-                if subkey != key:
-                    print(correlation[key][subkey])
-                    result['corellation'] = correlation[key][subkey]
-        
+        # Сохранение результата; матрицу корреляций считает app.correlation
+        result = describe_frame(df, approximate=approximate, hll_precision=hll_precision, workers=workers,
+                                quantile_error=quantile_error)
+
         return {
             "success":True,
             "result" :result
@@ -44,4 +490,652 @@ def process_json(json_table: dict) -> dict:
         return {
                 "success":False,
                 "error" :str(e)
-            }
\ No newline at end of file
+            }
+
+
+def sample_metrics(sample: pd.DataFrame, estimated_rows: int, confidence: float = 0.95) -> dict:
+    """
+    Предварительные метрики по случайной выборке строк с доверительными
+    интервалами. Формат как у process_json; у каждой колонки есть 'ci':
+    метрика -> [нижняя, верхняя граница], а count и missing пересчитаны
+    на оценку числа строк во всём файле. unique и top/freq относятся только
+    к выборке.
+
+    Интервалы: для среднего и std — нормальное приближение, для квартилей —
+    порядковые статистики выборки (биномиальный интервал рангов), для доли
+    пропусков — интервал Уилсона.
+    """
+    if sample.empty:
+        return {"success": False, "error": "Your file is empty."}
+
+    z = float(NormalDist().inv_cdf(0.5 + confidence / 2))
+    n = len(sample)
+    scale = estimated_rows / n if n else 0.0
+    result = describe_frame(sample)
+
+    for col, column in result.items():
+        ci = {}
+        # доля пропусков: интервал Уилсона, затем в строки всего файла
+        p = column['missing'] / n
+        centre = (p + z * z / (2 * n)) / (1 + z * z / n)
+        half = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+        low, high = max(centre - half, 0.0), min(centre + half, 1.0)
+        ci['missing'] = [round(low * estimated_rows), round(high * estimated_rows)]
+        ci['count'] = [round((1 - high) * estimated_rows), round((1 - low) * estimated_rows)]
+        column['missing'] = round(column['missing'] * scale)
+        count = round(column['count'] * scale)
+        column['count'] = float(count) if isinstance(column['count'], float) else count
+
+        series = sample[col]
+        if is_numeric_dtype(series) and not is_bool_dtype(series) and np.isfinite(column['std']):
+            values = series.to_numpy(dtype='float64', na_value=np.nan)
+            values = values[~np.isnan(values)]
+            m = values.size
+            std = column['std']
+            ci['mean'] = [column['mean'] - z * std / np.sqrt(m), column['mean'] + z * std / np.sqrt(m)]
+            ci['std'] = [std * (1 - z / np.sqrt(2 * (m - 1))), std * (1 + z / np.sqrt(2 * (m - 1)))]
+            ordered = np.sort(values)
+            for key, q in zip(('25%', '50%', '75%'), QUANTILES):
+                spread = z * np.sqrt(m * q * (1 - q))
+                lo = int(np.clip(np.floor(m * q - spread), 0, m - 1))
+                hi = int(np.clip(np.ceil(m * q + spread), 0, m - 1))
+                ci[key] = [float(ordered[lo]), float(ordered[hi])]
+        column['ci'] = {key: [float(a), float(b)] for key, (a, b) in ci.items()}
+
+    return {
+        "success": True,
+        "result": result,
+        "sample": {
+            "rows": n,
+            "estimated_rows": int(estimated_rows),
+            "confidence": confidence,
+        },
+    }
+
+
+def _chunk_moments(values):
+    """Центральные моменты одной порции: (n, mean, M2, M3, M4) без учёта NaN."""
+    values = values[~np.isnan(values)]
+    n = values.size
+    if n == 0:
+        return 0, 0.0, 0.0, 0.0, 0.0
+    mean = values.mean()
+    d = values - mean
+    d2 = d * d
+    return n, mean, d2.sum(), (d2 * d).sum(), (d2 * d2).sum()
+
+
+def _merge_moments(a, b):
+    """Объединяет центральные моменты двух частей выборки (формулы Pébay)."""
+    na, mean_a, m2a, m3a, m4a = a
+    nb, mean_b, m2b, m3b, m4b = b
+    if na == 0:
+        return b
+    if nb == 0:
+        return a
+
+    n = na + nb
+    d = mean_b - mean_a
+    d2 = d * d
+    mean = mean_a + d * nb / n
+    m2 = m2a + m2b + d2 * na * nb / n
+    m3 = (m3a + m3b + d * d2 * na * nb * (na - nb) / n ** 2
+          + 3 * d * (na * m2b - nb * m2a) / n)
+    m4 = (m4a + m4b + d2 * d2 * na * nb * (na * na - na * nb + nb * nb) / n ** 3
+          + 6 * d2 * (na * na * m2b + nb * nb * m2a) / n ** 2
+          + 4 * d * (na * m3b - nb * m3a) / n)
+    return n, mean, m2, m3, m4
+
+
+def _moments_to_stats(n, mean, m2, m3, m4) -> dict:
+    """Переводит моменты в метрики с той же поправкой на смещение, что и pandas."""
+    skewness, kurtosis = _shape_stats(n, m2, m3, m4)
+    return {
+        'count': float(n),
+        'mean': float(mean) if n else float('nan'),
+        'std': float(np.sqrt(m2 / (n - 1))) if n > 1 else float('nan'),
+        'skewness': float(skewness),
+        'kurtosis': float(kurtosis),
+    }
+
+
+def _encode_array(values: np.ndarray) -> dict:
+    values = np.ascontiguousarray(values)
+    return {
+        'dtype': values.dtype.str,
+        'shape': list(values.shape),
+        'data': base64.b64encode(values.tobytes()).decode('ascii'),
+    }
+
+
+def _decode_array(encoded: dict) -> np.ndarray:
+    values = np.frombuffer(base64.b64decode(encoded['data']), dtype=encoded['dtype'])
+    return values.reshape(encoded['shape']).copy()
+
+
+class CoMoments:
+    """
+    Суммы для попарной корреляции числовых колонок (как df.corr(): по строкам,
+    где заполнены обе колонки). Для пары (i, j) хранятся
+    n — число таких строк, s — сумма x_i, q — сумма x_i², p — сумма x_i·x_j.
+    Значения сдвинуты на shift (среднее первой порции), чтобы не терять
+    точность на больших числах. Суммы складываются, поэтому части можно считать
+    отдельно (в том числе параллельно) и объединять через merge().
+    """
+
+    def __init__(self):
+        self.columns = []
+        self.shift = np.zeros(0)
+        self.n = np.zeros((0, 0))
+        self.s = np.zeros((0, 0))
+        self.q = np.zeros((0, 0))
+        self.p = np.zeros((0, 0))
+
+    def _expand(self, columns, shift):
+        new = [col for col in columns if col not in self.columns]
+        if not new:
+            return
+        k = len(self.columns) + len(new)
+        for name in ('n', 's', 'q', 'p'):
+            grown = np.zeros((k, k))
+            old = getattr(self, name)
+            grown[:old.shape[0], :old.shape[1]] = old
+            setattr(self, name, grown)
+        self.shift = np.concatenate([self.shift, [shift[col] for col in new]])
+        self.columns += new
+
+    def update(self, values: np.ndarray, columns: list):
+        """values: (строки x колонки) float64 в порядке columns, NaN — пропуск."""
+        with np.errstate(invalid='ignore'):
+            first = {col: np.nanmean(values[:, i]) if (~np.isnan(values[:, i])).any() else 0.0
+                     for i, col in enumerate(columns)}
+        self._expand(columns, first)
+
+        index = [self.columns.index(col) for col in columns]
+        shifted = values - self.shift[index]
+        valid = ~np.isnan(shifted)
+        mask = valid.astype('float64')
+        x = np.where(valid, shifted, 0.0)
+
+        grid = np.ix_(index, index)
+        self.n[grid] += mask.T @ mask
+        self.s[grid] += x.T @ mask
+        self.q[grid] += (x * x).T @ mask
+        self.p[grid] += x.T @ x
+
+    def _reshift(self, shift: np.ndarray):
+        delta = (shift - self.shift)[:, None]
+        s, n = self.s, self.n
+        self.q = self.q - 2 * delta * s + delta * delta * n
+        self.p = self.p - delta.T * s - delta * s.T + delta * delta.T * n
+        self.s = s - delta * n
+        self.shift = shift
+
+    def merge(self, other: 'CoMoments'):
+        other = copy.deepcopy(other)
+        self._expand(other.columns, dict(zip(other.columns, other.shift)))
+        other._expand(self.columns, dict(zip(self.columns, self.shift)))
+        order = [other.columns.index(col) for col in self.columns]
+        grid = np.ix_(order, order)
+        other.shift = other.shift[order]
+        other.columns = list(self.columns)
+        for name in ('n', 's', 'q', 'p'):
+            setattr(other, name, getattr(other, name)[grid])
+        other._reshift(self.shift)
+        for name in ('n', 's', 'q', 'p'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def correlation(self) -> pd.DataFrame:
+        n, s = self.n, self.s
+        with np.errstate(invalid='ignore', divide='ignore'):
+            m2 = self.q - s * s / n
+            c = self.p - s * s.T / n
+            corr = c / np.sqrt(m2 * m2.T)
+        corr = np.where(n > 1, np.clip(corr, -1.0, 1.0), np.nan)
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+    def to_state(self) -> dict:
+        return {
+            'columns': list(self.columns),
+            'shift': _encode_array(self.shift),
+            'n': _encode_array(self.n),
+            's': _encode_array(self.s),
+            'q': _encode_array(self.q),
+            'p': _encode_array(self.p),
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'CoMoments':
+        comoments = cls()
+        comoments.columns = list(state['columns'])
+        for name in ('shift', 'n', 's', 'q', 'p'):
+            setattr(comoments, name, _decode_array(state[name]))
+        return comoments
+
+
+def _union_sorted(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Объединение отсортированных массивов уникальных хешей, результат тоже отсортирован и уникален."""
+    merged = np.concatenate([a, b])
+    # два отсортированных участка: timsort сливает их за линейное время
+    merged.sort(kind='stable')
+    if len(merged) < 2:
+        return merged
+    return merged[np.r_[True, merged[1:] != merged[:-1]]]
+
+
+def _json_value(value):
+    value = _native(value)
+    if not isinstance(value, (str, int, float, bool)):
+        value = str(value)  # даты и прочее храним строкой, чтобы состояние было JSON
+    return value
+
+
+class HashCounts:
+    """
+    Точные частоты значений колонки в компактном виде: отсортированный
+    массив 64-битных хешей значений и счётчики к нему — 16 байт на уникальное
+    значение вместо строк и объектов Python в dict. Сами значения хранятся
+    только для capacity самых частых хешей, среди них — самое частое (top).
+
+    Хеш, которого нет в новой порции, не может обогнать прежних лидеров,
+    поэтому после update() значение лидера всегда известно. После merge()
+    оно известно, если лидер входил в capacity самых частых хотя бы в одной
+    из частей; иначе (почти равные частоты) top — самое частое из известных.
+    При равных частотах выбирается меньший хеш: результат не зависит
+    от порядка порций.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self.hashes = np.zeros(0, dtype=np.uint64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.values = {}  # хеш -> значение для самых частых
+
+    def update(self, values: np.ndarray, counts: np.ndarray):
+        """values — различные значения порции без пропусков, counts — сколько раз встретилось каждое."""
+        if len(values) == 0:
+            return
+        hashes = hash_values(values)
+        order = np.argsort(hashes)
+        hashes = hashes[order]
+        values = np.asarray(values)[order]
+
+        def find(wanted: np.ndarray) -> dict:
+            index = np.minimum(np.searchsorted(hashes, wanted), len(hashes) - 1)
+            return {key: _json_value(values[i])
+                    for key, i, ok in zip(wanted.tolist(), index.tolist(), (hashes[index] == wanted).tolist()) if ok}
+
+        self._add(hashes, np.asarray(counts, dtype=np.int64)[order], find)
+
+    def merge(self, other: 'HashCounts'):
+        self._add(other.hashes, other.counts,
+                  lambda wanted: {key: other.values[key] for key in wanted.tolist() if key in other.values})
+        return self
+
+    def _add(self, hashes: np.ndarray, counts: np.ndarray, find):
+        merged = np.concatenate([self.hashes, hashes])
+        if len(merged) == 0:
+            return
+        order = np.argsort(merged, kind='stable')
+        merged = merged[order]
+        # у одинаковых хешей (значение в обеих частях) счётчики складываются
+        starts = np.flatnonzero(np.r_[True, merged[1:] != merged[:-1]])
+        self.counts = np.add.reduceat(np.concatenate([self.counts, counts])[order], starts)
+        self.hashes = merged[starts]
+
+        if len(self.hashes) > self.capacity:
+            leaders = self.hashes[np.argpartition(-self.counts, self.capacity - 1)[:self.capacity]]
+        else:
+            leaders = self.hashes
+        known = {key: self.values[key] for key in leaders.tolist() if key in self.values}
+        missing = np.array([key for key in leaders.tolist() if key not in known], dtype=np.uint64)
+        if len(missing):
+            known.update(find(missing))
+        self.values = known
+
+    @property
+    def unique(self) -> int:
+        return len(self.hashes)
+
+    def top(self):
+        """(самое частое значение, его частота) или (None, None)."""
+        if not len(self.counts):
+            return None, None
+        index = int(np.argmax(self.counts))  # среди равных — меньший хеш
+        key = int(self.hashes[index])
+        if key not in self.values:
+            if not self.values:
+                return None, int(self.counts[index])
+            # значение лидера потеряно при merge (см. выше): самое частое из известных
+            positions = np.searchsorted(self.hashes, np.array(list(self.values), dtype=np.uint64))
+            index = int(positions[np.argmax(self.counts[positions])])
+            key = int(self.hashes[index])
+        return self.values[key], int(self.counts[index])
+
+    def to_state(self) -> dict:
+        return {
+            'capacity': self.capacity,
+            'hashes': _encode_array(self.hashes),
+            'counts': _encode_array(self.counts),
+            'values': [[key, value] for key, value in self.values.items()],
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'HashCounts':
+        counts = cls(state['capacity'])
+        counts.hashes = _decode_array(state['hashes'])
+        counts.counts = _decode_array(state['counts'])
+        counts.values = {int(key): value for key, value in state['values']}
+        return counts
+
+
+class StreamingStats:
+    """
+    Накопитель метрик для больших и дозагружаемых файлов: получает данные
+    порциями и хранит только агрегаты (моменты, min/max, частоты, суммы для
+    корреляции), поэтому память не зависит от числа строк.
+
+    Накопители объединяются через merge(): так метрики дописанных строк
+    добавляются к уже посчитанным без пересчёта всей истории, а порции можно
+    считать независимо. Состояние сохраняется в JSON (to_state/from_state).
+    result() возвращает метрики в том же формате, что и describe_frame.
+
+    В точном режиме уникальные считаются по отсортированным массивам хешей
+    (HashCounts, у числовых — только хеши). Квартили точны, пока данные
+    пришли одной порцией; у нескольких порций их оценивает QuantileSketch,
+    и они помечаются приближёнными. С approximate=True число уникальных
+    оценивает HyperLogLog, квартили — QuantileSketch, самое частое значение
+    строковых колонок — FrequentItems по хешам значений (сами значения
+    хранятся только для оставшихся в скетче хешей); память тогда не зависит
+    и от числа уникальных значений.
+    """
+
+    STATE_VERSION = 4
+
+    def __init__(self, approximate: bool = False, hll_precision: int = 14,
+                 quantile_error: float = 0.01, top_capacity: int = 1024):
+        self.rows = 0
+        self.columns = []  # порядок колонок в данных
+        # колонка -> {'moments', 'min', 'max', 'quantiles', 'quartiles', 'hashes' | 'distinct'}
+        self.numeric = {}
+        self.objects = {}  # колонка -> {'count', 'counts' | 'distinct', 'frequent' и 'values'}
+        self.comoments = CoMoments()
+        self.approximate = approximate
+        self.hll_precision = hll_precision
+        self.quantile_error = quantile_error
+        self.top_capacity = top_capacity
+
+    @property
+    def options(self) -> dict:
+        """Параметры, с которыми создан накопитель (для совместимого merge)."""
+        return {
+            'approximate': self.approximate,
+            'hll_precision': self.hll_precision,
+            'quantile_error': self.quantile_error,
+            'top_capacity': self.top_capacity,
+        }
+
+    def _new_numeric(self) -> dict:
+        # quartiles — точные квартили, пока данные пришли одной порцией
+        acc = {'moments': (0, 0.0, 0.0, 0.0, 0.0), 'min': np.inf, 'max': -np.inf,
+               'quantiles': QuantileSketch(self.quantile_error), 'quartiles': None}
+        if self.approximate:
+            acc['distinct'] = HyperLogLog(self.hll_precision)
+        else:
+            acc['hashes'] = np.zeros(0, dtype=np.uint64)
+        return acc
+
+    def _new_object(self) -> dict:
+        if self.approximate:
+            # frequent считает хеши значений; values — значения только тех хешей, что в нём остались
+            return {'count': 0, 'distinct': HyperLogLog(self.hll_precision),
+                    'frequent': FrequentItems(self.top_capacity), 'values': {}}
+        return {'count': 0, 'counts': HashCounts(self.top_capacity)}
+
+    def update(self, chunk: pd.DataFrame):
+        self.rows += len(chunk)
+
+        numeric_values, columns = [], []
+        for col in chunk.columns:
+            series = chunk[col]
+            new = col not in self.numeric and col not in self.objects
+            if new:
+                self.columns.append(col)
+                if is_numeric_dtype(series) and not is_bool_dtype(series):
+                    self.numeric[col] = self._new_numeric()
+                else:
+                    self.objects[col] = self._new_object()
+
+            if col in self.numeric:
+                numeric_values.append(self._update_numeric(self.numeric[col], series))
+                columns.append(col)
+            else:
+                self._update_object(self.objects[col], series)
+                # флаги в метриках — категории, но в корреляции участвуют как 0/1, как в df.corr()
+                if col in self.comoments.columns or (new and is_bool_dtype(series)):
+                    numeric_values.append(pd.to_numeric(series, errors='coerce')
+                                          .to_numpy(dtype='float64', na_value=np.nan))
+                    columns.append(col)
+
+        if columns:
+            self.comoments.update(np.column_stack(numeric_values), columns)
+
+    def _update_numeric(self, acc: dict, series: pd.Series) -> np.ndarray:
+        if not is_numeric_dtype(series):
+            series = pd.to_numeric(series, errors='coerce')
+        values = series.to_numpy(dtype='float64', na_value=np.nan)
+
+        moments = _chunk_moments(values)
+        if moments[0] == 0:
+            return values
+        first = acc['moments'][0] == 0
+        acc['moments'] = _merge_moments(acc['moments'], moments)
+        acc['min'] = min(acc['min'], float(np.nanmin(values)))
+        acc['max'] = max(acc['max'], float(np.nanmax(values)))
+        present = values[~np.isnan(values)]
+        acc['quantiles'].update(present)
+        if self.approximate:
+            acc['distinct'].update(present)
+        else:
+            # квартили как в describe(), пока это единственная порция с данными
+            acc['quartiles'] = np.quantile(present, QUANTILES).tolist() if first else None
+            # для подсчёта уникальных храним отсортированные 8-байтовые хеши, а не сами значения
+            acc['hashes'] = _union_sorted(acc['hashes'], np.unique(pd.util.hash_array(present)))
+        return values
+
+    def _update_object(self, acc: dict, series: pd.Series):
+        if not self.approximate:
+            counts = series.value_counts(dropna=True)
+            acc['count'] += int(counts.sum())
+            acc['counts'].update(counts.index.to_numpy(), counts.to_numpy())
+            return
+
+        # как approximate_object_stats: хеши порции, их частоты — np.unique, без value_counts
+        values = series.dropna().to_numpy(dtype=object)
+        acc['count'] += len(values)
+        if not len(values):
+            return
+        hashes = hash_values(values)
+        acc['distinct'].update_hashes(hashes)
+        keys, positions, counts = np.unique(hashes, return_index=True, return_counts=True)
+        frequent = acc['frequent']
+        frequent.update_arrays(keys, counts)
+        kept = {key: value for key, value in acc['values'].items() if key in frequent.counters}
+        found = np.isin(keys, np.fromiter(frequent.counters, dtype=np.uint64, count=len(frequent.counters)))
+        for key, position in zip(keys[found].tolist(), positions[found].tolist()):
+            if key not in kept:
+                kept[key] = _json_value(values[position])
+        acc['values'] = kept
+
+    def merge(self, other: 'StreamingStats'):
+        """Добавляет к накопителю метрики другой части данных."""
+        if other.options != self.options:
+            raise ValueError("Cannot merge metrics accumulated with different options")
+        self.rows += other.rows
+        self.columns += [col for col in other.columns if col not in self.columns]
+
+        for col, acc in other.numeric.items():
+            own = self.numeric.setdefault(col, self._new_numeric())
+            if own['moments'][0] == 0:
+                own['quartiles'] = acc['quartiles']
+            elif acc['moments'][0]:
+                own['quartiles'] = None
+            own['moments'] = _merge_moments(own['moments'], acc['moments'])
+            own['min'] = min(own['min'], acc['min'])
+            own['max'] = max(own['max'], acc['max'])
+            own['quantiles'].merge(acc['quantiles'])
+            if self.approximate:
+                own['distinct'].merge(acc['distinct'])
+            else:
+                own['hashes'] = _union_sorted(own['hashes'], acc['hashes'])
+
+        for col, acc in other.objects.items():
+            own = self.objects.setdefault(col, self._new_object())
+            own['count'] += acc['count']
+            if self.approximate:
+                own['distinct'].merge(acc['distinct'])
+                own['frequent'].merge(acc['frequent'])
+                values = {**acc['values'], **own['values']}
+                own['values'] = {key: values[key] for key in own['frequent'].counters}
+            else:
+                own['counts'].merge(acc['counts'])
+
+        self.comoments.merge(other.comoments)
+        return self
+
+    def to_state(self) -> dict:
+        numeric = {}
+        for col, acc in self.numeric.items():
+            state = {
+                'moments': [float(v) for v in acc['moments']],
+                'min': acc['min'],
+                'max': acc['max'],
+                'quantiles': acc['quantiles'].to_state(),
+                'quartiles': acc['quartiles'],
+            }
+            if self.approximate:
+                state['distinct'] = acc['distinct'].to_state()
+            else:
+                state['hashes'] = _encode_array(acc['hashes'])
+            numeric[col] = state
+
+        objects = {}
+        for col, acc in self.objects.items():
+            if self.approximate:
+                objects[col] = {'count': acc['count'], 'distinct': acc['distinct'].to_state(),
+                                'frequent': acc['frequent'].to_state(),
+                                'values': [[key, value] for key, value in acc['values'].items()]}
+            else:
+                objects[col] = {'count': acc['count'], 'counts': acc['counts'].to_state()}
+
+        return {
+            'version': self.STATE_VERSION,
+            'options': self.options,
+            'rows': self.rows,
+            'columns': list(self.columns),
+            'numeric': numeric,
+            'objects': objects,
+            'comoments': self.comoments.to_state(),
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'StreamingStats':
+        if state.get('version') != cls.STATE_VERSION:
+            raise ValueError(f"Unsupported metrics state version: {state.get('version')}")
+        stats = cls(**state.get('options', {}))
+        stats.rows = state['rows']
+        stats.columns = list(state['columns'])
+        for col, acc in state['numeric'].items():
+            n, mean, m2, m3, m4 = acc['moments']
+            column = {'moments': (int(n), mean, m2, m3, m4), 'min': acc['min'], 'max': acc['max'],
+                      'quantiles': QuantileSketch.from_state(acc['quantiles']), 'quartiles': acc['quartiles']}
+            if stats.approximate:
+                column['distinct'] = HyperLogLog.from_state(acc['distinct'])
+            else:
+                column['hashes'] = _decode_array(acc['hashes'])
+            stats.numeric[col] = column
+        for col, acc in state['objects'].items():
+            if stats.approximate:
+                stats.objects[col] = {'count': acc['count'],
+                                      'distinct': HyperLogLog.from_state(acc['distinct']),
+                                      'frequent': FrequentItems.from_state(acc['frequent']),
+                                      'values': {key: value for key, value in acc['values']}}
+            else:
+                stats.objects[col] = {'count': acc['count'], 'counts': HashCounts.from_state(acc['counts'])}
+        stats.comoments = CoMoments.from_state(state['comoments'])
+        return stats
+
+    def correlation(self) -> pd.DataFrame:
+        """Попарная корреляция числовых колонок и флагов (совпадает с df.corr(numeric_only=True))."""
+        return self.comoments.correlation()
+
+    def _layout(self) -> list:
+        # порядок ключей как у describe_frame (см. _split_columns)
+        layout = []
+        if self.numeric:
+            layout += NUMERIC_STATS
+        if self.objects:
+            layout += [key for key in OBJECT_STATS if key not in layout]
+        return layout
+
+    def _numeric_result(self, acc: dict, layout: list) -> dict:
+        n = acc['moments'][0]
+        moments = _moments_to_stats(*acc['moments'])
+        column = {key: float('nan') for key in layout}
+        column.update({key: moments[key] for key in ('count', 'mean', 'std')})
+        column['min'] = float(acc['min']) if n else float('nan')
+        if acc['quartiles'] is not None:
+            quartiles, marks = acc['quartiles'], {}
+        else:
+            quartiles = acc['quantiles'].quantiles(QUANTILES)
+            marks = {key: self.quantile_error for key in ('25%', '50%', '75%')} if n else {}
+        column.update({key: float(value) for key, value in zip(('25%', '50%', '75%'), quartiles)})
+        column['max'] = float(acc['max']) if n else float('nan')
+        if self.approximate:
+            column['unique'] = acc['distinct'].count()
+            marks = dict(approximate_marks(self.hll_precision), **marks)
+        else:
+            column['unique'] = len(acc['hashes'])
+        column['missing'] = self.rows - n
+        column['skewness'] = moments['skewness']
+        column['kurtosis'] = moments['kurtosis']
+        if marks:
+            column['approximate'] = marks
+        return column
+
+    def _object_result(self, acc: dict, layout: list) -> dict:
+        column = {key: float('nan') for key in layout}
+        column['count'] = acc['count']
+        if self.approximate:
+            top, freq = acc['frequent'].top()
+            column.update(unique=acc['distinct'].count(), top=acc['values'].get(top), freq=freq)
+        else:
+            top, freq = acc['counts'].top()
+            column.update(unique=acc['counts'].unique, top=top, freq=freq)
+        column['missing'] = self.rows - acc['count']
+        if self.approximate:
+            column['approximate'] = approximate_marks(self.hll_precision)
+            if acc['frequent'].error and freq:
+                # частота занижена не больше чем на error строк
+                column['approximate']['freq'] = round(acc['frequent'].error / freq, 6)
+        return column
+
+    def result(self) -> dict:
+        if self.rows == 0:
+            return {
+                "success": False,
+                "error": "Your file is empty."
+            }
+
+        layout = self._layout()
+        result = {}
+        for col in self.columns:
+            if col in self.numeric:
+                result[col] = self._numeric_result(self.numeric[col], layout)
+            else:
+                result[col] = self._object_result(self.objects[col], layout)
+
+        return {
+            "success": True,
+            "result": result
+        }
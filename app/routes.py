@@ -4,7 +4,11 @@ from app.forms import RegistrationForm, LoginForm, UploadForm
 from app.models import User, Dataset
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.utils import secure_filename
-from app.utils import load_file
+from app.storage import cache_path, ensure_cache, link_blob, read_cache, remove_blob, source_path, store_blob
+from app.jobs import append_dataset, job_queue, process_dataset, remove_artifacts
+from app.metrics import datasets_with_missing, metrics_ready
+from app.figure_cache import figure_cache
+from app.frame_cache import frame_cache
 from passlib.hash import sha256_crypt
 from datetime import datetime
 import random, requests, json, os
@@ -143,20 +147,22 @@ def download_file(filename):
         if not os.path.abspath(file_path).startswith(os.path.abspath(upload_folder)):
             raise ValueError("Попытка доступа к недопустимому пути")
         
-        # Проверка существования файла
-        if not os.path.exists(file_path):
-            current_app.logger.error(f"File not found: {file_path}")
-            abort(404, description="Файл не найден")
-        
         # Проверка принадлежности файла пользователю
         dataset = Dataset.query.filter_by(filename=safe_filename, user_id=current_user.id).first()
         if not dataset:
             abort(403, description="Доступ запрещен")
         
+        # Отдаём blob записи: файл с этим именем мог перезаписать другой пользователь
+        source = source_path(upload_folder, dataset.content_hash, dataset.filename)
+        if not os.path.exists(source):
+            current_app.logger.error(f"File not found: {source}")
+            abort(404, description="Файл не найден")
+        
         return send_from_directory(
             upload_folder,
-            safe_filename,
+            os.path.relpath(source, upload_folder),
             as_attachment=True,
+            download_name=safe_filename,
             mimetype='application/json'
         )
         
@@ -169,45 +175,154 @@ def download_file(filename):
 def upload():
     form = UploadForm()
     if form.validate_on_submit():
-        #Сохраняем файл в UPLOAD_FOLDER
+        #Сохраняем файл в UPLOAD_FOLDER блоками, хеш считается в том же проходе
         f = form.data_file.data
         filename = secure_filename(f.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        f.save(filepath)
+        upload_folder = app.config['UPLOAD_FOLDER']
+        filepath = os.path.join(upload_folder, filename)
 
         try:
-            data = load_file(filepath)
-
-            # вычисляем метрики через processing.py
-            from app import processing
-            stats = processing.process_json(data)
-
-            # cохраняем метрики в папку, доступную Dash
-            metrics_dir = app.config.get('UPLOAD_FOLDER', os.path.join(current_app.root_path, 'data'))
-            metrics_dir = os.path.join(metrics_dir, 'metrics_data')
-            os.makedirs(metrics_dir, exist_ok=True)
-            metrics_filename = filename.rsplit('.', 1)[0] + '_metrics.json'
-            metrics_path = os.path.join(metrics_dir, secure_filename(metrics_filename))
-            with open(metrics_path, 'w', encoding='utf-8') as mf:
-                json.dump(stats, mf, ensure_ascii=False, indent=2)
-
-            #Сохраняем запись об исходном файле (для Flask) и о метриках (для Dash)
-            dataset = Dataset(filename=filename, user_id=current_user.id)
+            # Содержимое хранится один раз под своим хешем, а файл
+            # с пользовательским именем — жёсткая ссылка на него
+            content_hash, blob, _ = store_blob(upload_folder, f.stream)
+            link_blob(blob, filepath)
+
+            # Такое содержимое уже обработано: кеш и метрики общие,
+            # повторная загрузка — это только хеш и одна запись в БД
+            processed = metrics_ready(content_hash)
+            dataset = Dataset(
+                filename=filename,
+                user_id=current_user.id,
+                content_hash=content_hash,
+                status='ready' if processed else 'processing'
+            )
+            if processed:
+                same = Dataset.query.filter(Dataset.content_hash == content_hash,
+                                            Dataset.row_count.isnot(None)).first()
+                if same is not None:
+                    dataset.row_count, dataset.column_count = same.row_count, same.column_count
             db.session.add(dataset)
             db.session.commit()
-            flash('Файл успешно загружен и сохранен!', 'success')
+
+            if processed:
+                if request.accept_mimetypes.best == 'application/json':
+                    return jsonify({"job_id": None, "dataset_id": dataset.id}), 201
+                flash('Файл успешно загружен! Такие данные уже обрабатывались, метрики готовы.', 'success')
+                return redirect(url_for('dashboard'))
+
+            # Разбор файла, кеш и метрики считаются в фоновой задаче,
+            # поэтому запрос не зависит от размера файла
+            job = job_queue.submit(process_dataset, current_user.id, dataset.id)
+            dataset.job_id = job.id
+            db.session.commit()
+
+            if request.accept_mimetypes.best == 'application/json':
+                return jsonify({
+                    "job_id": job.id,
+                    "dataset_id": dataset.id,
+                    "status_url": url_for('get_job_status', job_id=job.id)
+                }), 202
+
+            flash(f'Файл загружен, идёт обработка (задача {job.id}).', 'success')
             return redirect(url_for('dashboard'))
             
-        except json.JSONDecodeError as e:
-            os.remove(filepath)
-            flash(f'Ошибка: {e}', 'danger')
         except Exception as e:
-            os.remove(filepath)
-            flash(f'Произошла ошибка при обработке файла: {e}', 'danger')
+            db.session.rollback()
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            flash(f'Произошла ошибка при загрузке файла: {e}', 'danger')
 
 
     return render_template('upload.html', form=form)
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@login_required
+def get_job_status(job_id):
+    """Статус фоновой обработки: стадия, прогресс, время стадий"""
+    job = job_queue.get(job_id)
+    if job is not None and job.user_id == current_user.id:
+        return jsonify(job.to_dict())
+
+    # задача могла выполняться в другом процессе или до перезапуска — отвечаем по БД
+    dataset = Dataset.query.filter_by(job_id=job_id, user_id=current_user.id).first()
+    if dataset is None:
+        return jsonify({"error": "Задача не найдена"}), 404
+
+    status = {'processing': 'running', 'ready': 'done'}.get(dataset.status, dataset.status)
+    return jsonify({
+        "id": job_id,
+        "dataset_id": dataset.id,
+        "status": status,
+        "stage": None,
+        "progress": 1.0 if status == 'done' else None,
+        "stages": {},
+        "error": dataset.error,
+    })
+
+@app.route('/api/datasets/<int:file_id>/append', methods=['POST'])
+@login_required
+def append_rows(file_id):
+    """Дозагрузка строк в существующий датасет (метрики обновляются инкрементально)"""
+    dataset = Dataset.query.get_or_404(file_id)
+    if dataset.user_id != current_user.id:
+        abort(403, description="Доступ запрещен")
+    if dataset.status == 'processing':
+        return jsonify({"error": "Датасет ещё обрабатывается"}), 409
+
+    f = request.files.get('data_file')
+    ext = dataset.filename.rsplit('.', 1)[-1].lower()
+    if ext not in app.config['STREAM_EXTENSIONS']:
+        return jsonify({"error": "Дозагрузка поддерживается только для .csv, .ndjson, .jsonl"}), 400
+    if f is None or secure_filename(f.filename).rsplit('.', 1)[-1].lower() != ext:
+        return jsonify({"error": f"Нужен файл .{ext}"}), 400
+
+    try:
+        delta_hash, _, _ = store_blob(app.config['UPLOAD_FOLDER'], f.stream)
+        dataset.status = 'processing'
+        dataset.error = None
+        db.session.commit()
+
+        job = job_queue.submit(append_dataset, current_user.id, dataset.id, delta_hash)
+        dataset.job_id = job.id
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Append error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({
+        "job_id": job.id,
+        "dataset_id": dataset.id,
+        "status_url": url_for('get_job_status', job_id=job.id)
+    }), 202
+
+@app.route('/api/datasets/missing', methods=['GET'])
+@login_required
+def datasets_missing():
+    """Датасеты пользователя, где в колонке ?column= доля пропусков больше ?ratio= (по умолчанию 0.1)"""
+    column = request.args.get('column')
+    if not column:
+        return jsonify({"error": "Не указана колонка (column)"}), 400
+    try:
+        ratio = float(request.args.get('ratio', 0.1))
+    except ValueError:
+        return jsonify({"error": "ratio должен быть числом"}), 400
+
+    matches = datasets_with_missing(column, ratio, current_user.id)
+    return jsonify([{
+        "dataset_id": dataset.id,
+        "filename": dataset.filename,
+        "column": stats.name,
+        "missing": stats.missing,
+        "missing_ratio": stats.missing_ratio,
+    } for dataset, stats in matches])
+
+@app.route('/api/cache/stats', methods=['GET'])
+@login_required
+def cache_stats():
+    """Счётчики кешей дашборда (датасеты и готовые графики): попадания, промахи, объём"""
+    return jsonify({"frames": frame_cache.stats(), "figures": figure_cache.stats()})
+
 @app.route('/mock_result')
 @login_required
 def mock_result():
@@ -266,10 +381,20 @@ def delete_file(file_id):
             flash('У вас нет прав для удаления этого файла', 'danger')
             return redirect(url_for('dashboard'))
         
-        # Удаляем файл с сервера
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], dataset.filename)
-        if os.path.exists(filepath):
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        same_name = Dataset.query.filter(Dataset.filename == dataset.filename, Dataset.id != dataset.id).count()
+        same_content = dataset.content_hash and Dataset.query.filter(
+            Dataset.content_hash == dataset.content_hash, Dataset.id != dataset.id).count()
+
+        # Удаляем файл с сервера, если на него не ссылаются другие записи
+        filepath = os.path.join(upload_folder, dataset.filename)
+        if not same_name and os.path.exists(filepath):
             os.remove(filepath)
+        # Содержимое, кеш и метрики удаляем вместе с последней записью, которая на них ссылается
+        if not same_content:
+            if dataset.content_hash:
+                remove_blob(upload_folder, dataset.content_hash)
+            remove_artifacts(upload_folder, dataset.storage_key)
         
         # Удаляем запись из базы данных
         db.session.delete(dataset)
@@ -550,21 +675,27 @@ def get_file_json(file_id):
         if dataset.user_id != current_user.id:
             abort(403, description="Доступ запрещен")
         
-        # Формируем путь к файлу
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], dataset.filename)
+        # Содержимое записи — её blob: файл с тем же именем мог загрузить кто-то ещё
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        filepath = source_path(upload_folder, dataset.content_hash, dataset.filename)
         
         # Проверяем существование файла
         if not os.path.exists(filepath):
             abort(404, description="Файл не найден")
         
-        # Читаем и возвращаем содержимое файла
-        with open(filepath, 'r', encoding='utf-8') as f:
-            file_content = json.load(f)
+        # Читаем из колоночного кеша; ?columns=a,b ограничивает набор колонок
+        cache_file = ensure_cache(
+            filepath,
+            cache_path(upload_folder, dataset.storage_key),
+            current_app.config['PARQUET_ROW_GROUP_ROWS'],
+            dataset.filename.rsplit('.', 1)[-1].lower())
+        columns = request.args.get('columns')
+        df = read_cache(cache_file, columns.split(',') if columns else None)
             
         return jsonify({
             "filename": dataset.filename,
             "file_id": file_id,
-            "content": file_content
+            "content": json.loads(df.to_json(orient='records', date_format='iso'))
         })
         
     except Exception as e:
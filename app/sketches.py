@@ -0,0 +1,269 @@
+import base64
+import numpy as np
+import pandas as pd
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """
+    Число значащих бит каждого элемента массива uint64 (экспонента из frexp).
+    Округление до float64 может прибавить бит только числам, отстоящим от
+    степени двойки меньше чем на 2**-53 от своей величины, — для хешей это пренебрежимо.
+    """
+    _, exponent = np.frexp(values.astype(np.float64))
+    return exponent
+
+
+def hash_values(values) -> np.ndarray:
+    """
+    64-битные хеши значений. Строки хешируются по отдельности (categorize=False):
+    для колонок с большим числом уникальных значений это намного дешевле
+    предварительной факторизации.
+    """
+    return pd.util.hash_array(np.asarray(values), categorize=False)
+
+
+class HyperLogLog:
+    """
+    Приближённое число уникальных значений (HyperLogLog, 64-битные хеши).
+
+    Память — 2**precision байт независимо от числа значений,
+    стандартная относительная ошибка — 1.04 / sqrt(2**precision)
+    (precision=14: 16 КБ и ~0.8%). Скетчи с одинаковой точностью
+    объединяются через merge() без потери точности.
+    """
+
+    def __init__(self, precision: int = 14):
+        if not 4 <= precision <= 18:
+            raise ValueError("HyperLogLog precision must be between 4 and 18")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / np.sqrt(len(self.registers))
+
+    def update(self, values):
+        """Добавляет значения (массив или Series); NaN/None нужно отбросить заранее."""
+        if len(values) == 0:
+            return
+        self.update_hashes(hash_values(values))
+
+    def update_hashes(self, hashes: np.ndarray):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        width = 64 - self.precision
+        index = (hashes >> np.uint64(width)).astype(np.int64)
+        rest = hashes & np.uint64((1 << width) - 1)
+        # позиция первой единицы в оставшихся битах
+        rank = width - _bit_length(rest) + 1
+        # максимум ранга по регистрам без сортировки: отмечаем пары (регистр, ранг)
+        # и берём для каждого регистра старший отмеченный ранг
+        seen = np.zeros((len(self.registers), 64), dtype=bool)
+        seen[index, rank] = True
+        top = 63 - np.argmax(seen[:, ::-1], axis=1)
+        top[~seen.any(axis=1)] = 0
+        np.maximum(self.registers, top.astype(np.uint8), out=self.registers)
+
+    def merge(self, other: 'HyperLogLog'):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # малые мощности: линейный подсчёт по пустым регистрам
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+    def to_state(self) -> dict:
+        return {
+            'precision': self.precision,
+            'registers': base64.b64encode(self.registers.tobytes()).decode('ascii'),
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'HyperLogLog':
+        sketch = cls(state['precision'])
+        sketch.registers = np.frombuffer(base64.b64decode(state['registers']), dtype=np.uint8).copy()
+        return sketch
+
+
+class QuantileSketch:
+    """
+    Квантили с гарантированной относительной ошибкой (DDSketch).
+
+    Значения раскладываются по логарифмическим корзинам с основанием
+    gamma = (1 + e) / (1 - e), поэтому любой квантиль отличается от точного
+    не более чем на долю e от своего значения. Число корзин растёт как
+    логарифм диапазона значений, а не как число строк; скетчи с одинаковой
+    ошибкой объединяются сложением счётчиков.
+    """
+
+    def __init__(self, relative_error: float = 0.01):
+        if not 0 < relative_error < 1:
+            raise ValueError("Quantile sketch relative error must be between 0 and 1")
+        self.relative_error = relative_error
+        self.gamma = (1 + relative_error) / (1 - relative_error)
+        self._log_gamma = np.log(self.gamma)
+        self.positive = {}  # индекс корзины -> число значений
+        self.negative = {}  # то же для модулей отрицательных значений
+        self.zeros = 0
+        self.count = 0
+
+    def update(self, values: np.ndarray):
+        """Добавляет значения float64 без NaN."""
+        values = np.asarray(values, dtype='float64')
+        if values.size == 0:
+            return
+        self.count += values.size
+
+        # индекс корзины ceil(log_gamma |x|) для всех значений сразу; модули
+        # меньше gamma**-limit (в том числе ноль, log = -inf) попадают в нулевую корзину
+        limit = int(np.ceil(700 / self._log_gamma))
+        keys = np.abs(values)
+        with np.errstate(divide='ignore'):
+            np.log(keys, out=keys)
+        keys *= 1 / self._log_gamma
+        np.ceil(keys, out=keys)
+        np.clip(keys, -limit, limit, out=keys)
+        # одна bincount на все корзины: [0, span) — положительные, [span, 2*span) — отрицательные
+        span = 2 * limit + 1
+        codes = keys.astype(np.int64)
+        codes += limit
+        codes += np.signbit(values) * span
+        low = int(codes.min())
+        counts = np.bincount(codes - low)
+
+        for code in (np.flatnonzero(counts) + low).tolist():
+            count = int(counts[code - low])
+            key = code % span - limit
+            if key == -limit:
+                self.zeros += count
+            else:
+                store = self.negative if code >= span else self.positive
+                store[key] = store.get(key, 0) + count
+
+    def merge(self, other: 'QuantileSketch'):
+        if other.relative_error != self.relative_error:
+            raise ValueError("Cannot merge quantile sketches with different relative error")
+        for own, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in theirs.items():
+                own[key] = own.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        return self
+
+    def _value(self, key: int) -> float:
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantiles(self, qs) -> list:
+        """Оценки квантилей qs (доли от 0 до 1); для пустого скетча — NaN."""
+        if self.count == 0:
+            return [float('nan') for _ in qs]
+
+        # корзины в порядке возрастания значений: отрицательные, ноль, положительные
+        values = [-self._value(key) for key in sorted(self.negative, reverse=True)]
+        counts = [self.negative[key] for key in sorted(self.negative, reverse=True)]
+        if self.zeros:
+            values.append(0.0)
+            counts.append(self.zeros)
+        values += [self._value(key) for key in sorted(self.positive)]
+        counts += [self.positive[key] for key in sorted(self.positive)]
+
+        cumulative = np.cumsum(counts)
+        ranks = np.asarray(qs, dtype='float64') * (self.count - 1)
+        positions = np.searchsorted(cumulative, ranks, side='right')
+        return [float(values[i]) for i in positions]
+
+    def to_state(self) -> dict:
+        return {
+            'relative_error': self.relative_error,
+            'positive': [[key, count] for key, count in self.positive.items()],
+            'negative': [[key, count] for key, count in self.negative.items()],
+            'zeros': self.zeros,
+            'count': self.count,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'QuantileSketch':
+        sketch = cls(state['relative_error'])
+        sketch.positive = {key: count for key, count in state['positive']}
+        sketch.negative = {key: count for key, count in state['negative']}
+        sketch.zeros = state['zeros']
+        sketch.count = state['count']
+        return sketch
+
+
+class FrequentItems:
+    """
+    Самые частые значения в ограниченной памяти (Misra-Gries).
+
+    Хранится не больше capacity счётчиков. Частота каждого значения
+    занижена не больше чем на error (сумма всех вычитаний), а значение,
+    встречающееся чаще count / (capacity + 1) раз, гарантированно
+    остаётся в словаре. Объединяемо через merge().
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self.counters = {}
+        self.error = 0
+
+    def update(self, counts: dict):
+        """counts: значение -> сколько раз встретилось в порции."""
+        for value, count in counts.items():
+            self.counters[value] = self.counters.get(value, 0) + count
+        self._shrink()
+
+    def update_arrays(self, values: np.ndarray, counts: np.ndarray):
+        """
+        То же, что update(), для массивов значений и счётчиков порции. Порция
+        сначала векторно ужимается до capacity счётчиков тем же правилом
+        (сводки Misra-Gries объединяемы), так что в словарь попадает
+        не больше capacity значений.
+        """
+        counts = np.asarray(counts, dtype=np.int64)
+        if len(counts) > self.capacity:
+            cut = int(np.partition(counts, len(counts) - self.capacity - 1)[len(counts) - self.capacity - 1])
+            keep = counts > cut
+            values, counts = np.asarray(values)[keep], counts[keep] - cut
+            self.error += cut
+        self.update(dict(zip(np.asarray(values).tolist(), counts.tolist())))
+
+    def merge(self, other: 'FrequentItems'):
+        self.error += other.error
+        self.update(other.counters)
+        return self
+
+    def _shrink(self):
+        if len(self.counters) <= self.capacity:
+            return
+        # вычитаем (capacity+1)-й по величине счётчик и отбрасываем неположительные
+        cut = sorted(self.counters.values(), reverse=True)[self.capacity]
+        self.error += cut
+        self.counters = {value: count - cut for value, count in self.counters.items() if count > cut}
+
+    def top(self):
+        """(значение, оценка частоты) самого частого значения или (None, None)."""
+        if not self.counters:
+            return None, None
+        value = max(self.counters, key=self.counters.get)
+        return value, self.counters[value]
+
+    def to_state(self) -> dict:
+        return {
+            'capacity': self.capacity,
+            'counters': [[value, count] for value, count in self.counters.items()],
+            'error': self.error,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'FrequentItems':
+        sketch = cls(state['capacity'])
+        sketch.counters = {value: count for value, count in state['counters']}
+        sketch.error = state['error']
+        return sketch
@@ -0,0 +1,318 @@
+import os
+import uuid
+import shutil
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from app.utils import read_frame, save_upload
+
+
+INT32 = np.iinfo(np.int32)
+
+
+def cache_path(upload_folder: str, key: str) -> str:
+    """Путь к колоночному кешу (Parquet) датасета по его ключу хранения."""
+    return os.path.join(upload_folder, 'cache', key + '.parquet')
+
+
+def blob_path(upload_folder: str, content_hash: str) -> str:
+    """Путь к содержимому файла в контентно-адресуемом хранилище."""
+    return os.path.join(upload_folder, 'blobs', content_hash)
+
+
+def source_path(upload_folder: str, content_hash: str, filename: str) -> str:
+    """
+    Исходный файл датасета для сборки кеша: blob по хешу содержимого.
+    Файл с пользовательским именем для этого не годится — следующая загрузка
+    с тем же именем (в том числе другим пользователем) перенаправляет ссылку
+    на другой blob. У старых записей без хеша — сам файл.
+    """
+    if content_hash:
+        return blob_path(upload_folder, content_hash)
+    return os.path.join(upload_folder, filename)
+
+
+def store_blob(upload_folder: str, source):
+    """
+    Сохраняет загружаемый файл в хранилище под именем, равным sha256
+    содержимого. Одинаковые файлы хранятся один раз.
+
+    Returns:
+        (sha256, путь к blob, True если blob создан, False если уже был)
+    """
+    blobs = os.path.join(upload_folder, 'blobs')
+    os.makedirs(blobs, exist_ok=True)
+    tmp = os.path.join(blobs, f'.incoming-{uuid.uuid4().hex}')
+    try:
+        content_hash, _ = save_upload(source, tmp)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    blob = blob_path(upload_folder, content_hash)
+    if os.path.exists(blob):
+        os.remove(tmp)
+        return content_hash, blob, False
+    os.replace(tmp, blob)
+    return content_hash, blob, True
+
+
+def link_blob(blob: str, path: str):
+    """
+    Делает файл с пользовательским именем жёсткой ссылкой на blob,
+    чтобы копии одного содержимого не занимали место на диске.
+    """
+    if os.path.exists(path) and os.path.samefile(blob, path):
+        return
+    tmp = path + '.link'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(blob, tmp)
+    except OSError:
+        # файловая система без жёстких ссылок
+        shutil.copyfile(blob, tmp)
+    os.replace(tmp, path)
+
+
+def remove_blob(upload_folder: str, content_hash: str):
+    path = blob_path(upload_folder, content_hash)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def is_cache_fresh(path: str, source_path: str) -> bool:
+    """Кеш актуален, если он существует и не старше исходного файла."""
+    if not os.path.exists(path):
+        return False
+    if not os.path.exists(source_path):
+        return True
+    return os.path.getmtime(path) >= os.path.getmtime(source_path)
+
+
+def ensure_cache(source_path: str, path: str, row_group_rows: int = 100_000, ext: str = None) -> str:
+    """
+    Возвращает путь к актуальному кешу. Для файлов, загруженных до появления
+    кеша (или изменённых после него), кеш строится из исходного файла.
+    У blob нет расширения — формат передаётся в ext.
+    """
+    if not is_cache_fresh(path, source_path):
+        write_cache(read_frame(source_path, ext), path, row_group_rows)
+    return path
+
+
+def remove_cache(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def read_cache(path: str, columns=None) -> pd.DataFrame:
+    """
+    Читает датасет из кеша. Если указаны columns, с диска читаются только они.
+    """
+    table = pq.read_table(path, columns=list(columns) if columns else None)
+    return table.to_pandas()
+
+
+def iter_cache(path: str, batch_rows: int = 100_000):
+    """Читает кеш порциями по batch_rows строк, не загружая его целиком."""
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_rows):
+        yield batch.to_pandas()
+
+
+def read_schema(path: str) -> pa.Schema:
+    """Схема датасета из футера Parquet, без чтения данных."""
+    return pq.read_schema(path)
+
+
+def row_count(path: str) -> int:
+    """Число строк датасета из метаданных Parquet."""
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def read_head(path: str, rows: int = 5) -> pd.DataFrame:
+    """Первые rows строк: читается только начало первой группы строк."""
+    parquet = pq.ParquetFile(path)
+    for batch in parquet.iter_batches(batch_size=rows):
+        return batch.to_pandas()
+    return parquet.schema_arrow.empty_table().to_pandas()
+
+
+def write_cache(df: pd.DataFrame, path: str, row_group_rows: int = 100_000):
+    """
+    Записывает DataFrame в кеш целиком. Все значения известны заранее,
+    поэтому числовые колонки сужаются до int32/float32 (см. _downcast).
+    """
+    writer = CacheWriter(path, row_group_rows, downcast=True)
+    try:
+        writer.write(df)
+    except Exception:
+        writer.abort()
+        raise
+    writer.close()
+
+
+def _to_table(df: pd.DataFrame, downcast: bool) -> pa.Table:
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        # колонки со значениями разных типов (например, из JSON) храним строками
+        df = df.copy()
+        for col in df.columns:
+            if df[col].dtype == object:
+                df[col] = df[col].map(lambda v: None if _is_missing(v) else str(v))
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    return (_downcast(table) if downcast else _widen(table)).replace_schema_metadata(None)
+
+
+def _downcast(table: pa.Table) -> pa.Table:
+    """
+    Числовые колонки в int32/float32, если это не теряет точности: целые —
+    если помещаются в int32, дробные — если float32 возвращает те же значения.
+    Кеш и кадры в памяти вдвое меньше, графики — компактнее. Только для записи
+    целиком: при потоковой записи тип по одной порции выбрать нельзя.
+    """
+    columns = []
+    for column in table.columns:
+        if pa.types.is_int64(column.type):
+            bounds = pc.min_max(column)
+            low, high = bounds['min'].as_py(), bounds['max'].as_py()
+            if low is None or (INT32.min <= low and high <= INT32.max):
+                column = column.cast(pa.int32())
+        elif pa.types.is_float64(column.type):
+            values = column.to_numpy()
+            with np.errstate(over='ignore', invalid='ignore'):
+                exact = np.array_equal(values.astype(np.float32).astype(np.float64), values, equal_nan=True)
+            if exact:
+                column = column.cast(pa.float32(), safe=False)
+        columns.append(column)
+    return pa.Table.from_arrays(columns, names=table.column_names)
+
+
+def _widen(table: pa.Table) -> pa.Table:
+    """
+    Числовые колонки в int64/float64. При потоковой записи порции из сжатого
+    кеша (дозагрузка) и из исходного файла тогда совпадают по типам, и
+    CacheWriter не переписывает уже записанную часть.
+    """
+    columns = []
+    for column in table.columns:
+        if pa.types.is_signed_integer(column.type) and column.type != pa.int64():
+            column = column.cast(pa.int64())
+        elif pa.types.is_float32(column.type) or pa.types.is_float16(column.type):
+            column = column.cast(pa.float64())
+        columns.append(column)
+    return pa.Table.from_arrays(columns, names=table.column_names)
+
+
+def _is_missing(value) -> bool:
+    try:
+        return bool(pd.isna(value))
+    except (TypeError, ValueError):
+        return False
+
+
+def _unify_type(a: pa.DataType, b: pa.DataType) -> pa.DataType:
+    if a == b or pa.types.is_null(b):
+        return a
+    if pa.types.is_null(a):
+        return b
+    numeric = (pa.types.is_integer, pa.types.is_floating)
+    if any(f(a) for f in numeric) and any(f(b) for f in numeric):
+        if pa.types.is_integer(a) and pa.types.is_integer(b):
+            return pa.int64()
+        return pa.float64()
+    return pa.string()
+
+
+def _unify_schema(current: pa.Schema, incoming: pa.Schema) -> pa.Schema:
+    fields = []
+    for field in current:
+        index = incoming.get_field_index(field.name)
+        if index == -1:
+            fields.append(field)
+        else:
+            fields.append(pa.field(field.name, _unify_type(field.type, incoming.field(index).type)))
+    for field in incoming:
+        if current.get_field_index(field.name) == -1:
+            fields.append(field)
+    return pa.schema(fields)
+
+
+def _conform(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    columns = []
+    for field in schema:
+        index = table.schema.get_field_index(field.name)
+        if index == -1:
+            columns.append(pa.nulls(len(table), field.type))
+        else:
+            columns.append(table.column(index).cast(field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+class CacheWriter:
+    """
+    Пишет датасет в Parquet порциями: каждая порция становится группой
+    строк со своей статистикой (min/max/null_count).
+
+    Если тип колонки в новой порции расходится с уже записанным
+    (int -> float, пустая колонка -> строки, новая колонка в NDJSON),
+    схема расширяется, а уже записанная часть переписывается под новую схему.
+    Сужение числовых типов (downcast) — только для записи одной порцией
+    (write_cache): иначе порция с более широкими значениями вызывала бы
+    перезапись всего записанного.
+    """
+
+    def __init__(self, path: str, row_group_rows: int = 100_000, downcast: bool = False):
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        self.row_group_rows = row_group_rows
+        self.downcast = downcast
+        self.schema = None
+        self.writer = None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def write(self, chunk: pd.DataFrame):
+        table = _to_table(chunk, self.downcast)
+
+        if self.writer is None:
+            self.schema = table.schema
+            self.writer = pq.ParquetWriter(self.tmp_path, self.schema)
+        else:
+            schema = _unify_schema(self.schema, table.schema)
+            if not schema.equals(self.schema):
+                self._rewrite(schema)
+
+        self.writer.write_table(_conform(table, self.schema), row_group_size=self.row_group_rows)
+
+    def _rewrite(self, schema: pa.Schema):
+        # записанное копируется по группам строк: в памяти не больше одной группы
+        self.writer.close()
+        old_path = self.tmp_path + '.old'
+        os.replace(self.tmp_path, old_path)
+        self.schema = schema
+        self.writer = pq.ParquetWriter(self.tmp_path, self.schema)
+        try:
+            written = pq.ParquetFile(old_path)
+            for i in range(written.num_row_groups):
+                self.writer.write_table(_conform(written.read_row_group(i), self.schema),
+                                        row_group_size=self.row_group_rows)
+            written.close()
+        finally:
+            os.remove(old_path)
+
+    def close(self):
+        if self.writer is None:
+            # пустой файл: кеш без колонок
+            self.writer = pq.ParquetWriter(self.tmp_path, pa.schema([]))
+        self.writer.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        if self.writer is not None:
+            self.writer.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
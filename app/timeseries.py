@@ -0,0 +1,227 @@
+import os
+import re
+import json
+import shutil
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from werkzeug.utils import secure_filename
+
+# Уровни пирамиды от мелкого к крупному: имя и шаг корзины (частота pandas)
+LEVELS = (('minute', 'min'), ('hour', 'h'), ('day', 'D'))
+
+# Меняется вместе с форматом файлов пирамиды: старые перестраиваются
+PYRAMID_FORMAT_VERSION = 1
+
+# даты в CSV читаются строками: колонку считаем датой, если значения в ISO-формате
+ISO_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?$')
+
+
+def pyramid_dir(upload_folder: str, key: str) -> str:
+    """Папка с пирамидами временных рядов датасета по ключу хранения."""
+    return os.path.join(upload_folder, 'pyramids', secure_filename(key))
+
+
+def level_path(folder: str, column_index: int, level: str) -> str:
+    return os.path.join(folder, f'{column_index}-{level}.parquet')
+
+
+def datetime_columns(path: str, sample_rows: int = 100) -> list:
+    """
+    Колонки с датой и временем: типы timestamp/date в Parquet-кеше и строки,
+    первые непустые значения которых — даты в ISO-формате.
+    """
+    parquet = pq.ParquetFile(path)
+    head = None
+    columns = []
+    for field in parquet.schema_arrow:
+        if pa.types.is_timestamp(field.type) or pa.types.is_date(field.type):
+            columns.append(field.name)
+        elif pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            if head is None:
+                head = next(parquet.iter_batches(batch_size=sample_rows), None)
+            if head is None:
+                continue
+            values = [value for value in head.column(field.name).to_pylist() if value is not None]
+            if values and all(ISO_DATE.match(value) for value in values) and any(len(value) > 10 for value in values):
+                columns.append(field.name)
+    return columns
+
+
+def parse_times(values) -> pd.DatetimeIndex:
+    """Значения колонки времени как наивные datetime (у дат с поясом — местное время)."""
+    if isinstance(values, (pa.Array, pa.ChunkedArray)):
+        values = values.to_pandas()
+    times = pd.DatetimeIndex(pd.to_datetime(values, format='ISO8601', errors='coerce'))
+    if times.tz is not None:
+        times = times.tz_localize(None)
+    return times
+
+
+def _numeric(schema: pa.Schema, exclude: str) -> list:
+    return [field.name for field in schema if field.name != exclude
+            and (pa.types.is_integer(field.type) or pa.types.is_floating(field.type))]
+
+
+def build_pyramids(cache_file: str, folder: str, min_rows: int, row_group_rows: int = 100_000) -> dict:
+    """
+    Строит по каждой колонке времени агрегаты числовых колонок по минутам,
+    часам и дням (min, max, mean и число строк в корзине). Кеш читается по
+    группам строк: частичные агрегаты групп потом сливаются, так что в памяти
+    не бывает больше одной группы исходных строк.
+
+    Уровень, который почти не уменьшает число точек (корзин больше половины
+    строк), не сохраняется. Описание пирамид пишется в manifest.json.
+
+    Returns:
+        манифест: {"version", "rows", "columns": {колонка: {"index", "numeric",
+        "text", "separator", "start", "end", "levels": [{"level", "buckets"}]}}}
+    """
+    parquet = pq.ParquetFile(cache_file)
+    schema = parquet.schema_arrow
+    rows = parquet.metadata.num_rows
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder, exist_ok=True)
+    manifest = {'version': PYRAMID_FORMAT_VERSION, 'rows': rows, 'columns': {}}
+
+    for column in (datetime_columns(cache_file) if rows >= min_rows else []):
+        numeric = _numeric(schema, column)
+        if not numeric:
+            continue
+        partials = {level: [] for level, _ in LEVELS}
+        start = end = None
+        sample = None
+        for i in range(parquet.metadata.num_row_groups):
+            table = parquet.read_row_group(i, columns=[column] + numeric)
+            if sample is None and pa.types.is_string(table.schema.field(column).type):
+                sample = next((v for v in table.column(column).to_pylist() if v), None)
+            times = parse_times(table.column(column))
+            valid = ~times.isna()
+            if not valid.any():
+                continue
+            times = times[valid]
+            # суммы для средних по корзинам — во float64, даже если кеш хранит float32
+            frame = table.select(numeric).to_pandas()[valid]
+            frame = frame.astype({name: 'float64' for name in numeric if frame[name].dtype == np.float32})
+            start = times.min() if start is None else min(start, times.min())
+            end = times.max() if end is None else max(end, times.max())
+            for level, freq in LEVELS:
+                groups = frame.groupby(times.floor(freq))
+                partials[level].append({
+                    'min': groups.min(), 'max': groups.max(), 'sum': groups.sum(),
+                    'count': groups.count(), 'rows': groups.size()})
+
+        levels = []
+        for level, _ in LEVELS:
+            if not partials[level]:
+                continue
+
+            def merge(stat, how):
+                return getattr(pd.concat([part[stat] for part in partials[level]]).groupby(level=0, sort=True), how)()
+
+            result = pd.DataFrame({'rows': merge('rows', 'sum')})
+            if len(result) > rows / 2:
+                continue
+            mins, maxs, sums, counts = merge('min', 'min'), merge('max', 'max'), merge('sum', 'sum'), merge('count', 'sum')
+            for name in numeric:
+                result[f'min({name})'] = mins[name]
+                result[f'max({name})'] = maxs[name]
+                result[f'mean({name})'] = sums[name] / counts[name].where(counts[name] > 0)
+            result.index.name = 'bucket'
+            table = pa.Table.from_pandas(result.reset_index(), preserve_index=False).replace_schema_metadata(None)
+            pq.write_table(table, level_path(folder, schema.get_field_index(column), level),
+                           row_group_size=row_group_rows)
+            levels.append({'level': level, 'buckets': len(result)})
+
+        if levels:
+            manifest['columns'][column] = {
+                'index': schema.get_field_index(column),
+                'numeric': numeric,
+                'text': sample is not None,
+                'separator': sample[10] if sample and len(sample) > 10 else ' ',
+                'start': start.isoformat(),
+                'end': end.isoformat(),
+                'levels': levels,
+            }
+
+    with open(os.path.join(folder, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def load_manifest(folder: str):
+    """Манифест пирамид или None, если их ещё не строили (или формат устарел)."""
+    try:
+        with open(os.path.join(folder, 'manifest.json'), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('version') == PYRAMID_FORMAT_VERSION else None
+
+
+def remove_pyramids(folder: str):
+    shutil.rmtree(folder, ignore_errors=True)
+
+
+def query(cache_file: str, folder: str, manifest: dict, column: str, y: str,
+          start=None, end=None, budget: int = 5_000):
+    """
+    Точки ряда y по времени column в окне [start, end] (по умолчанию — весь ряд)
+    не больше budget: самый мелкий уровень пирамиды, у которого в окне не больше
+    budget корзин, или сами строки, если их в окне не больше budget.
+    С диска читается только окно: файлы уровней и кеш отсортированы/разбиты
+    на группы строк, фильтр по времени отсекает лишние группы по статистике.
+
+    Returns:
+        (уровень: 'raw' или имя из LEVELS,
+         DataFrame: для 'raw' — колонки column и y, иначе column, min, max, mean, rows;
+         сколько исходных строк попало в окно) или None, если пирамиды для пары нет
+    """
+    info = manifest['columns'].get(column)
+    if info is None or y not in info['numeric']:
+        return None
+    start = pd.Timestamp(start) if start is not None else pd.Timestamp(info['start'])
+    end = pd.Timestamp(end) if end is not None else pd.Timestamp(info['end'])
+    if start.tzinfo is not None:
+        start, end = start.tz_localize(None), end.tz_localize(None)
+    span = end - start
+
+    available = [level for level, _ in LEVELS if level in {item['level'] for item in info['levels']}]
+    chosen = [level for level in available if span / pd.Timedelta(1, dict(LEVELS)[level]) <= budget]
+    level = chosen[0] if chosen else available[-1]
+
+    freq = dict(LEVELS)[level]
+    path = level_path(folder, info['index'], level)
+    table = pq.read_table(
+        path, columns=['bucket', 'rows', f'min({y})', f'max({y})', f'mean({y})'],
+        filters=[('bucket', '>=', start.floor(freq)), ('bucket', '<=', end)])
+    frame = table.to_pandas()
+    frame.columns = [column, 'rows', 'min', 'max', 'mean']
+    rows = int(frame['rows'].sum())
+
+    if level == available[0] and rows <= budget:
+        # в окне мало строк: показываем их самих
+        raw = _raw_window(cache_file, info, column, y, start, end)
+        return 'raw', raw, len(raw)
+    return level, frame, rows
+
+
+def _raw_window(cache_file: str, info: dict, column: str, y: str, start, end) -> pd.DataFrame:
+    """Исходные строки окна: фильтр по времени уходит в чтение Parquet."""
+    if info['text']:
+        # ISO-строки сравниваются как даты, если границы записаны в том же виде
+        pattern = f"%Y-%m-%d{info['separator']}%H:%M:%S"
+        bounds = [(column, '>=', start.floor('s').strftime(pattern)),
+                  (column, '<', (end.floor('s') + pd.Timedelta(1, 's')).strftime(pattern))]
+    else:
+        field = pq.read_schema(cache_file).field(column)
+        low, high = start, end
+        if pa.types.is_timestamp(field.type) and field.type.tz:
+            low, high = low.tz_localize(field.type.tz), high.tz_localize(field.type.tz)
+        bounds = [(column, '>=', low), (column, '<=', high)]
+    frame = pq.read_table(cache_file, columns=list(dict.fromkeys([column, y])), filters=bounds).to_pandas()
+    times = parse_times(frame[column])
+    keep = np.asarray((times >= start) & (times <= end))
+    frame = pd.DataFrame({column: times[keep], y: frame[y].to_numpy()[keep]})
+    return frame.sort_values(column, kind='stable')
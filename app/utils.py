@@ -1,4 +1,9 @@
+import io
+import os
 import json
+import time
+import hashlib
+import numpy as np
 import pandas as pd
 from jsonschema import validate, ValidationError
 
@@ -61,19 +66,179 @@ def autodetect_json_schema(data):
   else:
     return {"type": type(data).__name__}
 
-def load_file(filepath: str):
-    ext = filepath.rsplit('.', 1)[-1].lower()
+def read_frame(filepath: str, ext: str = None) -> pd.DataFrame:
+    ext = ext or filepath.rsplit('.', 1)[-1].lower()
 
     if ext == 'json':
-        df = pd.read_json(filepath)
-        return df.to_dict(orient='records')
+        return pd.read_json(filepath)
+
+    if ext == 'ndjson' or ext == 'jsonl':
+        return pd.read_json(filepath, lines=True)
 
     if ext == 'csv':
-        df = pd.read_csv(filepath)
-        return df.to_dict(orient='records')
+        return pd.read_csv(filepath)
 
     if ext == 'xls' or ext == 'xlsx':
-        df = pd.read_excel(filepath)
-        return df.to_dict(orient='records')
+        return pd.read_excel(filepath)
+
+    raise ValueError(f'Недопустимое расширение: {ext}')
+
+def load_file(filepath: str):
+    return read_frame(filepath).to_dict(orient='records')
+
+
+class CountingReader(io.RawIOBase):
+    """Поток-обёртка над файлом: отдаёт байты читателю и считает, сколько их прочитано."""
+
+    def __init__(self, source):
+        self.source = source
+        self.size = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.source.read(len(buffer))
+        if not data:
+            return 0
+        n = len(data)
+        buffer[:n] = data
+        self._consume(data)
+        return n
+
+    def _consume(self, data: bytes):
+        self.size += len(data)
+
+
+class HashingTee(CountingReader):
+    """
+    CountingReader, который в том же проходе считает sha256 байтов
+    и (если задан sink) пишет их на диск.
+    """
+
+    def __init__(self, source, sink=None):
+        super().__init__(source)
+        self.sink = sink
+        self.hasher = hashlib.sha256()
+
+    def drain(self, block_size: int = 1024 * 1024):
+        """Дочитывает остаток источника (если читатель остановился раньше конца файла)."""
+        while True:
+            data = self.source.read(block_size)
+            if not data:
+                break
+            self._consume(data)
+
+    def hexdigest(self) -> str:
+        return self.hasher.hexdigest()
+
+    def _consume(self, data: bytes):
+        if self.sink is not None:
+            self.sink.write(data)
+        self.hasher.update(data)
+        super()._consume(data)
+
+
+def iter_chunks(stream, ext: str, chunk_rows: int):
+    """
+    Читает CSV/NDJSON из бинарного потока порциями по chunk_rows строк.
+
+    Returns:
+        Итератор DataFrame (контекстный менеджер pandas).
+    """
+    if ext == 'csv':
+        return pd.read_csv(stream, chunksize=chunk_rows)
+
+    if ext == 'ndjson' or ext == 'jsonl':
+        text = io.TextIOWrapper(stream, encoding='utf-8')
+        return pd.read_json(text, lines=True, chunksize=chunk_rows)
+
+    raise ValueError(f'Потоковое чтение не поддерживается для: {ext}')
+
+
+def save_upload(source, filepath: str):
+    """
+    Сохраняет загружаемый файл на диск блоками и в том же проходе считает его хеш.
+
+    Returns:
+        (sha256 файла, размер в байтах)
+    """
+    with open(filepath, 'wb') as sink:
+        tee = HashingTee(source, sink)
+        tee.drain()
+    return tee.hexdigest(), tee.size
+
+
+def scan_file(filepath: str, on_chunk, chunk_rows: int = 100_000, on_progress=None, ext: str = None):
+    """
+    Разбирает CSV/NDJSON с диска порциями. В памяти одновременно находится
+    не больше одной порции, поэтому размер файла ограничен только диском.
+
+    Args:
+        filepath: путь к файлу.
+        on_chunk: функция, которая получает каждую порцию (DataFrame).
+        chunk_rows: размер порции в строках.
+        on_progress: функция, которая получает число прочитанных байт.
+        ext: формат файла, если его нельзя взять из имени.
+    """
+    ext = ext or filepath.rsplit('.', 1)[-1].lower()
+
+    with open(filepath, 'rb') as source:
+        counter = CountingReader(source)
+        reader = io.BufferedReader(counter, buffer_size=1024 * 1024)
+        with iter_chunks(reader, ext, chunk_rows) as chunks:
+            for chunk in chunks:
+                on_chunk(chunk)
+                if on_progress:
+                    on_progress(counter.size)
+
+
+def sample_lines(filepath: str, ext: str, max_rows: int = 50_000, time_budget: float = 3.0, seed: int = 0):
+    """
+    Равномерная случайная выборка строк CSV/NDJSON (reservoir sampling):
+    файл разбирается порциями тем же парсером, что и при полном проходе,
+    поэтому длинные строки не попадают в выборку чаще коротких, а значения
+    с переводами строк в кавычках не ломают разбор. Каждой строке
+    назначается случайный ключ, в выборке остаются max_rows строк
+    с наименьшими ключами.
+
+    Чтение останавливается по истечении time_budget секунд: тогда выборка
+    равномерна по прочитанному началу файла, а число строк оценивается
+    по прочитанным байтам.
+
+    Returns:
+        (DataFrame выборки, оценка числа строк во всём файле)
+    """
+    rng = np.random.default_rng(seed)
+    size = os.path.getsize(filepath)
+    started = time.perf_counter()
+    sample, keys = None, np.empty(0)
+    rows = 0
+    finished = True
+
+    with open(filepath, 'rb') as source:
+        counter = CountingReader(source)
+        reader = io.BufferedReader(counter, buffer_size=1024 * 1024)
+        try:
+            with iter_chunks(reader, ext, max_rows) as chunks:
+                for chunk in chunks:
+                    rows += len(chunk)
+                    chunk_keys = rng.random(len(chunk))
+                    if sample is None:
+                        sample, keys = chunk, chunk_keys
+                    else:
+                        sample = pd.concat([sample, chunk], ignore_index=True)
+                        keys = np.concatenate([keys, chunk_keys])
+                    if len(sample) > max_rows:
+                        keep = np.sort(np.argpartition(keys, max_rows)[:max_rows])
+                        sample, keys = sample.iloc[keep].reset_index(drop=True), keys[keep]
+                    if time.perf_counter() - started >= time_budget:
+                        finished = False
+                        break
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame(), 0
 
-    raise ValueError(f'Недопустимое расширение: {ext}')
\ No newline at end of file
+    if sample is None:
+        return pd.DataFrame(), 0
+    estimated_rows = rows if finished or not counter.size else round(rows * size / counter.size)
+    return sample, estimated_rows
@@ -0,0 +1,85 @@
+"""
+Сравнение старого многопроходного подсчёта метрик (describe, nunique,
+isnull, skew, kurt по отдельности) с describe_frame из app/processing.py.
+
+Запуск из корня проекта:
+    python benchmarks/bench_process_json.py --rows 1000000 --cols 50
+    python benchmarks/bench_process_json.py --workers 8   # + пул процессов
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.processing import describe_frame  # noqa: E402
+
+
+def multipass_stats(df: pd.DataFrame) -> dict:
+    """Прежняя реализация process_json без корреляции."""
+    numeric_stat = df.describe(include=[float, int])
+    object_stat = df.describe(include=[object])
+    combined_stat = pd.concat([numeric_stat, object_stat], axis=1)
+    unique_counts = {col: df[col].nunique() for col in df.columns}
+    missing_counts = df.isnull().sum().to_dict()
+    skew = df.skew(numeric_only=True).to_dict()
+    kurt = df.kurt(numeric_only=True).to_dict()
+
+    result = combined_stat.to_dict()
+    for key in unique_counts.keys():
+        result[key]['unique'] = unique_counts[key]
+        result[key]['missing'] = missing_counts[key]
+    for key in skew.keys():
+        result[key]['skewness'] = skew[key]
+        result[key]['kurtosis'] = kurt[key]
+    return result
+
+
+def make_frame(rows: int, cols: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    data = rng.normal(size=(rows, cols))
+    data[rng.random(size=(rows, cols)) < 0.01] = np.nan
+    df = pd.DataFrame(data, columns=[f'x{i}' for i in range(cols)])
+    df['category'] = rng.choice(['a', 'b', 'c', 'd'], size=rows)
+    return df
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--cols', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='размер пула процессов для describe_frame (1 — без пула)')
+    args = parser.parse_args()
+
+    df = make_frame(args.rows, args.cols)
+    print(f'{args.rows} rows x {args.cols} numeric columns (+1 object column)')
+
+    old = best_of(lambda: multipass_stats(df), args.repeat)
+    new = best_of(lambda: describe_frame(df), args.repeat)
+    print(f'multi-pass:   {old:8.3f} s')
+    print(f'describe_frame: {new:6.3f} s')
+    print(f'speedup:      {old / new:8.2f}x')
+
+    if args.workers > 1:
+        describe_frame(df, workers=args.workers)  # запуск пула не учитываем
+        parallel = best_of(lambda: describe_frame(df, workers=args.workers), args.repeat)
+        print(f'{args.workers} workers:    {parallel:8.3f} s ({old / parallel:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,84 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False  # Отключаем отслеживание изменений
     UPLOAD_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), 'uploads'))
-    ALLOWED_EXTENSIONS = {'json', 'csv', 'xls', 'xlsx'}
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # Максимальный размер загружаемого файла (16MB)
+    ALLOWED_EXTENSIONS = {'json', 'ndjson', 'jsonl', 'csv', 'xls', 'xlsx'}
+    MAX_CONTENT_LENGTH = 4 * 1024 * 1024 * 1024  # Максимальный размер загружаемого файла (4GB)
+    # Потоковая обработка: файлы CSV/NDJSON больше порога читаются порциями,
+    # метрики считаются на лету, поэтому память не зависит от размера файла
+    STREAM_EXTENSIONS = {'csv', 'ndjson', 'jsonl'}
+    STREAM_THRESHOLD = 16 * 1024 * 1024
+    STREAM_CHUNK_ROWS = 100_000
+    # Каждая загрузка один раз конвертируется в Parquet (UPLOAD_FOLDER/cache),
+    # дальше все чтения идут из него
+    PARQUET_ROW_GROUP_ROWS = 100_000
+    # Фоновая обработка загрузок: размер пула потоков и сколько секунд
+    # хранить статус завершённой задачи
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+    JOB_TTL = 3600
+    CHART_WORKERS = int(os.environ.get('CHART_WORKERS', 2))  # потоки для построения тяжёлых графиков
+    CHART_JOB_TTL = 600
+    CHART_BACKGROUND_ROWS = 200_000  # графики по датасетам от стольких строк строятся в фоне
+    CHART_POLL_INTERVAL_MS = 500  # как часто доска спрашивает о готовности графиков
+    # Приближённые метрики: число уникальных по HyperLogLog, квартили по скетчу.
+    # 'auto' — для потоковой обработки и таблиц больше METRICS_APPROXIMATE_ROWS строк,
+    # 'on' — всегда, 'off' — никогда
+    METRICS_APPROXIMATE = os.environ.get('METRICS_APPROXIMATE', 'auto')
+    METRICS_APPROXIMATE_ROWS = 5_000_000
+    HLL_PRECISION = 14  # ошибка числа уникальных ~1.04 / sqrt(2**14) = 0.8%
+    QUANTILE_RELATIVE_ERROR = 0.01  # относительная ошибка квартилей
+    TOP_VALUES_CAPACITY = 1024  # сколько частых значений строковой колонки отслеживать
+    # Предварительные метрики: для CSV/NDJSON больше PREVIEW_THRESHOLD сначала
+    # считаются метрики по случайной выборке строк (с доверительными интервалами),
+    # затем их заменяют точные
+    PREVIEW_THRESHOLD = 64 * 1024 * 1024
+    PREVIEW_SAMPLE_ROWS = 50_000
+    PREVIEW_TIME_BUDGET = 3.0  # секунды на выборку
+    PREVIEW_CONFIDENCE = 0.95
+    # Метрики колонок считаются группами в пуле процессов (данные передаются
+    # через разделяемую память); для небольших таблиц пул не используется
+    STATS_WORKERS = int(os.environ.get('STATS_WORKERS', os.cpu_count() or 1))
+    STATS_PARALLEL_MIN_CELLS = 10_000_000
+    # Матрица корреляций считается блоками колонок в нескольких потоках
+    # и хранится в metrics_data/<ключ>_corr.npz; в метрики попадают top-k пар
+    CORRELATION_BLOCK_COLUMNS = 64
+    CORRELATION_WORKERS = int(os.environ.get('CORRELATION_WORKERS', os.cpu_count() or 1))
+    CORRELATION_TOP_K = 20
+    # Общий для процесса LRU-кеш разобранных датасетов и превью дашборда
+    # (байты в памяти; при переполнении вытесняются давно не открывавшиеся)
+    FRAME_CACHE_BYTES = int(os.environ.get('FRAME_CACHE_BYTES', 512 * 1024 * 1024))
+    # Бюджет отрисовки графиков: линии длиннее CHART_LINE_MAX_POINTS прореживаются
+    # ('lttb' — сохраняет форму, 'minmax' — минимум и максимум в каждой корзине),
+    # точечные графики больше CHART_SCATTER_WEBGL_POINTS рисуются через WebGL,
+    # больше CHART_SCATTER_DENSITY_POINTS — как плотность на сетке.
+    # Bar и box агрегируются на сервере; у box в браузер уходит не больше
+    # CHART_BOX_MAX_OUTLIERS выбросов на группу. Heatmap строится по сохранённой
+    # матрице корреляций и показывает не больше CHART_HEATMAP_MAX_COLUMNS колонок.
+    # Гистограммы больше CHART_HISTOGRAM_RAW_ROWS строк считаются на сервере
+    # (CHART_HISTOGRAM_BINS корзин), в браузер уходят только высоты столбцов
+    CHART_LINE_MAX_POINTS = 5_000
+    CHART_DOWNSAMPLER = 'lttb'
+    CHART_SCATTER_WEBGL_POINTS = 10_000
+    CHART_SCATTER_DENSITY_POINTS = 200_000
+    CHART_DENSITY_BINS = 200
+    CHART_BOX_MAX_OUTLIERS = 100
+    CHART_HEATMAP_MAX_COLUMNS = 50
+    CHART_HISTOGRAM_RAW_ROWS = 100_000
+    CHART_HISTOGRAM_BINS = 100
+    # Пирамиды временных рядов (min/max/mean по минутам, часам, дням) строятся при загрузке
+    # для колонок с датой в таблицах от стольких строк; линия по времени начинается
+    # с крупного уровня, при увеличении подгружается более мелкий
+    TIMESERIES_PYRAMID_MIN_ROWS = 10_000
+    # Перекрёстная фильтрация карточек: индексы колонок строятся при загрузке —
+    # битовые карты для колонок с не более чем стольким числом значений,
+    # сортированные индексы для числовых колонок и времени
+    CROSS_FILTER_MAX_CATEGORIES = 64
+    # Кеш готовых графиков (JSON фигур) по версии датасета и описанию графика;
+    # FIGURE_CACHE_DISK=1 дополнительно хранит их в UPLOAD_FOLDER/figures
+    FIGURE_CACHE_BYTES = int(os.environ.get('FIGURE_CACHE_BYTES', 128 * 1024 * 1024))
+    FIGURE_CACHE_DISK = os.environ.get('FIGURE_CACHE_DISK', '0') == '1'
+    FIGURE_CACHE_DISK_BYTES = int(os.environ.get('FIGURE_CACHE_DISK_BYTES', 1024 * 1024 * 1024))
+    FILE_SELECTOR_PAGE_SIZE = 50  # файлов на странице выпадающего списка дашборда
+    DATA_GRID_PAGE_SIZE = 25  # строк на странице таблицы данных; сервер отдаёт только её
+    RESPONSE_COMPRESS_MIN_BYTES = 1024  # JSON-ответы больше этого размера сжимаются gzip
     OPENROUTER_API_KEY = os.environ.get('OPENROUTER_API_KEY')
     OPENROUTER_API_URL = "https://openrouter.ai/api/v1"
\ No newline at end of file
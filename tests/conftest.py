@@ -0,0 +1,232 @@
+import atexit
+import base64
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+import pytest
+from flask import g
+
+# пакет app при импорте создаёт Flask-приложение с базой из окружения.
+# База тестов — SQLite во временном файле, а не в памяти: фоновые задачи
+# работают с ней из своих потоков, и общее соединение in-memory базы им не подходит
+_database_dir = tempfile.mkdtemp()
+atexit.register(shutil.rmtree, _database_dir, True)
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_database_dir, 'test.db')
+
+
+@pytest.fixture
+def frame():
+    """Таблица со временем, числами (с пропусками) и строками разной кардинальности."""
+    rng = np.random.default_rng(0)
+    rows = 20_000
+    df = pd.DataFrame({
+        'time': pd.date_range('2024-01-01', periods=rows, freq='37s').strftime('%Y-%m-%d %H:%M:%S'),
+        'value': rng.normal(0, 10, rows),
+        'count': rng.integers(0, 20, rows),
+        'city': rng.choice(['Moscow', 'Kazan', 'Omsk'], rows),
+        'code': [f'id{value}' for value in rng.integers(0, 5000, rows)],
+    })
+    df.loc[rng.random(rows) < 0.05, 'value'] = np.nan
+    return df
+
+
+@pytest.fixture
+def cache(tmp_path, frame):
+    """Parquet-кеш таблицы frame с несколькими группами строк."""
+    from app.storage import write_cache
+    path = str(tmp_path / 'data.parquet')
+    write_cache(frame, path, row_group_rows=3000)
+    return path
+
+
+@pytest.fixture(scope='session')
+def dash_app():
+    """Дашборд поверх приложения; формы без CSRF-токенов."""
+    from app import app
+    from app.dashboard import create_dash_app
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        return create_dash_app(app)
+
+
+@pytest.fixture(scope='session')
+def flask_app(dash_app):
+    return dash_app.server
+
+
+@pytest.fixture
+def client(flask_app, tmp_path, monkeypatch):
+    """
+    Клиент вошедшего пользователя 'tester': чистая база, загрузки
+    и состояние задач графиков — во временной папке.
+    """
+    from app import db
+    from app.figure_cache import figure_cache
+    from app.frame_cache import frame_cache
+    from app.jobs import chart_queue
+    from app.dashboard.callbacks import dm
+
+    upload_folder = tmp_path / 'uploads'
+    upload_folder.mkdir()
+    monkeypatch.setitem(flask_app.config, 'UPLOAD_FOLDER', str(upload_folder))
+    monkeypatch.setattr(chart_queue.store, 'folder', str(upload_folder / 'chart_jobs'))
+    monkeypatch.setattr(dm, 'data_directory', str(upload_folder))
+    frame_cache.clear()
+    figure_cache.memory.clear()
+    with flask_app.app_context():
+        db.create_all()
+
+    client = flask_app.test_client()
+    log_in(client, 'tester')
+    yield client
+
+    with flask_app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def owner_context(flask_app):
+    """
+    Контекст приложения от имени владельца датасета — так DataManager
+    работает в фоновой задаче графика (g.dataset_owner).
+    """
+    from app import db
+    from app.models import Dataset
+
+    @contextmanager
+    def context(dataset_id: int):
+        with flask_app.app_context():
+            g.dataset_owner = db.session.get(Dataset, dataset_id).user_id
+            yield
+    return context
+
+
+def log_in(client, username: str, password: str = 'secret1'):
+    client.post('/register', data={'username': username, 'password': password, 'confirm_password': password})
+    client.post('/login', data={'username': username, 'password': password})
+
+
+def wait_for_job(client, job_id: str, timeout: float = 30.0) -> dict:
+    """Опрашивает /api/jobs/<id>, пока задача не завершится."""
+    deadline = time.monotonic() + timeout
+    while True:
+        status = client.get(f'/api/jobs/{job_id}').get_json()
+        if status['status'] in ('done', 'failed', 'cancelled') or time.monotonic() > deadline:
+            return status
+        time.sleep(0.05)
+
+
+def wait_until(condition, timeout: float = 10.0):
+    """Ждёт, пока condition() не станет истинным (например, завершения задачи в пуле)."""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+def blocking(release: threading.Event):
+    """Задача, которая ждёт release и проверяет отмену, как build_chart между стадиями."""
+    def run(job, *args):
+        while not release.wait(0.01):
+            job.check_cancelled()
+        return '{"data": [], "layout": {}}'
+    return run
+
+
+@pytest.fixture
+def upload(client):
+    """
+    Загружает файл (байты или DataFrame) и ждёт окончания обработки.
+
+    Returns:
+        ответ /upload (job_id, dataset_id) и статус задачи в 'job'
+    """
+    def upload(name: str, data, wait: bool = True) -> dict:
+        if isinstance(data, pd.DataFrame):
+            data = data.to_csv(index=False).encode()
+        response = client.post('/upload', data={'data_file': (io.BytesIO(data), name)},
+                               headers={'Accept': 'application/json'}, content_type='multipart/form-data')
+        assert response.status_code in (201, 202), response.data
+        result = response.get_json()
+        if wait and result['job_id']:
+            result['job'] = wait_for_job(client, result['job_id'])
+        return result
+    return upload
+
+
+def decode_array(value) -> np.ndarray:
+    """Массив из JSON фигуры: типизированный base64 (dtype, bdata, shape) или список."""
+    if not isinstance(value, dict):
+        return np.asarray(value)
+    array = np.frombuffer(base64.b64decode(value['bdata']), dtype=value['dtype'])
+    shape = value.get('shape')
+    return array.reshape([int(n) for n in str(shape).split(',')]) if shape else array
+
+
+def _dash_id(ident) -> str:
+    return json.dumps(ident, sort_keys=True, separators=(',', ':')) if isinstance(ident, dict) else ident
+
+
+def _dash_props(entry):
+    if isinstance(entry, list):
+        return [_dash_props(item) for item in entry]
+    ident, prop, value = entry
+    return {'id': ident, 'property': prop, 'value': value}
+
+
+@pytest.fixture
+def dash_update(client, dash_app):
+    """
+    Вызывает callback дашборда по имени функции так же, как браузер
+    (POST /dash/_dash-update-component).
+
+    inputs и state — (id, свойство, значение) в порядке объявления, для
+    ALL-шаблонов — списки таких кортежей; cards — id карточек, для которых
+    раскрываются ALL-выходы; trigger — (id, свойство) сработавшего входа,
+    по умолчанию первый вход.
+
+    Returns:
+        None, если callback ничего не обновил (PreventUpdate), иначе
+        {id: {свойство: значение}}; id карточек — (role, id)
+    """
+    def update(callback: str, inputs: list, state: list = (), cards: list = (), trigger: tuple = None):
+        output = next(key for key, entry in dash_app.callback_map.items()
+                      if getattr(entry.get('callback'), '__name__', None) == callback)
+        outputs = []
+        for item in output[2:-2].split('...') if output.startswith('..') else [output]:
+            ident, prop = item.rsplit('.', 1)
+            prop = prop.split('@')[0]
+            if ident.startswith('{'):
+                pattern = json.loads(ident)
+                outputs.append([{'id': dict(pattern, id=cid), 'property': prop} for cid in cards])
+            else:
+                outputs.append({'id': ident, 'property': prop})
+
+        if trigger is None:
+            trigger = inputs[0][0] if isinstance(inputs[0], list) else inputs[0]
+        response = client.post('/dash/_dash-update-component', json={
+            'output': output,
+            'outputs': outputs if len(outputs) > 1 else outputs[0],
+            'inputs': _dash_props(list(inputs)),
+            'state': _dash_props(list(state)),
+            'changedPropIds': [f'{_dash_id(trigger[0])}.{trigger[1]}'],
+        })
+        if response.status_code == 204:
+            return None
+        assert response.status_code == 200, response.data
+        result = {}
+        for key, props in response.get_json()['response'].items():
+            if key.startswith('{'):
+                ident = json.loads(key)
+                key = (ident['role'], ident['id'])
+            result[key] = props
+        return result
+    return update
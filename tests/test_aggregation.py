@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.dashboard.aggregation import box_stats, group_aggregate
+from app.storage import read_cache, write_cache
+
+
+def test_sum_and_mean_over_float32_cache_match_float64(tmp_path):
+    rng = np.random.default_rng(0)
+    rows = 2_000_000
+    # значения точно представимы во float32 — кеш хранит колонку сжатой
+    df = pd.DataFrame({'group': rng.integers(0, 3, rows), 'value': rng.integers(0, 1000, rows) + 0.25})
+    path = str(tmp_path / 'data.parquet')
+    write_cache(df, path)
+    cached = read_cache(path)
+    assert cached['value'].dtype == np.float32
+
+    for agg in ('sum', 'mean'):
+        expected = df.groupby('group')['value'].agg(agg)
+        result = group_aggregate(cached, 'group', 'value', agg)
+        np.testing.assert_allclose(result['value'].to_numpy(), expected.to_numpy(), rtol=1e-12)
+
+    stats, _ = box_stats(cached, 'group', 'value')
+    np.testing.assert_allclose(stats['mean'].to_numpy(), df.groupby('group')['value'].mean().to_numpy(), rtol=1e-12)
+
+
+def test_group_aggregate_matches_groupby(frame):
+    for agg in ('sum', 'mean', 'count'):
+        result = group_aggregate(frame, 'city', 'value', agg)
+        expected = frame.groupby('city')['value'].agg(agg)
+        assert result['city'].tolist() == sorted(expected.index)
+        np.testing.assert_allclose(result['value'].to_numpy(), expected.to_numpy())
+
+    counts = group_aggregate(frame, 'count', 'code', 'count')
+    assert counts['code'].sum() == len(frame)
+    with pytest.raises(ValueError):
+        group_aggregate(frame, 'city', 'code', 'sum')
+    with pytest.raises(ValueError):
+        group_aggregate(frame, 'city', 'value', 'median')
+
+
+def test_box_stats_fences_and_outliers():
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({'group': np.repeat(['a', 'b'], 1_000), 'value': rng.normal(0, 1, 2_000)})
+    df.loc[[0, 1, 2, 1_000], 'value'] = [50.0, -40.0, 30.0, 99.0]
+    stats, outliers = box_stats(df, 'group', 'value', max_outliers=2)
+
+    for row in stats.itertuples():
+        values = df.loc[df['group'] == row.group, 'value']
+        q1, median, q3 = values.quantile([0.25, 0.5, 0.75])
+        assert (row.q1, row.median, row.q3) == pytest.approx((q1, median, q3))
+        inside = values[values.between(q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1))]
+        assert (row.lowerfence, row.upperfence) == (inside.min(), inside.max())
+        assert row.outliers == len(values) - len(inside)
+        assert row.count == len(values)
+    # выборка выбросов ограничена max_outliers на группу
+    assert outliers.groupby('group').size().max() <= 2
+    by_group = stats.set_index('group')
+    low, high = outliers['group'].map(by_group['lowerfence']), outliers['group'].map(by_group['upperfence'])
+    assert len(outliers) == 4
+    assert ((outliers['value'] < low) | (outliers['value'] > high)).all()
@@ -0,0 +1,66 @@
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from app import app, db
+from app.jobs import read_state, state_path
+from app.metrics import load_metrics
+from app.models import Dataset
+from conftest import wait_for_job
+
+
+def make_part(rows: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'value': rng.normal(5, 2, rows),
+        'count': rng.integers(0, 100, rows),
+        'city': rng.choice(['Moscow', 'Kazan', 'Omsk'], rows),
+    })
+    df.loc[rng.random(rows) < 0.1, 'value'] = np.nan
+    return df
+
+
+def append(client, dataset_id: int, df: pd.DataFrame, name: str = 'delta.csv'):
+    data = {'data_file': (io.BytesIO(df.to_csv(index=False).encode()), name)}
+    return client.post(f'/api/datasets/{dataset_id}/append', data=data, content_type='multipart/form-data')
+
+
+def dataset_state(dataset_id: int):
+    with app.app_context():
+        dataset = db.session.get(Dataset, dataset_id)
+        return dataset.storage_key, dataset.status, dataset.row_count, load_metrics(dataset.storage_key)
+
+
+def test_append_merges_metrics_of_new_rows(client, upload):
+    base, delta = make_part(3000, 0), make_part(1000, 1)
+    dataset_id = upload('data.csv', base)['dataset_id']
+
+    response = append(client, dataset_id, delta)
+    assert response.status_code == 202
+    assert wait_for_job(client, response.get_json()['job_id'])['status'] == 'done'
+
+    key, status, rows, stats = dataset_state(dataset_id)
+    assert (status, rows) == ('ready', 4000)
+    assert stats['source']['mode'] == 'incremental' and stats['source']['appended_rows'] == 1000
+    whole = pd.concat([base, delta], ignore_index=True)
+    for col in ('value', 'count'):
+        series = whole[col]
+        expected = {'count': series.count(), 'mean': series.mean(), 'std': series.std(), 'min': series.min(),
+                    'max': series.max(), 'unique': series.nunique(), 'missing': series.isnull().sum()}
+        for metric, value in expected.items():
+            assert stats['result'][col][metric] == pytest.approx(value, rel=1e-9), (col, metric)
+    counts = whole['city'].value_counts()
+    assert (stats['result']['city']['top'], stats['result']['city']['freq']) == (counts.index[0], counts.iloc[0])
+
+    # первая дозагрузка собрала состояние из кеша и сохранила его для следующих
+    assert read_state(state_path(app.config['UPLOAD_FOLDER'], key)).rows == 4000
+    response = append(client, dataset_id, make_part(500, 2))
+    assert wait_for_job(client, response.get_json()['job_id'])['status'] == 'done'
+    key, _, rows, stats = dataset_state(dataset_id)
+    assert rows == stats['source']['rows'] == 4500
+    assert read_state(state_path(app.config['UPLOAD_FOLDER'], key)).rows == 4500
+
+
+def test_append_rejects_other_formats(client, upload):
+    dataset_id = upload('data.csv', make_part(100, 0))['dataset_id']
+    assert append(client, dataset_id, make_part(10, 1), 'delta.json').status_code == 400
@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def handle(client, upload, dash_update):
+    dataset_id = upload('data.csv', pd.DataFrame({'a': range(10), 'b': range(10)}))['dataset_id']
+    return dash_update('load_selected_file', [('file-selector', 'value', dataset_id)])['stored-data']['data']
+
+
+def board_state(handle, cards=(), layouts=None, kind='bar'):
+    """State manage_cards в порядке объявления; sources — источники карточек cards."""
+    sources = [({'role': 'source', 'id': cid}, 'data', {'handle': handle, 'spec': {'kind': kind}})
+               for cid in cards]
+    return [('chart-type', 'value', kind), ('x-column', 'value', 'a'), ('y-column', 'value', 'b'),
+            ('aggregation', 'value', 'sum'), ('heatmap-options', 'value', []), ('stored-data', 'data', handle),
+            ('board-cards', 'data', list(cards)), ('chart-jobs', 'data', {}), ('cross-filter', 'data', {}),
+            ('cross-filter-applied', 'data', {}), ('board', 'layouts', layouts or {}), sources]
+
+
+def close_buttons(cards, clicked=None):
+    return [({'role': 'close', 'id': cid}, 'n_clicks', 1 if cid == clicked else None) for cid in cards]
+
+
+def operations(patch) -> list:
+    assert patch['__dash_patch_update'] == '__dash_patch_update'
+    return [(op['operation'], op['location']) for op in patch['operations']]
+
+
+def test_add_chart_appends_one_card(handle, dash_update):
+    result = dash_update('manage_cards', [('add-chart', 'n_clicks', 1), []], board_state(handle))
+    ids = result['board-cards']['data']
+    assert operations(ids) == [('Append', [])]
+    cid = ids['operations'][0]['params']['value']
+
+    children = result['board']['children']
+    assert operations(children) == [('Append', [])]
+    card = children['operations'][0]['params']['value']
+    assert card['props']['children'][0]['props']['id'] == {'role': 'close', 'id': cid}
+    # маленький датасет строится сразу: опрос фоновых задач не нужен
+    assert result['chart-jobs-poll']['disabled'] is True
+    layouts = result['board']['layouts']
+    assert operations(layouts) == [('Assign', [bp]) for bp in ('lg', 'md', 'sm', 'xs')]
+
+    # у заполненной сетки раскладка карточки дописывается в конец
+    existing = {bp: [{'i': 'old', 'x': 0, 'y': 0, 'w': 6, 'h': 4}] for bp in ('lg', 'md', 'sm', 'xs')}
+    result = dash_update('manage_cards', [('add-chart', 'n_clicks', 2), close_buttons(['old'])],
+                         board_state(handle, ['old'], existing), cards=['old'])
+    assert operations(result['board']['layouts']) == [('Append', [bp]) for bp in ('lg', 'md', 'sm', 'xs')]
+    assert operations(result['board']['children']) == [('Append', [])]
+
+
+def test_close_removes_card_by_position(handle, dash_update):
+    cards = ['first', 'second', 'third']
+    layouts = {'lg': [{'i': cid, 'x': 0, 'y': 0, 'w': 6, 'h': 4} for cid in reversed(cards)]}
+    trigger = ({'role': 'close', 'id': 'second'}, 'n_clicks')
+    result = dash_update('manage_cards', [('add-chart', 'n_clicks', None), close_buttons(cards, 'second')],
+                         board_state(handle, cards, layouts), cards=cards, trigger=trigger)
+    assert operations(result['board']['children']) == [('Delete', [1])]
+    assert operations(result['board-cards']['data']) == [('Delete', [1])]
+    assert [item['i'] for item in result['board']['layouts']['lg']] == ['third', 'first']
+
+    # новая кнопка закрытия (n_clicks=None) тоже вызывает callback — доска не меняется
+    assert dash_update('manage_cards', [('add-chart', 'n_clicks', None), close_buttons(cards)],
+                       board_state(handle, cards, layouts), cards=cards, trigger=trigger) is None
@@ -0,0 +1,103 @@
+import json
+import threading
+import pandas as pd
+import pytest
+from app.dashboard import callbacks
+from app.jobs import JobQueue, JobStore, chart_queue
+from app.models import User
+from conftest import blocking, wait_until
+
+
+def test_store_shares_jobs_between_queues(tmp_path):
+    folder = str(tmp_path / 'jobs')
+    worker, other = JobQueue(1, store=JobStore(folder)), JobQueue(1, store=JobStore(folder))
+    release = threading.Event()
+    job = worker.submit(blocking(release), 7, None)
+    wait_until(lambda: other.get(job.id).status == 'running')
+
+    # другой процесс видит задачу и отменяет её через метку в папке
+    assert other.get(job.id).user_id == 7
+    assert other.cancel(job.id)
+    wait_until(lambda: job.finished_at)
+    assert job.status == 'cancelled' and other.get(job.id).status == 'cancelled'
+    assert not other.cancel(job.id)
+
+    done = worker.submit(lambda job: '{"figure": 1}', 7, None)
+    wait_until(lambda: done.finished_at)
+    assert other.get(done.id).result == '{"figure": 1}'
+    assert other.get('missing') is None
+    release.set()
+
+
+def test_poll_charts_replaces_finished_placeholders(client, flask_app, dash_update):
+    with flask_app.app_context():
+        user_id = User.query.filter_by(username='tester').one().id
+    release = threading.Event()
+    done = chart_queue.submit(lambda job: '{"data": [], "layout": {"title": {"text": "ready"}}}', user_id, None)
+    running = chart_queue.submit(blocking(release), user_id, None)
+    foreign = chart_queue.submit(lambda job: '{}', user_id + 1, None)
+    wait_until(lambda: done.finished_at and foreign.finished_at)
+
+    pending = {'done': done.id, 'running': running.id, 'foreign': foreign.id}
+    cards = ['done', 'running', 'foreign', 'static']
+    try:
+        result = dash_update('poll_charts', [('chart-jobs-poll', 'n_intervals', 1)],
+                             [('chart-jobs', 'data', pending)], cards=cards)
+    finally:
+        release.set()
+    assert result[('chart-body', 'done')]['children']['props']['figure']['layout']['title']['text'] == 'ready'
+    assert 'expired' in json.dumps(result[('chart-body', 'foreign')]['children'])
+    assert 'Queued' in json.dumps(result[('chart-body', 'running')]['children'])
+    assert ('chart-body', 'static') not in result
+    deleted = [op['location'] for op in result['chart-jobs']['data']['operations']]
+    assert sorted(deleted) == [['done'], ['foreign']]
+    assert result['chart-jobs-poll']['disabled'] is False
+
+
+@pytest.fixture
+def queued_board(client, upload, dash_update, flask_app, monkeypatch):
+    """
+    Доска, где каждый график строится в фоне и не завершается,
+    пока тест не отпустит release.
+    """
+    dataset_id = upload('data.csv', pd.DataFrame({'a': range(10), 'b': range(10)}))['dataset_id']
+    handle = dash_update('load_selected_file', [('file-selector', 'value', dataset_id)])['stored-data']['data']
+    monkeypatch.setitem(flask_app.config, 'CHART_BACKGROUND_ROWS', 0)
+    release = threading.Event()
+    monkeypatch.setattr(callbacks, 'build_chart', blocking(release))
+    cards, pending, sources = [], {}, {}
+
+    def add(agg: str):
+        state = [('chart-type', 'value', 'bar'), ('x-column', 'value', 'a'), ('y-column', 'value', 'b'),
+                 ('aggregation', 'value', agg), ('heatmap-options', 'value', []), ('stored-data', 'data', handle),
+                 ('board-cards', 'data', list(cards)), ('chart-jobs', 'data', dict(pending)),
+                 ('cross-filter', 'data', {}), ('cross-filter-applied', 'data', {}), ('board', 'layouts', {}),
+                 [({'role': 'source', 'id': cid}, 'data', sources[cid]) for cid in cards]]
+        buttons = [({'role': 'close', 'id': cid}, 'n_clicks', None) for cid in cards]
+        result = dash_update('manage_cards', [('add-chart', 'n_clicks', len(cards) + 1), buttons], state,
+                             cards=cards)
+        (assign,) = result['chart-jobs']['data']['operations']
+        cid = assign['location'][0]
+        card = result['board']['children']['operations'][0]['params']['value']
+        cards.append(cid)
+        pending[cid] = assign['params']['value']
+        sources[cid] = card['props']['children'][2]['props']['data']
+        return chart_queue.get(pending[cid])
+
+    yield add
+    release.set()
+
+
+def test_identical_chart_shares_the_running_job(queued_board):
+    first = queued_board('sum')
+    second = queued_board('sum')
+    assert second.id == first.id
+    assert not first.is_cancelled()
+
+
+def test_changed_chart_cancels_the_superseded_job(queued_board):
+    first = queued_board('sum')
+    second = queued_board('mean')
+    assert second.id != first.id
+    assert first.is_cancelled() and not second.is_cancelled()
+    wait_until(lambda: chart_queue.get(first.id).status == 'cancelled')
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app import app, db
+from app.correlation import correlation_matrix, load_matrix, save_matrix, top_pairs
+from app.jobs import correlation_path
+from app.metrics import load_metrics
+from app.models import Dataset
+from app.processing import StreamingStats
+
+
+def mixed_frame(rows: int = 3_000) -> pd.DataFrame:
+    """Связанные колонки, пропуски, константа, пустая колонка, целые, флаг и строки."""
+    rng = np.random.default_rng(0)
+    base = rng.normal(size=rows)
+    df = pd.DataFrame({f'n{i}': base * (i - 3) + rng.normal(size=rows) for i in range(7)})
+    df.loc[rng.random(rows) < 0.1, 'n1'] = np.nan
+    df.loc[rng.random(rows) < 0.3, 'n4'] = np.nan
+    df['constant'] = 5.0
+    df['empty'] = np.nan
+    df['count'] = rng.integers(0, 50, rows)
+    df['flag'] = base > 0
+    df['name'] = rng.choice(['a', 'b'], rows)
+    return df
+
+
+@pytest.mark.parametrize('block_columns, workers', [(64, 1), (3, 1), (3, 4), (1, 2)])
+def test_correlation_matrix_matches_dataframe_corr(block_columns, workers):
+    df = mixed_frame()
+    corr, columns = correlation_matrix(df, block_columns, workers)
+    expected = df.corr(numeric_only=True)
+    assert columns == list(expected.columns)
+    np.testing.assert_allclose(corr, expected.to_numpy(), atol=1e-12, equal_nan=True)
+
+
+def test_streaming_correlation_counts_flags_like_dataframe_corr():
+    df = mixed_frame()
+    accumulator = StreamingStats()
+    for part in np.array_split(df, 4):
+        accumulator.update(part)
+    accumulator = StreamingStats.from_state(accumulator.to_state())
+    expected = df.corr(numeric_only=True)
+    corr = accumulator.correlation()
+    assert list(corr.columns) == list(expected.columns)
+    np.testing.assert_allclose(corr.to_numpy(), expected.to_numpy(), atol=1e-9, equal_nan=True)
+    # в метриках флаг остаётся категориальной колонкой
+    assert 'flag' in accumulator.objects
+
+
+def test_saved_matrix_and_top_pairs(tmp_path):
+    df = mixed_frame()
+    corr, columns = correlation_matrix(df)
+    path = str(tmp_path / 'corr.npz')
+    save_matrix(path, corr, columns)
+    restored = load_matrix(path)
+    assert list(restored.columns) == columns
+    # хранится во float32
+    np.testing.assert_allclose(restored.to_numpy(), corr, atol=1e-6, equal_nan=True)
+
+    pairs = top_pairs(corr, columns, k=5)
+    upper = [(abs(corr[i, j]), columns[i], columns[j])
+             for i in range(len(columns)) for j in range(i + 1, len(columns)) if not np.isnan(corr[i, j])]
+    assert [(pair['x'], pair['y']) for pair in pairs] == [(x, y) for _, x, y in sorted(upper, reverse=True)[:5]]
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_uploaded_matrix_matches_dataframe_corr(client, upload, flask_app, monkeypatch, stream):
+    if stream:
+        monkeypatch.setitem(flask_app.config, 'STREAM_THRESHOLD', 0)
+    df = mixed_frame().drop(columns=['empty'])
+    dataset_id = upload('data.csv', df)['dataset_id']
+    with app.app_context():
+        key = db.session.get(Dataset, dataset_id).storage_key
+        stats = load_metrics(key)
+    assert (stats.get('source', {}).get('mode') == 'stream') == stream
+
+    expected = df.corr(numeric_only=True)
+    matrix = load_matrix(correlation_path(flask_app.config['UPLOAD_FOLDER'], key))
+    assert list(matrix.columns) == list(expected.columns)
+    np.testing.assert_allclose(matrix.to_numpy(), expected.to_numpy(), atol=1e-5, equal_nan=True)
+    assert stats['correlation']['columns'] == len(expected.columns)
+    strongest = stats['correlation']['top_pairs'][0]
+    assert strongest['value'] == pytest.approx(expected.loc[strongest['x'], strongest['y']], abs=1e-9)
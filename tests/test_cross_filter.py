@@ -0,0 +1,61 @@
+import json
+import threading
+import pytest
+from app.dashboard.callbacks import ChartFactory
+from app.jobs import chart_queue
+from conftest import blocking, decode_array, wait_until
+
+
+@pytest.fixture
+def board(client, upload, dash_update, frame):
+    """Две карточки по одному датасету: столбцы по городам и облако точек."""
+    dataset_id = upload('data.csv', frame)['dataset_id']
+    handle = dash_update('load_selected_file', [('file-selector', 'value', dataset_id)])['stored-data']['data']
+    settings = ChartFactory.settings()
+    return dataset_id, {
+        'bars': {'handle': handle, 'spec': {'kind': 'bar', 'chart': settings, 'x': 'city', 'y': 'value', 'agg': 'sum'}},
+        'points': {'handle': handle, 'spec': {'kind': 'scatter', 'chart': settings, 'x': 'count', 'y': 'value', 'agg': None}},
+    }
+
+def apply(dash_update, dataset_id, sources, pending=None):
+    filters = {'bars': {'column': 'city', 'values': ['Kazan'], 'dataset_id': dataset_id}}
+    return dash_update('apply_filter', [('cross-filter', 'data', filters)],
+                       [[({'role': 'source', 'id': cid}, 'data', source) for cid, source in sources.items()],
+                        ('cross-filter-applied', 'data', {}), ('cross-filter-bar', 'style', {'display': 'none'}),
+                        ('chart-jobs', 'data', pending or {})], cards=list(sources))
+
+def test_small_dataset_is_filtered_inline(board, dash_update, frame):
+    dataset_id, sources = board
+    result = apply(dash_update, dataset_id, sources)
+    # карточка с выделением не фильтруется своим же условием
+    assert ('chart-body', 'bars') not in result
+    trace = result[('chart-body', 'points')]['children']['props']['figure']['data'][0]
+    assert len(decode_array(trace['y'])) == (frame['city'] == 'Kazan').sum()
+    assert result['cross-filter-applied']['data'] == {'points': [{'column': 'city', 'values': ['Kazan']}]}
+    assert result['cross-filter-summary']['children'] == 'city ∈ {Kazan}'
+    assert result['cross-filter-bar']['style'] == {'display': 'flex'}
+    assert 'chart-jobs-poll' not in result
+
+def test_large_dataset_is_filtered_in_the_background(board, dash_update, flask_app, monkeypatch, frame):
+    dataset_id, sources = board
+    monkeypatch.setitem(flask_app.config, 'CHART_BACKGROUND_ROWS', 0)
+    release = threading.Event()
+    previous = chart_queue.submit(blocking(release), None, None)
+    try:
+        result = apply(dash_update, dataset_id, sources, pending={'points': previous.id})
+    finally:
+        release.set()
+
+    # ответ не ждёт построения: заглушка и задача для poll_charts
+    assert 'Queued' in json.dumps(result[('chart-body', 'points')]['children'])
+    (assign,) = result['chart-jobs']['data']['operations']
+    assert assign['location'] == ['points']
+    assert result['chart-jobs-poll']['disabled'] is False
+    # построение по прежним условиям отменено
+    assert previous.is_cancelled()
+
+    job = chart_queue.get(assign['params']['value'])
+    wait_until(lambda: job.finished_at)
+    trace = json.loads(job.result)['data'][0]
+    assert job.status == 'done'
+    assert len(decode_array(trace['y'])) == (frame['city'] == 'Kazan').sum()
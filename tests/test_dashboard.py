@@ -0,0 +1,24 @@
+import pandas as pd
+from conftest import log_in
+
+
+def test_selecting_a_file_sends_only_a_handle(client, upload, dash_update):
+    result = upload('data.csv', pd.DataFrame({'a': range(10), 'b': list('abcdefghij')}))
+    dataset_id = result['dataset_id']
+    response = dash_update('load_selected_file', [('file-selector', 'value', dataset_id)])
+    handle = response['stored-data']['data']
+    assert set(handle) == {'dataset_id', 'filename', 'version'}
+    assert (handle['dataset_id'], handle['filename']) == (dataset_id, 'data.csv')
+    assert '**Size:** 10 rows, 2 columns' in str(response['output-data-upload'])
+
+    # по дескриптору — только схема: списки осей без чтения строк
+    options = dash_update('update_columns', [('stored-data', 'data', handle)])
+    assert options['x-column']['options'] == [{'label': 'a', 'value': 'a'}, {'label': 'b', 'value': 'b'}]
+
+
+def test_handle_resolves_only_own_datasets(client, upload, dash_update):
+    dataset_id = upload('data.csv', pd.DataFrame({'a': range(10)}))['dataset_id']
+    log_in(client, 'other')  # тот же браузер, другой пользователь
+    response = dash_update('load_selected_file', [('file-selector', 'value', dataset_id)])
+    assert 'stored-data' not in response
+    assert 'not found' in str(response['output-data-upload'])
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.dashboard import data_manager
+from app.dashboard.callbacks import _figure, dm
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """Колонки, которые DataManager читает из Parquet-кеша."""
+    calls = []
+
+    def read_cache(path, columns=None):
+        calls.append(list(columns) if columns else None)
+        return original(path, columns)
+
+    original = data_manager.read_cache
+    monkeypatch.setattr(data_manager, 'read_cache', read_cache)
+    return calls
+
+
+def wide_frame(rows: int = 500) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({f'c{i}': rng.normal(size=rows) for i in range(8)})
+
+
+def test_only_requested_columns_are_read(client, upload, owner_context, reads):
+    df = wide_frame()
+    dataset_id = upload('wide.csv', df)['dataset_id']
+    handle = {'dataset_id': dataset_id}
+    with owner_context(dataset_id):
+        # x и y могут совпадать — колонка читается один раз
+        projected = dm.resolve(handle, ['c3', 'c1', 'c3'])
+        pd.testing.assert_frame_equal(projected, df[['c3', 'c1']])
+        assert dm.resolve(handle, ['c3', 'c1']) is projected
+        assert dm.columns(handle) == list(df.columns)
+    assert reads == [['c3', 'c1']]
+
+
+def test_chart_reads_only_plotted_columns(client, upload, owner_context, reads):
+    dataset_id = upload('wide.csv', wide_frame())['dataset_id']
+    spec = {'kind': 'scatter', 'x': 'c2', 'y': 'c5', 'agg': None, 'chart': {}}
+    with owner_context(dataset_id):
+        _figure({'dataset_id': dataset_id}, spec)
+    assert reads == [['c2', 'c5']]
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.dashboard.chart_factory import ChartFactory
+from app.dashboard.downsampling import density_grid, downsample, histogram_bins, lttb, minmax
+
+
+def lttb_reference(x, y, n_out):
+    """Исходный алгоритм LTTB построчно — эталон для векторизованной версии."""
+    n = len(x)
+    every = (n - 2) / (n_out - 2)
+    selected, a = [0], 0
+    for i in range(n_out - 2):
+        start, end = int(np.floor(i * every)) + 1, int(np.floor((i + 1) * every)) + 1
+        end = n - 1 if i == n_out - 3 else end
+        if i == n_out - 3:
+            avg_x, avg_y = x[-1], y[-1]
+        else:
+            next_end = n - 1 if i + 1 == n_out - 3 else int(np.floor((i + 2) * every)) + 1
+            avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    return np.array(selected + [n - 1])
+
+
+@pytest.mark.parametrize('n_out', [3, 10, 101])
+def test_lttb_matches_reference(n_out):
+    rng = np.random.default_rng(0)
+    x = np.arange(1_003, dtype='float64')
+    y = np.cumsum(rng.normal(size=len(x)))
+    index = lttb(x, y, n_out)
+    assert len(index) == n_out
+    assert index[0] == 0 and index[-1] == len(x) - 1
+    assert np.all(np.diff(index) > 0)
+    np.testing.assert_array_equal(index, lttb_reference(x, y, n_out))
+
+
+def test_minmax_keeps_extremes():
+    rng = np.random.default_rng(1)
+    y = rng.normal(size=10_000)
+    x = np.arange(len(y), dtype='float64')
+    index = minmax(x, y, 200)
+    assert len(index) <= 200
+    assert np.all(np.diff(index) > 0)
+    assert {0, len(y) - 1, int(y.argmin()), int(y.argmax())} <= set(index.tolist())
+
+
+def test_downsample_drops_missing_and_keeps_order():
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame({'time': pd.date_range('2024-01-01', periods=5_000, freq='min'),
+                       'value': rng.normal(size=5_000)})
+    df.loc[::7, 'value'] = np.nan
+    for method in ('lttb', 'minmax'):
+        sample = downsample(df, 'time', 'value', 500, method)
+        assert 0 < len(sample) <= 500
+        assert sample['value'].notna().all()
+        assert sample.index.is_monotonic_increasing
+    small = downsample(df.head(100), 'time', 'value', 500)
+    assert len(small) == df.head(100)['value'].notna().sum()
+
+
+def test_histogram_bins_match_numpy():
+    rng = np.random.default_rng(3)
+    values = pd.Series(rng.normal(size=50_000))
+    values[::11] = np.nan
+    centers, widths, counts = histogram_bins(values, 40)
+    expected, edges = np.histogram(values.dropna(), bins=40)
+    np.testing.assert_array_equal(counts, expected)
+    np.testing.assert_allclose(centers, (edges[:-1] + edges[1:]) / 2)
+    np.testing.assert_allclose(widths, np.diff(edges))
+
+
+def test_density_grid_matches_numpy():
+    rng = np.random.default_rng(4)
+    x, y = pd.Series(rng.normal(size=30_000)), pd.Series(rng.exponential(size=30_000))
+    x[::13] = np.nan
+    x_centers, y_centers, counts = density_grid(x, y, 25)
+    valid = x.notna()
+    expected, x_edges, y_edges = np.histogram2d(x[valid], y[valid], bins=25)
+    # density_grid возвращает строки по y, как ждёт go.Heatmap
+    np.testing.assert_array_equal(counts, expected.T)
+    np.testing.assert_allclose(x_centers, (x_edges[:-1] + x_edges[1:]) / 2)
+    np.testing.assert_allclose(y_centers, (y_edges[:-1] + y_edges[1:]) / 2)
+
+
+def test_long_line_is_downsampled_to_webgl(monkeypatch):
+    monkeypatch.setattr(ChartFactory, 'LINE_MAX_POINTS', 300)
+    df = pd.DataFrame({'x': np.arange(2_000), 'y': np.sin(np.arange(2_000) / 50)})
+    fig = ChartFactory.create('line', df, 'x', 'y')
+    assert fig.data[0].type == 'scattergl'
+    assert fig.layout.meta['downsampled'] == {'rows': 2_000, 'points': 300, 'method': 'lttb'}
+
+    short = ChartFactory.create('line', df.head(300), 'x', 'y')
+    assert short.data[0].type == 'scatter'
@@ -0,0 +1,51 @@
+import json
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from app.dashboard.encoding import compact_array, compact_figure, narrow
+from conftest import decode_array
+
+
+def encoded(fig) -> list:
+    return json.loads(fig.to_json())['data']
+
+
+def test_narrow_keeps_values_exactly():
+    exact = np.array([0.5, 1.25, np.nan, -3.0])
+    assert narrow(exact).dtype == np.float32
+    precise = np.array([0.1, 1.0])
+    assert narrow(precise).dtype == np.float64
+    assert narrow(np.arange(5, dtype=np.int16)).dtype == np.int64
+
+
+def test_compact_figure_round_trips_typed_arrays():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=1_000)
+    counts = rng.integers(0, 100, 1_000)
+    fig = compact_figure(go.Figure([go.Scattergl(x=values, y=counts, mode='markers'),
+                                    go.Bar(x=['a', 'b'], y=[1.5, 2.5])]))
+    scatter, bar = encoded(fig)
+    assert isinstance(scatter['x'], dict) and isinstance(scatter['y'], dict)
+    np.testing.assert_array_equal(decode_array(scatter['x']), values)
+    np.testing.assert_array_equal(decode_array(scatter['y']), counts)
+    # категории остаются списком, дроби без потерь — float32
+    assert bar['x'] == ['a', 'b']
+    assert bar['y']['dtype'] == 'f4'
+    np.testing.assert_array_equal(decode_array(bar['y']), [1.5, 2.5])
+
+
+def test_dates_and_uniform_x_are_compacted():
+    times = pd.date_range('2024-01-01', periods=500, freq='min')
+    text = times.strftime('%Y-%m-%d %H:%M:%S').to_numpy(dtype=object)
+    y = np.sin(np.arange(500) / 20)
+    fig = compact_figure(go.Figure([go.Scatter(x=text, y=y), go.Bar(x=times[::50], y=np.arange(10))]))
+    line, bar = encoded(fig)
+    # равномерная ось времени — начало и шаг в миллисекундах вместо 500 дат
+    assert 'x' not in line
+    assert pd.Timestamp(line['x0']) == times[0] and line['dx'] == 60_000
+    assert fig.layout.xaxis.type == 'date'
+    ms = decode_array(bar['x'])
+    np.testing.assert_array_equal(pd.to_datetime(ms, unit='ms'), times[::50])
+
+    array, is_date = compact_array(['not', 'dates'])
+    assert array is None and not is_date
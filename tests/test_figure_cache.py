@@ -0,0 +1,68 @@
+import os
+import time
+from app.figure_cache import FigureCache, spec_digest
+
+
+class Figure:
+    """Заглушка plotly Figure: get_or_build сохраняет to_json()."""
+
+    def __init__(self, payload: str):
+        self.payload = payload
+
+    def to_json(self) -> str:
+        return self.payload
+
+
+def test_spec_digest_depends_on_version_and_spec():
+    spec = {'kind': 'bar', 'x': 'city', 'y': 'value', 'agg': 'sum'}
+    assert spec_digest(1, spec) == spec_digest(1, dict(reversed(list(spec.items()))))
+    assert spec_digest(1, spec) != spec_digest(2, spec)
+    assert spec_digest(1, spec) != spec_digest(1, dict(spec, agg='mean'))
+
+
+def test_get_or_build_builds_once_per_version():
+    cache = FigureCache(1024 * 1024)
+    spec = {'kind': 'line', 'x': 'time', 'y': 'value'}
+    builds = []
+
+    def build():
+        builds.append(1)
+        return Figure(f'{{"build": {len(builds)}}}')
+
+    assert cache.get_or_build('a', 1, spec, build) == '{"build": 1}'
+    assert cache.get_or_build('a', 1, spec, build) == '{"build": 1}'
+    assert cache.get_or_build('a', 2, spec, build) == '{"build": 2}'
+    assert cache.get('a', 1, dict(spec, y='count')) is None
+    assert len(builds) == 2
+
+
+def test_disk_layer_survives_restart_and_evicts_least_recent(tmp_path):
+    folder = str(tmp_path / 'figures')
+    cache = FigureCache(1024 * 1024, folder, disk_max_bytes=3_500)
+    for i in range(3):
+        cache.put('a', 1, {'chart': i}, 'x' * 1_000)
+        # вытеснение по mtime: у каждого файла своё время записи
+        stamp = time.time() - 100 + i
+        os.utime(cache._path('a', spec_digest(1, {'chart': i})), (stamp, stamp))
+
+    restarted = FigureCache(1024 * 1024, folder, disk_max_bytes=3_500)
+    assert restarted.get('a', 1, {'chart': 0}) == 'x' * 1_000  # чтение обновляет mtime
+    assert restarted.get('a', 1, {'chart': 9}) is None
+    restarted.put('a', 1, {'chart': 3}, 'y' * 1_000)
+
+    on_disk = set(os.listdir(folder))
+    kept = {os.path.basename(restarted._path('a', spec_digest(1, {'chart': i}))) for i in (0, 2, 3)}
+    assert on_disk == kept
+    stats = restarted.stats()['disk']
+    assert (stats['hits'], stats['misses']) == (1, 1)
+    assert stats['bytes'] == 3_000
+
+
+def test_invalidate_drops_only_that_dataset(tmp_path):
+    cache = FigureCache(1024 * 1024, str(tmp_path / 'figures'), disk_max_bytes=1024 * 1024)
+    cache.put('a', 1, {'chart': 0}, '{"a": 0}')
+    cache.put('b', 1, {'chart': 0}, '{"b": 0}')
+    cache.invalidate('a')
+    assert cache.get('a', 1, {'chart': 0}) is None
+    assert cache.get('b', 1, {'chart': 0}) == '{"b": 0}'
+    assert [name.startswith('b-') for name in os.listdir(tmp_path / 'figures')] == [True]
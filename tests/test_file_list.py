@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.dashboard.callbacks import dm
+from app.models import Dataset, User
+
+
+@pytest.fixture
+def files(client, flask_app, monkeypatch):
+    """Семь файлов пользователя tester, от старых к новым; страница — три файла."""
+    monkeypatch.setitem(flask_app.config, 'FILE_SELECTOR_PAGE_SIZE', 3)
+    names = ['report_0.csv', 'report_1.csv', 'sales_0.csv', 'report_2.csv',
+             'sales_1.csv', 'report%3.csv', 'report_4.csv']
+    start = datetime(2024, 1, 1)
+    with flask_app.app_context():
+        user_id = User.query.filter_by(username='tester').one().id
+        datasets = [Dataset(filename=name, user_id=user_id, upload_date=start + timedelta(days=i),
+                            row_count=10 * i, column_count=2)
+                    for i, name in enumerate(names)]
+        datasets[-1].status, datasets[-1].row_count = 'processing', None
+        db.session.add_all(datasets)
+        db.session.commit()
+        return user_id, {dataset.filename: dataset.id for dataset in datasets}
+
+
+def test_get_available_files_pages_and_searches(flask_app, files):
+    user_id, ids = files
+    with flask_app.app_context():
+        options, total = dm.get_available_files(user_id, page=0, page_size=3)
+        assert total == 7
+        assert [o['label'] for o in options] == ['report_4.csv (processing)', 'report%3.csv · 50 × 2',
+                                                 'sales_1.csv · 40 × 2']
+        options, _ = dm.get_available_files(user_id, page=2, page_size=3)
+        assert [o['value'] for o in options] == [ids['report_0.csv']]
+
+        # % и _ в поиске — обычные символы, а не шаблоны LIKE
+        options, total = dm.get_available_files(user_id, search='%', page_size=3)
+        assert total == 1 and options[0]['value'] == ids['report%3.csv']
+        _, total = dm.get_available_files(user_id, search='SALES', page_size=3)
+        assert total == 2
+
+        # выбранный файл с другой страницы остаётся в списке первым
+        options, _ = dm.get_available_files(user_id, page=0, page_size=3, selected=ids['report_0.csv'])
+        assert [o['value'] for o in options][0] == ids['report_0.csv'] and len(options) == 4
+
+
+def test_file_list_callback_pages(dash_update, files):
+    _, ids = files
+
+    def list_files(page, search=None, trigger='refresh-files', selected=None):
+        inputs = [('refresh-files', 'n_clicks', None), ('file-selector', 'search_value', search),
+                  ('files-prev', 'n_clicks', None), ('files-next', 'n_clicks', None)]
+        prop = next(prop for ident, prop, _ in inputs if ident == trigger)
+        result = dash_update('update_file_list', inputs,
+                             [('files-page', 'data', page), ('file-selector', 'value', selected)],
+                             trigger=(trigger, prop))
+        return ([o['value'] for o in result['file-selector']['options']],
+                result['files-page']['data'], result['files-page-info']['children'])
+
+    values, page, info = list_files(0, trigger='files-next')
+    assert page == 1 and info == 'Page 2 of 3 · 7 files'
+    assert values == [ids['report_2.csv'], ids['sales_0.csv'], ids['report_1.csv']]
+    # дальше последней страницы не листается
+    assert list_files(2, trigger='files-next')[1:] == (2, 'Page 3 of 3 · 7 files')
+    assert list_files(0, trigger='files-prev')[1] == 0
+    # новый поиск начинается с первой страницы
+    values, page, info = list_files(2, search='sales', trigger='file-selector')
+    assert (values, page, info) == ([ids['sales_1.csv'], ids['sales_0.csv']], 0, 'Page 1 of 1 · 2 files')
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+from app.dashboard.callbacks import dm
+from app.frame_cache import FrameCache, frame_cache, size_of
+
+
+def frame(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({'value': np.arange(rows, dtype='float64')})
+
+
+def test_frame_cache_evicts_least_recently_used_by_bytes():
+    cache = FrameCache(max_bytes=3 * size_of(frame(1000)))
+    for name in ('a', 'b', 'c'):
+        cache.put((name, 'frame'), frame(1000), version=1)
+    assert cache.get(('a', 'frame'), 1) is not None  # 'a' теперь свежее 'b'
+    cache.put(('d', 'frame'), frame(1000), version=1)
+
+    assert cache.get(('b', 'frame'), 1) is None
+    assert all(cache.get((name, 'frame'), 1) is not None for name in ('a', 'c', 'd'))
+    stats = cache.stats()
+    assert (stats['entries'], stats['evictions'], stats['hits'], stats['misses']) == (3, 1, 4, 1)
+    assert stats['bytes'] <= stats['max_bytes']
+
+    # значение больше всего бюджета не вытесняет остальные
+    cache.put(('e', 'frame'), frame(10_000), version=1)
+    assert cache.get(('e', 'frame'), 1) is None and cache.stats()['entries'] == 3
+
+
+def test_frame_cache_versions_and_invalidation():
+    cache = FrameCache(max_bytes=1 << 20)
+    cache.put(('key', 'frame'), frame(10), version='v1')
+    cache.put(('key', 'preview', 'data.csv'), 'preview', version='v1')
+    cache.put(('other', 'frame'), frame(10), version='v1')
+
+    # другая версия — промах, устаревшая запись удаляется
+    assert cache.get(('key', 'frame'), 'v2') is None
+    assert cache.get(('key', 'frame'), 'v1') is None
+    cache.invalidate('key')
+    assert cache.get(('key', 'preview', 'data.csv'), 'v1') is None
+    assert cache.get(('other', 'frame'), 'v1') is not None
+    assert cache.stats()['bytes'] == size_of(frame(10))
+
+
+def test_datasets_are_shared_through_the_frame_cache(client, upload, owner_context):
+    dataset_id = upload('data.csv', pd.DataFrame({'a': range(100), 'b': range(100)}))['dataset_id']
+    with owner_context(dataset_id):
+        first = dm.load_columns(dataset_id)
+        assert dm.load_columns(dataset_id) is first
+        # проекция берётся из уже загруженного датасета, а не с диска
+        assert dm.load_columns(dataset_id, ['b']).columns.tolist() == ['b']
+
+    stats = client.get('/api/cache/stats').get_json()
+    assert stats['frames'] == frame_cache.stats()
+    assert stats['frames']['hits'] >= 2 and stats['frames']['entries'] >= 1
+    assert set(stats['figures']) >= {'entries', 'hits', 'misses'}
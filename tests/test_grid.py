@@ -0,0 +1,15 @@
+from app import grid
+
+
+def test_grid_filter_and_sort_match_pandas(cache, frame):
+    schema = grid.pq.read_schema(cache)
+    predicates = grid.parse_filter('{value} > 5 && {city} icontains mos && {count} <= 10', schema)
+    expected = frame.index[(frame['value'] > 5) & frame['city'].str.contains('mos', case=False)
+                           & (frame['count'] <= 10)]
+    assert grid.filter_positions(cache, predicates).tolist() == expected.tolist()
+
+    order = grid.sort_index(cache, [{'column_id': 'count', 'direction': 'desc'},
+                                    {'column_id': 'value', 'direction': 'asc'}])
+    expected = frame.sort_values(['count', 'value'], ascending=[False, True], kind='stable',
+                                 na_position='last').index
+    assert order.tolist() == expected.tolist()
@@ -0,0 +1,62 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from app.dashboard.callbacks import _figure, dm
+from app.dashboard.chart_factory import ChartFactory
+from app.jobs import correlation_path
+from conftest import decode_array
+
+
+def grouped_frame(rows: int = 2_000) -> pd.DataFrame:
+    """Две группы связанных колонок вперемешку: a0, b0, a1, b1, ..."""
+    rng = np.random.default_rng(0)
+    a, b = rng.normal(size=rows), rng.normal(size=rows)
+    columns = {}
+    for i in range(3):
+        columns[f'a{i}'] = a + rng.normal(scale=0.3, size=rows)
+        columns[f'b{i}'] = b + rng.normal(scale=0.3, size=rows)
+    columns['label'] = rng.choice(['x', 'y'], rows)
+    return pd.DataFrame(columns)
+
+
+def labels_and_matrix(fig):
+    trace = json.loads(fig.to_json())['data'][0]
+    return list(trace['x']), decode_array(trace['z'])
+
+
+def test_create_heatmap_matches_dataframe_corr():
+    df = grouped_frame()
+    df.loc[::5, 'a1'] = np.nan
+    labels, z = labels_and_matrix(ChartFactory.create('heatmap', df, None))
+    expected = df.corr(numeric_only=True)
+    assert labels == list(expected.columns)
+    np.testing.assert_allclose(z, expected.to_numpy(), atol=1e-12)
+
+
+def test_cluster_puts_related_columns_together(monkeypatch):
+    corr = grouped_frame().corr(numeric_only=True)
+    labels, z = labels_and_matrix(ChartFactory.correlation_heatmap(corr, cluster=True))
+    groups = [label[0] for label in labels]
+    assert groups in (['a'] * 3 + ['b'] * 3, ['b'] * 3 + ['a'] * 3)
+    np.testing.assert_allclose(z, corr.loc[labels, labels].to_numpy())
+
+    monkeypatch.setattr(ChartFactory, 'HEATMAP_MAX_COLUMNS', 4)
+    fig = ChartFactory.correlation_heatmap(corr)
+    assert fig.layout.meta['columns'] == {'shown': 4, 'total': 6}
+
+
+def test_heatmap_card_uses_stored_matrix(client, upload, owner_context):
+    df = grouped_frame()
+    dataset_id = upload('groups.csv', df)['dataset_id']
+    spec = {'kind': 'heatmap', 'x': None, 'y': None, 'agg': None, 'cluster': False, 'chart': {}}
+    with owner_context(dataset_id):
+        key, _ = dm._cache_version(dataset_id)
+        assert os.path.exists(correlation_path(dm.data_directory, key))
+        stored = dm.load_correlation(dataset_id)
+        figure = json.loads(_figure({'dataset_id': dataset_id}, spec))
+    trace = figure['data'][0]
+    expected = df.corr(numeric_only=True)
+    assert list(stored.columns) == list(trace['x']) == list(expected.columns)
+    # матрица хранится во float32
+    np.testing.assert_allclose(decode_array(trace['z']), expected.to_numpy(), atol=1e-6)
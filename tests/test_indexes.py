@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+from app import indexes
+
+
+def test_index_selection_matches_pandas(tmp_path, cache, frame):
+    folder = str(tmp_path / 'indexes')
+    manifest = indexes.build_indexes(cache, folder, max_categories=64)
+    assert manifest['columns']['city']['kind'] == 'bitmap'
+    assert manifest['columns']['value']['kind'] == 'sorted'
+    assert 'code' not in manifest['columns']
+
+    cases = [
+        ([{'column': 'city', 'values': ['Omsk', 'Kazan']}], frame['city'].isin(['Omsk', 'Kazan'])),
+        ([{'column': 'value', 'range': [-3, 7.5]}], frame['value'].between(-3, 7.5)),
+        ([{'column': 'count', 'values': [3, '4']}], frame['count'].isin([3, 4])),
+        ([{'column': 'time', 'range': ['2024-01-02', '2024-01-03T12:00:00']}],
+         pd.to_datetime(frame['time']).between('2024-01-02', '2024-01-03 12:00:00')),
+        ([{'column': 'code', 'range': ['id1', 'id2']}], frame['code'].between('id1', 'id2')),
+        ([{'column': 'code', 'range': [1, 2]}], pd.Series(False, index=frame.index)),
+        ([{'column': 'city', 'values': ['Moscow']}, {'column': 'value', 'range': [0, 100]}],
+         (frame['city'] == 'Moscow') & frame['value'].between(0, 100)),
+    ]
+    for predicates, expected in cases:
+        positions = indexes.selection(cache, folder, manifest, indexes.normalize(predicates))
+        assert positions.tolist() == np.flatnonzero(expected.to_numpy()).tolist(), predicates
@@ -0,0 +1,33 @@
+import pandas as pd
+from app.jobs import job_queue
+from conftest import log_in
+
+
+def test_upload_is_processed_in_a_background_job(client, upload):
+    result = upload('data.csv', pd.DataFrame({'a': range(100), 'b': ['x', 'y'] * 50}))
+    assert result['status_url'] == f"/api/jobs/{result['job_id']}"
+    job = result['job']
+    assert job['status'] == 'done' and job['progress'] == 1.0
+    assert job['dataset_id'] == result['dataset_id']
+    assert {'read', 'cache', 'metrics', 'save'} <= set(job['stages'])
+
+
+def test_job_status_falls_back_to_the_dataset_record(client, upload, monkeypatch):
+    result = upload('data.csv', pd.DataFrame({'a': range(10)}))
+    # задача выполнялась в другом процессе или до перезапуска
+    monkeypatch.setattr(job_queue, '_jobs', {})
+    status = client.get(result['status_url']).get_json()
+    assert (status['status'], status['dataset_id'], status['progress']) == ('done', result['dataset_id'], 1.0)
+
+
+def test_failed_job_reports_error(client, upload):
+    result = upload('broken.json', b'{not json')
+    assert result['job']['status'] == 'failed' and result['job']['error']
+
+
+def test_job_status_is_private(client, upload, flask_app):
+    result = upload('data.csv', pd.DataFrame({'a': range(10)}))
+    other = flask_app.test_client()
+    log_in(other, 'other')
+    assert other.get(result['status_url']).status_code == 404
+    assert client.get('/api/jobs/missing').status_code == 404
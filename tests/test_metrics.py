@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app import app, db
+from app.models import ColumnMetrics, Dataset, DatasetMetrics
+from app.processing import ENGINE_VERSION
+from conftest import log_in
+
+
+def with_missing(rows: int, ratio: float) -> pd.DataFrame:
+    value = np.arange(rows, dtype='float64')
+    value[:int(rows * ratio)] = np.nan
+    return pd.DataFrame({'value': value, 'name': [f'n{i % 7}' for i in range(rows)]})
+
+
+def test_metrics_are_stored_per_content_with_column_fields(client, upload):
+    dataset_id = upload('data.csv', with_missing(200, 0.25))['dataset_id']
+    with app.app_context():
+        key = db.session.get(Dataset, dataset_id).storage_key
+        record = DatasetMetrics.query.filter_by(key=key).one()
+        assert (record.engine_version, record.input_hash, record.success) == (ENGINE_VERSION, key, True)
+        columns = {column.name: column for column in ColumnMetrics.query.filter_by(metrics_id=record.id)}
+
+    assert set(columns) == {'value', 'name'}
+    value = columns['value']
+    assert (value.count, value.missing, value.missing_ratio) == (150, 50, 0.25)
+    assert value.mean == pytest.approx(np.arange(50, 200).mean())
+    # у строковой колонки среднего нет — NULL, а не NaN
+    assert columns['name'].mean is None and columns['name'].unique == 7
+
+
+def test_datasets_missing_filters_by_ratio_and_owner(client, upload, flask_app):
+    sparse = upload('sparse.csv', with_missing(100, 0.5))['dataset_id']
+    some = upload('some.csv', with_missing(101, 0.2))['dataset_id']
+    upload('full.csv', with_missing(102, 0.0))
+
+    found = client.get('/api/datasets/missing?column=value&ratio=0.1').get_json()
+    assert [(item['dataset_id'], item['missing_ratio']) for item in found] == [
+        (sparse, 0.5), (some, pytest.approx(20 / 101))]
+    assert client.get('/api/datasets/missing?column=value&ratio=0.3').get_json()[0]['filename'] == 'sparse.csv'
+    assert client.get('/api/datasets/missing').status_code == 400
+    assert client.get('/api/datasets/missing?column=value&ratio=x').status_code == 400
+
+    other = flask_app.test_client()
+    log_in(other, 'other')
+    assert other.get('/api/datasets/missing?column=value').get_json() == []
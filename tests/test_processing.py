@@ -0,0 +1,247 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from app import processing
+from app.processing import (CoMoments, HashCounts, StreamingStats, _chunk_moments, _merge_moments,
+                            _moments_to_stats, describe_frame, numeric_stats)
+
+
+def make_frame(rows: int = 5000, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'normal': rng.normal(10, 3, rows),
+        'skewed': rng.exponential(2.0, rows),
+        'ints': rng.integers(0, 50, rows),
+        'large': 1e6 + rng.normal(0, 1, rows),  # большое смещение: проверка устойчивости моментов
+        'city': rng.choice(['Moscow', 'Kazan', 'Omsk', 'Tver'], rows, p=[0.4, 0.3, 0.2, 0.1]),
+        'code': [f'id{value}' for value in rng.integers(0, 1000, rows)],
+    })
+    df.loc[rng.random(rows) < 0.05, 'normal'] = np.nan
+    df.loc[rng.random(rows) < 0.05, 'city'] = None
+    return df
+
+
+def pandas_metrics(df: pd.DataFrame) -> dict:
+    """Метрики так, как их собирал исходный process_json: describe, nunique, isnull, skew, kurt."""
+    parts = []
+    if len(df.select_dtypes(include=[float, int]).columns):
+        parts.append(df.describe(include=[float, int]))
+    if len(df.select_dtypes(include=[object]).columns):
+        parts.append(df.describe(include=[object]))
+    result = pd.concat(parts, axis=1).to_dict()
+    for col in df.columns:
+        result[col]['unique'] = df[col].nunique()
+        result[col]['missing'] = int(df[col].isnull().sum())
+    for col, value in df.skew(numeric_only=True).items():
+        result[col]['skewness'] = value
+        result[col]['kurtosis'] = df[col].kurt()
+    return result
+
+
+def assert_metrics_equal(actual: dict, expected: dict, rel: float = 1e-9):
+    assert list(actual) == list(expected)
+    for col, metrics in expected.items():
+        assert list(actual[col])[:len(metrics)] == list(metrics), col
+        for key, value in metrics.items():
+            got = actual[col][key]
+            if isinstance(value, float) and np.isnan(value):
+                assert isinstance(got, float) and np.isnan(got), (col, key)
+            elif isinstance(value, (float, np.floating)):
+                assert got == pytest.approx(value, rel=rel, abs=1e-9), (col, key)
+            else:
+                assert got == value, (col, key)
+
+
+def test_numeric_stats_matches_pandas():
+    df = make_frame()[['normal', 'skewed', 'ints', 'large']]
+    stats = numeric_stats(df.to_numpy(dtype='float64'))
+    described = df.describe()
+    for i, col in enumerate(df.columns):
+        for key in processing.NUMERIC_STATS:
+            assert stats[key][i] == pytest.approx(described.loc[key, col], rel=1e-9)
+        assert stats['unique'][i] == df[col].nunique()
+        assert stats['missing'][i] == df[col].isnull().sum()
+        assert stats['skewness'][i] == pytest.approx(df[col].skew(), rel=1e-6)
+        assert stats['kurtosis'][i] == pytest.approx(df[col].kurt(), rel=1e-6)
+
+
+def test_numeric_stats_handles_empty_and_constant_columns():
+    block = np.array([[np.nan, 1.0], [np.nan, 1.0], [np.nan, 1.0], [np.nan, 1.0]])
+    stats = numeric_stats(block)
+    assert stats['count'].tolist() == [0.0, 4.0]
+    assert np.isnan(stats['mean'][0]) and np.isnan(stats['min'][0])
+    assert stats['unique'].tolist() == [0, 1]
+    assert stats['skewness'][1] == 0.0 and stats['kurtosis'][1] == 0.0
+
+
+def test_merge_moments_matches_single_pass():
+    values = np.random.default_rng(1).lognormal(0, 1, 10_000)
+    merged = (0, 0.0, 0.0, 0.0, 0.0)
+    for part in np.array_split(values, 7):
+        merged = _merge_moments(merged, _chunk_moments(part))
+    whole = _chunk_moments(values)
+    assert merged[0] == whole[0]
+    for got, expected in zip(merged[1:], whole[1:]):
+        assert got == pytest.approx(expected, rel=1e-9)
+
+    stats = _moments_to_stats(*merged)
+    series = pd.Series(values)
+    assert stats['std'] == pytest.approx(series.std(), rel=1e-9)
+    assert stats['skewness'] == pytest.approx(series.skew(), rel=1e-9)
+    assert stats['kurtosis'] == pytest.approx(series.kurt(), rel=1e-9)
+
+
+def test_comoments_merge_matches_corr():
+    df = make_frame()[['normal', 'skewed', 'ints', 'large']]
+    left, right = CoMoments(), CoMoments()
+    left.update(df.iloc[:1700].to_numpy(dtype='float64'), list(df.columns))
+    # вторая часть приходит с другим порядком колонок и без одной из них
+    part = df.iloc[1700:][['large', 'normal', 'skewed']]
+    right.update(part.to_numpy(dtype='float64'), list(part.columns))
+    right.update(df.iloc[1700:][['ints']].to_numpy(dtype='float64'), ['ints'])
+    left.merge(CoMoments.from_state(json.loads(json.dumps(right.to_state()))))
+
+    expected = pd.concat([df.iloc[:1700], df.iloc[1700:]]).corr()
+    # пары с ints во второй части считались по разным порциям — сравниваем остальные
+    columns = ['normal', 'skewed', 'large']
+    actual = left.correlation().loc[columns, columns]
+    np.testing.assert_allclose(actual.to_numpy(), expected.loc[columns, columns].to_numpy(), rtol=1e-8)
+
+
+def test_describe_frame_matches_pandas():
+    df = make_frame()
+    assert_metrics_equal(describe_frame(df, block_columns=3), pandas_metrics(df))
+
+
+def test_describe_frame_numeric_only_and_objects_only():
+    df = make_frame(500)
+    for columns in (['normal', 'ints'], ['city', 'code']):
+        assert_metrics_equal(describe_frame(df[columns]), pandas_metrics(df[columns]))
+
+
+def test_describe_frame_approximate_uses_sketches():
+    df = make_frame(20_000)
+    exact = describe_frame(df)
+    result = describe_frame(df, approximate=True, hll_precision=14, quantile_error=0.01)
+    for col in ('normal', 'skewed', 'ints', 'large'):
+        for key in ('count', 'mean', 'std', 'min', 'max', 'missing', 'skewness', 'kurtosis'):
+            assert result[col][key] == pytest.approx(exact[col][key], rel=1e-9), (col, key)
+        for key in ('25%', '50%', '75%'):
+            assert result[col][key] == pytest.approx(exact[col][key], rel=0.02), (col, key)
+        assert result[col]['unique'] == pytest.approx(exact[col]['unique'], rel=0.05)
+        assert result[col]['approximate'] == {'unique': 0.008125, '25%': 0.01, '50%': 0.01, '75%': 0.01}
+    assert result['code']['unique'] == pytest.approx(df['code'].nunique(), rel=0.05)
+    assert (result['city']['top'], result['city']['freq']) == (exact['city']['top'], exact['city']['freq'])
+    assert result['city']['approximate'] == {'unique': 0.008125}
+
+
+@pytest.mark.parametrize('approximate', [False, True])
+def test_describe_parallel_matches_describe_frame(approximate):
+    df = make_frame(20_000)
+    df['mixed'] = pd.Series([1, 'a', 2.5, None] * 5000, dtype=object)  # не передаётся через Arrow
+    expected = describe_frame(df, block_columns=2, approximate=approximate)
+    assert_metrics_equal(describe_frame(df, block_columns=2, approximate=approximate, workers=2), expected)
+
+
+def test_approximate_object_stats_bounds_top_frequency(monkeypatch):
+    # маленькие блоки и ёмкость: скетч частых значений действительно вытесняет счётчики
+    monkeypatch.setattr(processing, 'FREQUENT_BLOCK_ROWS', 1000)
+    rng = np.random.default_rng(4)
+    values = pd.Series(rng.choice(np.array([f'v{i}' for i in range(3000)], dtype=object), 30_000))
+    values[rng.random(len(values)) < 0.1] = 'leader'
+    column = processing.approximate_object_stats(values, processing.OBJECT_STATS, top_capacity=16)
+    exact = int((values == 'leader').sum())
+    assert column['top'] == 'leader'
+    assert exact * (1 - column['approximate']['freq']) <= column['freq'] <= exact
+
+
+def test_streaming_stats_single_chunk_matches_describe_frame():
+    df = make_frame()
+    accumulator = StreamingStats()
+    accumulator.update(df)
+    assert_metrics_equal(accumulator.result()['result'], describe_frame(df))
+
+
+def test_streaming_stats_chunks_match_pandas():
+    df = make_frame(20_000)
+    accumulator = StreamingStats()
+    for start in range(0, len(df), 3000):
+        accumulator.update(df.iloc[start:start + 3000])
+    result = accumulator.result()['result']
+    expected = pandas_metrics(df)
+
+    for col in ('normal', 'skewed', 'ints', 'large'):
+        for key in ('count', 'mean', 'std', 'min', 'max', 'unique', 'missing', 'skewness', 'kurtosis'):
+            assert result[col][key] == pytest.approx(expected[col][key], rel=1e-6), (col, key)
+        # квартили из скетча — с его относительной ошибкой
+        for key in ('25%', '50%', '75%'):
+            assert result[col][key] == pytest.approx(expected[col][key], rel=0.02), (col, key)
+            assert result[col]['approximate'][key] == accumulator.quantile_error
+    for col in ('city', 'code'):
+        for key in ('count', 'unique', 'top', 'freq', 'missing'):
+            assert result[col][key] == expected[col][key], (col, key)
+
+    np.testing.assert_allclose(accumulator.correlation().to_numpy(),
+                               df.corr(numeric_only=True).to_numpy(), rtol=1e-8)
+
+
+@pytest.mark.parametrize('approximate', [False, True])
+def test_streaming_stats_state_round_trip_and_merge(approximate):
+    df = make_frame(9000)
+    whole = StreamingStats(approximate=approximate)
+    for start in range(0, len(df), 3000):
+        whole.update(df.iloc[start:start + 3000])
+
+    first, second = StreamingStats(approximate=approximate), StreamingStats(approximate=approximate)
+    first.update(df.iloc[:3000])
+    first.update(df.iloc[3000:6000])
+    second.update(df.iloc[6000:])
+    restored = StreamingStats.from_state(json.loads(json.dumps(first.to_state())))
+    restored.merge(StreamingStats.from_state(json.loads(json.dumps(second.to_state()))))
+
+    assert_metrics_equal(restored.result()['result'], whole.result()['result'], rel=1e-9)
+    np.testing.assert_allclose(restored.correlation().to_numpy(), whole.correlation().to_numpy(), rtol=1e-9)
+
+
+def test_streaming_stats_approximate_top_keeps_values_of_retained_hashes():
+    rng = np.random.default_rng(5)
+    values = pd.Series(rng.choice(np.array([f'v{i}' for i in range(5000)], dtype=object), 40_000))
+    values[rng.random(len(values)) < 0.05] = 'leader'
+    values[rng.random(len(values)) < 0.05] = None
+    accumulator = StreamingStats(approximate=True, top_capacity=32)
+    for start in range(0, len(values), 7000):
+        accumulator.update(values.iloc[start:start + 7000].to_frame('name'))
+
+    acc = accumulator.objects['name']
+    assert set(acc['values']) == set(acc['frequent'].counters)
+    column = accumulator.result()['result']['name']
+    exact = int((values == 'leader').sum())
+    assert column['count'] == values.count()
+    assert column['top'] == 'leader'
+    assert exact - acc['frequent'].error <= column['freq'] <= exact
+
+
+def test_streaming_stats_rejects_other_state_version_and_options():
+    state = StreamingStats().to_state()
+    state['version'] = StreamingStats.STATE_VERSION - 1
+    with pytest.raises(ValueError):
+        StreamingStats.from_state(state)
+    with pytest.raises(ValueError):
+        StreamingStats().merge(StreamingStats(approximate=True))
+
+
+def test_hash_counts_keeps_exact_counts_beyond_capacity():
+    rng = np.random.default_rng(2)
+    values = rng.choice(np.array([f'v{i}' for i in range(500)], dtype=object), 20_000)
+    values[:3000] = 'leader'
+    counts = HashCounts(capacity=8)
+    for part in np.array_split(values, 5):
+        chunk = pd.Series(part).value_counts()
+        other = HashCounts(capacity=8)
+        other.update(chunk.index.to_numpy(), chunk.to_numpy())
+        counts.merge(HashCounts.from_state(json.loads(json.dumps(other.to_state()))))
+
+    assert counts.unique == len(set(values))
+    assert counts.top() == ('leader', int((values == 'leader').sum()))
+    assert len(counts.values) <= 8
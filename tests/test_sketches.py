@@ -0,0 +1,96 @@
+import json
+import numpy as np
+import pytest
+from app.sketches import FrequentItems, HyperLogLog, QuantileSketch
+
+
+def round_trip(sketch):
+    return type(sketch).from_state(json.loads(json.dumps(sketch.to_state())))
+
+
+@pytest.mark.parametrize('distinct', [100, 5_000, 300_000])
+def test_hyperloglog_within_error_bound(distinct):
+    values = np.array([f'value-{i}' for i in range(distinct)], dtype=object)
+    sketch = HyperLogLog(14)
+    sketch.update(np.concatenate([values, values[:distinct // 2]]))  # повторы не меняют оценку
+    # 4 стандартные ошибки: тест не должен падать от случайного разброса
+    assert sketch.count() == pytest.approx(distinct, rel=4 * sketch.relative_error)
+
+
+def test_hyperloglog_merge_and_state():
+    left, right, whole = HyperLogLog(12), HyperLogLog(12), HyperLogLog(12)
+    numbers = np.arange(50_000, dtype='float64')
+    left.update(numbers[:30_000])
+    right.update(numbers[20_000:])
+    whole.update(numbers)
+    merged = round_trip(left).merge(round_trip(right))
+    assert np.array_equal(merged.registers, whole.registers)
+    with pytest.raises(ValueError):
+        left.merge(HyperLogLog(14))
+
+
+@pytest.mark.parametrize('values', [
+    np.random.default_rng(0).lognormal(0, 2, 100_000),
+    np.random.default_rng(1).normal(0, 1e3, 100_000),
+    np.r_[np.zeros(1000), np.random.default_rng(2).exponential(1.0, 10_000)],
+])
+def test_quantile_sketch_relative_error(values):
+    sketch = QuantileSketch(0.01)
+    for part in np.array_split(values, 4):
+        part_sketch = QuantileSketch(0.01)
+        part_sketch.update(part)
+        sketch.merge(round_trip(part_sketch))
+
+    qs = [0.0, 0.01, 0.25, 0.5, 0.75, 0.99, 1.0]
+    ordered = np.sort(values)
+    # ранг, который оценивает скетч, — как у np.quantile(method='lower')
+    expected = ordered[np.floor(np.asarray(qs) * (len(values) - 1)).astype(int)]
+    for got, exact in zip(sketch.quantiles(qs), expected):
+        assert abs(got - exact) <= 0.01 * abs(exact) + 1e-12
+
+
+def test_quantile_sketch_empty_and_mismatched_error():
+    assert all(np.isnan(QuantileSketch().quantiles([0.5, 0.9])))
+    with pytest.raises(ValueError):
+        QuantileSketch(0.01).merge(QuantileSketch(0.02))
+
+
+def test_frequent_items_guarantees():
+    rng = np.random.default_rng(3)
+    values = rng.zipf(1.5, 50_000) % 5000
+    sketch = FrequentItems(64)
+    for part in np.array_split(values, 10):
+        chunk = FrequentItems(64)
+        numbers, counts = np.unique(part, return_counts=True)
+        chunk.update(dict(zip(numbers.tolist(), counts.tolist())))
+        sketch.merge(round_trip(chunk))
+
+    numbers, counts = np.unique(values, return_counts=True)
+    exact = dict(zip(numbers.tolist(), counts.tolist()))
+    assert len(sketch.counters) <= 64
+    # оценки занижены не больше чем на error, частые значения не теряются
+    for value, count in sketch.counters.items():
+        assert exact[value] - sketch.error <= count <= exact[value]
+    for value, count in exact.items():
+        if count > len(values) / 65:
+            assert value in sketch.counters
+    top, freq = sketch.top()
+    assert top == max(exact, key=exact.get)
+    assert exact[top] - sketch.error <= freq <= exact[top]
+
+
+def test_frequent_items_update_arrays_matches_update():
+    rng = np.random.default_rng(6)
+    values = rng.zipf(1.3, 20_000) % 3000
+    by_dict, by_arrays = FrequentItems(32), FrequentItems(32)
+    for part in np.array_split(values, 8):
+        numbers, counts = np.unique(part, return_counts=True)
+        by_dict.update(dict(zip(numbers.tolist(), counts.tolist())))
+        by_arrays.update_arrays(numbers, counts)
+
+    numbers, counts = np.unique(values, return_counts=True)
+    exact = dict(zip(numbers.tolist(), counts.tolist()))
+    assert len(by_arrays.counters) <= 32
+    for value, count in by_arrays.counters.items():
+        assert exact[value] - by_arrays.error <= count <= exact[value]
+    assert by_arrays.top()[0] == by_dict.top()[0] == max(exact, key=exact.get)
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from app.storage import CacheWriter, read_cache, write_cache
+
+
+def test_cache_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'value': rng.normal(0, 10, 10_000),
+        'count': rng.integers(0, 20, 10_000),
+        'city': rng.choice(['Moscow', 'Kazan', 'Omsk'], 10_000),
+    })
+    df.loc[rng.random(len(df)) < 0.05, 'value'] = np.nan
+    path = str(tmp_path / 'data.parquet')
+    write_cache(df, path, row_group_rows=3000)
+    pd.testing.assert_frame_equal(read_cache(path), df, check_dtype=False)
+
+
+def test_cache_writer_widens_schema_of_written_row_groups(tmp_path):
+    path = str(tmp_path / 'data.parquet')
+    chunks = [
+        pd.DataFrame({'id': np.arange(0, 1000), 'name': [None] * 1000}),
+        pd.DataFrame({'id': np.arange(1000, 2000), 'name': ['a'] * 1000}),
+        # пропуск в целой колонке: int -> float у уже записанных групп
+        pd.DataFrame({'id': [2000.0, np.nan], 'name': ['b', 'c'], 'extra': [1, 2]}),
+    ]
+    writer = CacheWriter(path, row_group_rows=400)
+    for chunk in chunks:
+        writer.write(chunk)
+    writer.close()
+
+    assert not (tmp_path / 'data.parquet.tmp').exists()
+    assert not (tmp_path / 'data.parquet.tmp.old').exists()
+    cache = pq.ParquetFile(path)
+    # группы строк переписаны по одной и сохранили размер
+    sizes = [cache.metadata.row_group(i).num_rows for i in range(cache.num_row_groups)]
+    assert sizes == [400, 400, 200, 400, 400, 200, 2]
+    assert cache.schema_arrow.field('id').type == pa.float64()
+    assert cache.schema_arrow.field('name').type == pa.string()
+    expected = pd.concat(chunks, ignore_index=True)
+    pd.testing.assert_frame_equal(read_cache(path), expected, check_dtype=False)
@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+from app import timeseries
+
+
+def test_pyramid_levels_match_resample(tmp_path, cache, frame):
+    folder = str(tmp_path / 'pyramids')
+    manifest = timeseries.build_pyramids(cache, folder, min_rows=1000, row_group_rows=3000)
+    assert [level['level'] for level in manifest['columns']['time']['levels']] == ['hour', 'day']
+
+    series = frame.set_index(pd.to_datetime(frame['time']))['value']
+    # весь ряд — около 200 часов: при бюджете 500 точек выбирается часовой уровень
+    level, points, rows = timeseries.query(cache, folder, manifest, 'time', 'value', budget=500)
+    assert level == 'hour' and rows == len(frame)
+    expected = series.resample('h')
+    np.testing.assert_allclose(points['mean'], expected.mean().to_numpy())
+    np.testing.assert_allclose(points['min'], expected.min().to_numpy())
+    np.testing.assert_allclose(points['max'], expected.max().to_numpy())
+
+    level, points, rows = timeseries.query(cache, folder, manifest, 'time', 'value',
+                                           '2024-01-02 10:00', '2024-01-02 10:30', budget=500)
+    window = series[(series.index >= '2024-01-02 10:00') & (series.index <= '2024-01-02 10:30')]
+    assert level == 'raw' and rows == len(window)
+    np.testing.assert_allclose(points['value'].to_numpy(), window.to_numpy())
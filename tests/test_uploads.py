@@ -0,0 +1,45 @@
+import os
+import pandas as pd
+from app import app
+from app.models import Dataset
+from app.storage import blob_path, cache_path
+
+
+def datasets():
+    with app.app_context():
+        return {dataset.id: (dataset.filename, dataset.content_hash, dataset.status, dataset.row_count)
+                for dataset in Dataset.query.all()}
+
+
+def test_same_content_is_stored_and_processed_once(client, upload):
+    raw = pd.DataFrame({'a': range(50), 'b': ['x', 'y'] * 25}).to_csv(index=False).encode()
+    first = upload('first.csv', raw)
+    second = upload('second.csv', raw)
+    # повторная загрузка готова сразу: без задачи, с общими метриками и размером
+    assert second['job_id'] is None
+
+    rows = datasets()
+    content_hash = rows[first['dataset_id']][1]
+    assert rows[second['dataset_id']] == ('second.csv', content_hash, 'ready', 50)
+    folder = app.config['UPLOAD_FOLDER']
+    assert os.listdir(os.path.join(folder, 'blobs')) == [content_hash]
+    assert os.path.samefile(os.path.join(folder, 'second.csv'), blob_path(folder, content_hash))
+    assert client.get('/download/second.csv').data == raw
+
+
+def test_shared_content_is_removed_with_the_last_dataset(client, upload):
+    raw = pd.DataFrame({'a': range(50)}).to_csv(index=False).encode()
+    first = upload('first.csv', raw)
+    second = upload('second.csv', raw)
+    folder = app.config['UPLOAD_FOLDER']
+    content_hash = datasets()[first['dataset_id']][1]
+
+    client.post(f"/delete/{first['dataset_id']}")
+    assert os.path.exists(blob_path(folder, content_hash))
+    assert os.path.exists(cache_path(folder, content_hash))
+    assert client.get('/download/second.csv').data == raw
+
+    client.post(f"/delete/{second['dataset_id']}")
+    assert not os.path.exists(blob_path(folder, content_hash))
+    assert not os.path.exists(cache_path(folder, content_hash))
+    assert datasets() == {}
@@ -0,0 +1,25 @@
+import hashlib
+import io
+import numpy as np
+import pandas as pd
+from app.utils import save_upload, scan_file
+
+
+def test_scan_file_streams_chunks_and_reports_bytes_read(tmp_path):
+    df = pd.DataFrame({'id': np.arange(25_000), 'name': [f'row {i}' for i in range(25_000)]})
+    path = tmp_path / 'data.csv'
+    df.to_csv(path, index=False)
+    chunks, progress = [], []
+    scan_file(str(path), chunks.append, chunk_rows=4000, on_progress=progress.append)
+
+    assert [len(chunk) for chunk in chunks] == [4000] * 6 + [1000]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), df)
+    assert progress == sorted(progress) and progress[-1] == path.stat().st_size
+
+
+def test_save_upload_hashes_while_writing(tmp_path):
+    data = np.random.default_rng(0).bytes(3 * 1024 * 1024 + 17)
+    path = tmp_path / 'blob'
+    content_hash, size = save_upload(io.BytesIO(data), str(path))
+    assert (content_hash, size) == (hashlib.sha256(data).hexdigest(), len(data))
+    assert path.read_bytes() == data